@@ -1,19 +1,43 @@
 import os
 import json
-from flask import Flask, request, jsonify
+import time
+import contextvars
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 from datetime import datetime
-import logging
-
-# Re-enable Google Generative AI library components
-from google.generativeai import GenerativeModel, configure
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # Load environment variables from .env file
 load_dotenv()
 
 # --- IMPORTS FOR YOUR SERVICES ---
-from services.qloo_service import get_user_tastes
+from services.qloo_service import get_user_tastes, get_cached_user_tastes, resolve_entity_locally, QLOO_DOMAIN_MAPPING
+from services.qloo_client import get_qloo_client
+from services.clients import get_gemini_model, get_client_registry, warm_up_if_enabled
+from services.entity_cache import get_entity_cache, normalize_query
+from services.entity_index import get_entity_index
+from services.insights_cache import get_insights_cache
+from services.narrative_cache import get_narrative_cache
+from services.chat_sessions import (
+    get_chat_session_store, new_session_state, record_turn, cached_qloo_context, remember_qloo_context,
+)
+from services.singleflight import get_singleflight, singleflight_stats
+from services.rate_limiter import (
+    get_rate_limiter, RateLimitExceeded, set_request_deadline, clear_request_deadline, time_remaining,
+    RequestDeadlineExceeded,
+)
+from services.admission import get_admission_controller, AdmissionRejected, request_timeout
+from services.logging_config import configure_logging, set_request_id, clear_request_id
+from services.metrics import (
+    stage, record_fallback, start_request_timing, finish_request_timing, render_metrics,
+)
+from services.recommendation_pipeline import (
+    fallback_recommendations_text, degraded_recommendations_text, GEMINI_ERROR_TEXT,
+    GeminiNoTextError, gemini_chunk_text, gemini_finish_reason, gemini_response_text,
+    parse_batch_narratives, build_batch_response, chat_fallback_text,
+)
+from services.prompt_builder import BuiltPrompt, expects_json, build_narrative_prompt, build_batch_prompt, build_chat_prompt
 
 # --- FLASK APP SETUP ---
 app = Flask(__name__)
@@ -25,38 +49,64 @@ print(f"🌐 CORS enabled for: {FRONTEND_URL}")
 CORS(app, resources={r"/api/*": {"origins": FRONTEND_URL}}, supports_credentials=True)
 
 # --- GLOBAL LOGGING CONFIGURATION ---
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# LOG_MODE=dev (default) keeps human-readable lines; LOG_MODE=json logs structured lines off-thread.
+configure_logging()
 
 # --- ENVIRONMENT VARIABLE CHECKS & API INITIALIZATION ---
 QLOO_API_KEY = os.getenv("QLOO_API_KEY")
 if not QLOO_API_KEY:
     print("❌ QLOO_API_KEY is not set in environment variables! Qloo API calls will likely fail.")
 
-# Initialize Gemini AI Model
+# The Gemini model is built lazily, once per worker process (see services/clients.py)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genAI_model = None
 if GEMINI_API_KEY:
-    try:
-        configure(api_key=GEMINI_API_KEY)
-        genAI_model = GenerativeModel(model_name="models/gemini-2.5-flash")
-        print("🔑 Gemini AI: ✅ Connected (using configure)")
-    except Exception as e:
-        print(f"❌ Gemini AI connection failed: {e}")
+    print("🔑 Gemini AI: ✅ API key found (model is created on first use)")
 else:
     print("🔑 Gemini AI: ❌ No API key found. AI recommendations will be limited.")
 
-# --- API ROUTES ---
+# --- BATCH ENDPOINT CONFIGURATION ---
+# All per-domain Qloo lookups of one batch request must finish within this shared deadline.
+BATCH_DEADLINE_SECONDS = float(os.getenv("BATCH_DEADLINE_SECONDS", 8))
+BATCH_GEMINI_TIMEOUT_SECONDS = float(os.getenv("BATCH_GEMINI_TIMEOUT_SECONDS", 60))
+# Lookups run with BATCH_DEADLINE_SECONDS as their request deadline, so the Qloo client stops
+# retrying and shortens its timeouts to end close to it; ones still queued at the deadline are
+# cancelled. Threads are only started on first use, so this is safe to create before gunicorn forks.
+_batch_executor = ThreadPoolExecutor(max_workers=int(os.getenv("BATCH_MAX_WORKERS", 16)), thread_name_prefix="batch-qloo")
 
-@app.route('/api/recommendations', methods=['POST'])
-def recommendations():
-    data = request.get_json()
-    user_input = data.get('userInput')
-    domain = data.get('domain')
+# --- REQUEST INSTRUMENTATION ---
 
-    if not user_input or not domain:
-        return jsonify({"error": "Missing required fields (userInput, domain)"}), 400
+@app.before_request
+def _start_timing():
+    g.request_started = time.perf_counter()
+    g.request_id = set_request_id(request.headers.get("X-Request-ID"))
+    # Queue and rate-limit waits downstream are bounded by this request's deadline
+    g.request_deadline = set_request_deadline(request_timeout(request.headers.get("X-Request-Timeout")))
+    start_request_timing()
 
-    recommendations_text = ""
+@app.after_request
+def _add_server_timing(response):
+    started = g.pop("request_started", None)
+    # A streamed body has not been produced yet; _run_stream_in_request_context records its timing when it closes.
+    if started is not None and not g.pop("stream_timing", False):
+        response.headers["Server-Timing"] = finish_request_timing(
+            request.endpoint or "unknown", response.status_code, time.perf_counter() - started
+        )
+        # Lets the frontend origin read the timings via the Resource Timing API too
+        response.headers["Timing-Allow-Origin"] = FRONTEND_URL
+    request_id = g.pop("request_id", None)
+    if request_id:
+        response.headers["X-Request-ID"] = request_id
+    clear_request_id()
+    clear_request_deadline()
+    return response
+
+# --- RECOMMENDATION PIPELINE HELPERS ---
+
+def _get_qloo_context(user_input: str, domain: str) -> tuple[str, list]:
+    """
+    Runs the Qloo search + insights lookup and returns (status_message, qloo_recommendations).
+    Never raises: Qloo failures are folded into the status message for Gemini.
+    """
     # Initialize these with defaults in case Qloo service completely fails
     qloo_status_message_for_gemini = "Qloo could not provide specific insights for this query."
     qloo_specific_recommendations = []
@@ -71,71 +121,447 @@ def recommendations():
         
     except ValueError as e:
         app.logger.error(f"Qloo service error: {e}")
+        record_fallback("qloo_error")
         qloo_status_message_for_gemini = f"Qloo service encountered an error: {e}"
     except Exception as e:
         app.logger.error(f"An unexpected error in Qloo service call: {e}")
+        record_fallback("qloo_error")
         qloo_status_message_for_gemini = f"An unexpected error occurred during Qloo processing: {e}"
 
+    return qloo_status_message_for_gemini, qloo_specific_recommendations
+
+def _generate_text(prompt: BuiltPrompt, **generate_kwargs) -> str:
+    """
+    One timed, non-streaming Gemini call with the prompt's generation config (bounded output);
+    raises RateLimitExceeded if the shared Gemini budget is spent.
+    """
+    get_rate_limiter().acquire("gemini")
+    with stage("gemini"):
+        response = get_gemini_model().generate_content(
+            prompt.text, generation_config=prompt.generation_config, **generate_kwargs
+        )
+    return gemini_response_text(response, json_reply=expects_json(prompt))
+def _degraded_recommendations(user_input: str, domain: str, qloo_specific_recommendations: list | None = None) -> str:
+    """
+    Cheap answer for a shed request, using no upstream calls: a narrative cached for the same
+    input, else the Qloo picks (from this request, or from the local caches), else a retry hint.
+    """
+    cached_text = get_narrative_cache().get_degraded(domain, user_input)
+    if cached_text is not None:
+        return cached_text
+    if qloo_specific_recommendations is None:
+        qloo_specific_recommendations = get_cached_user_tastes(user_input, domain)
+    return degraded_recommendations_text(user_input, domain, qloo_specific_recommendations)
+
+def _run_admitted_pipeline(user_input: str, domain: str, deadline: float) -> tuple[str, bool]:
+    """Runs the pipeline under admission control; returns (text, degraded)."""
+    try:
+        with get_admission_controller().admit(deadline):
+            return _run_recommendation_pipeline(user_input, domain)
+    except AdmissionRejected as e:
+        app.logger.warning(f"Shedding recommendation request ({e.reason}); serving a degraded answer.")
+        return _degraded_recommendations(user_input, domain), True
+
+def _run_recommendation_pipeline(user_input: str, domain: str) -> tuple[str, bool]:
+    """Qloo lookup followed by Gemini generation; returns (recommendation text, degraded)."""
+    recommendations_text = ""
+    qloo_status_message_for_gemini, qloo_specific_recommendations = _get_qloo_context(user_input, domain)
+
     # --- Step 2: Generate recommendations using Gemini AI ---
-    if genAI_model:
-        # --- Prepare Qloo context for Gemini ---
-        qloo_context_for_gemini = ""
-        if qloo_specific_recommendations:
-            # Format the list of Qloo recommendations for Gemini
-            # Example: "Rihanna, Adele, Mariah Carey"
-            recommended_names = [item.get('name', 'unknown') for item in qloo_specific_recommendations if item.get('name')]
-            if recommended_names:
-                qloo_context_for_gemini = f"Based on Qloo's Taste AI, here are some specific recommendations: {', '.join(recommended_names)}."
-            else:
-                # If recommendations list is not empty but names couldn't be extracted
-                qloo_context_for_gemini = f"Qloo returned some results, but could not extract specific names. (Status: {qloo_status_message_for_gemini})"
-        else:
-            # If Qloo returned no specific recommendations or encountered an issue
-            qloo_context_for_gemini = f"Qloo could not provide specific insights for this query. (Status: {qloo_status_message_for_gemini})"
+    if get_gemini_model():
+        # Repeated intents (same domain, same Qloo entities, same or near-identical input) reuse a narrative
+        narrative_cache = get_narrative_cache()
+        cached_text = narrative_cache.get(domain, user_input, qloo_status_message_for_gemini, qloo_specific_recommendations)
+        if cached_text is not None:
+            return cached_text, False
 
-        prompt = f"""
-        You are a cultural intelligence AI that creates beautiful, personalized recommendations.
-        
-        User Input: "{user_input}"
-        Domain: {domain}
-        
-        {qloo_context_for_gemini}
-        
-        Given the user's input, the domain, AND the specific recommendations from Qloo (if any), create a beautifully written, personalized recommendation that:
-        1. Acknowledges their cultural preferences and mood
-        2. Integrates and elaborates on the specific recommendations provided by Qloo (if available). If Qloo had no specific recommendations, state that your recommendations are based on general knowledge.
-        3. Explains the cultural connections and why these fit their taste.
-        4. Uses a warm, creative, and inspiring tone
-        5. Formats your response as a cohesive, flowing narrative (not a list) that feels personal and insightful.
-        Make it feel like advice from a culturally savvy friend who truly understands their taste.
-        """
+        with stage("prompt_build"):
+            prompt = build_narrative_prompt(user_input, domain, qloo_status_message_for_gemini, qloo_specific_recommendations)
         
         try:
-            result = genAI_model.generate_content(prompt)
-            recommendations_text = result.text
+            # Requests that build an identical prompt share one in-flight Gemini call
+            recommendations_text = get_singleflight("gemini").do(prompt.text, lambda: _generate_text(prompt))
+            narrative_cache.set(domain, user_input, qloo_status_message_for_gemini, qloo_specific_recommendations, recommendations_text)
+        except RequestDeadlineExceeded:
+            app.logger.warning("Deadline passed waiting for an identical in-flight Gemini call; serving Qloo-only recommendations.")
+            record_fallback("coalesced_deadline")
+            return _degraded_recommendations(user_input, domain, qloo_specific_recommendations), True
+        except RateLimitExceeded:
+            app.logger.warning("Gemini rate limit budget exhausted; serving Qloo-only recommendations.")
+            record_fallback("gemini_rate_limited")
+            return _degraded_recommendations(user_input, domain, qloo_specific_recommendations), True
         except Exception as gemini_error:
             app.logger.error(f"❌ Error generating recommendations with Gemini: {gemini_error}", exc_info=True)
-            recommendations_text = "Failed to generate AI recommendations. Please try again later. (Gemini error)."
+            record_fallback("gemini_error")
+            recommendations_text = GEMINI_ERROR_TEXT
             
     else:
-        # Fallback message if Gemini API key is not configured
-        recommendations_text = f"""
-        Based on your interest in "{user_input}" and the {domain} domain, here are some personalized recommendations.
-        
-        This is a fallback response. To get full AI-powered recommendations, please ensure your GEMINI_API_KEY is correctly set in the .env file.
-        (Qloo feedback: {qloo_status_message_for_gemini})
-        """
+        record_fallback("gemini_not_configured")
+        recommendations_text = fallback_recommendations_text(user_input, domain, qloo_status_message_for_gemini)
+
+    return recommendations_text, False
+
+def _sse_event(event: str, payload: dict) -> str:
+    """Formats one Server-Sent Events message with a JSON data line."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def _cancel_gemini_stream(stream_response):
+    """
+    Best-effort cancellation of an in-flight streaming generate_content call.
+    The SDK has no public cancel, but the underlying gRPC call object does.
+    """
+    upstream_call = getattr(stream_response, "_iterator", None)
+    cancel = getattr(upstream_call, "cancel", None)
+    if callable(cancel):
+        try:
+            cancel()
+        except Exception as e:
+            app.logger.debug(f"Cancelling Gemini stream failed: {e}")
+
+# --- API ROUTES ---
+
+@app.route('/api/recommendations', methods=['POST'])
+def recommendations():
+    data = request.get_json()
+    user_input = data.get('userInput')
+    domain = data.get('domain')
+
+    if not user_input or not domain:
+        return jsonify({"error": "Missing required fields (userInput, domain)"}), 400
+
+    # Clients that ask for an event stream get the streaming variant of this endpoint
+    if request.accept_mimetypes.best == "text/event-stream":
+        return _stream_recommendations_response(user_input, domain)
+
+    # Identical concurrent requests (same normalized input and domain) share one pipeline run,
+    # which waits for a slot only as long as this request's deadline allows
+    deadline = g.request_deadline
+    try:
+        recommendations_text, degraded = get_singleflight("recommendations").do(
+            (normalize_query(user_input), domain.lower()),
+            lambda: _run_admitted_pipeline(user_input, domain, deadline),
+        )
+    except RequestDeadlineExceeded:
+        app.logger.warning("Deadline passed waiting for an identical in-flight request; serving a degraded answer.")
+        record_fallback("coalesced_deadline")
+        recommendations_text, degraded = _degraded_recommendations(user_input, domain), True
 
     # Return the generated recommendations to the frontend
+    if degraded:
+        return jsonify({"recommendations": recommendations_text, "degraded": True})
     return jsonify({"recommendations": recommendations_text})
 
+# Streaming (Server-Sent Events) variant: Qloo entities first, then Gemini chunks as they arrive
+@app.route('/api/recommendations/stream', methods=['POST'])
+def recommendations_stream():
+    data = request.get_json()
+    user_input = data.get('userInput')
+    domain = data.get('domain')
+
+    if not user_input or not domain:
+        return jsonify({"error": "Missing required fields (userInput, domain)"}), 400
+
+    return _stream_recommendations_response(user_input, domain)
+
+def _run_stream_in_request_context(chunks, endpoint: str):
+    """
+    Iterates a streamed body inside a copy of the request's context. The body runs after
+    after_request has cleared the request ID, deadline and stage timings, so without this
+    its logs lose their request_id, rate-limit waits ignore the deadline and its stages
+    go unrecorded. The request's latency is recorded when the stream closes, and its
+    Server-Timing value is logged since the headers have long been sent by then.
+    """
+    context = contextvars.copy_context()
+    started = g.request_started
+    g.stream_timing = True
+
+    def finish():
+        chunks.close()
+        server_timing = finish_request_timing(endpoint, 200, time.perf_counter() - started)
+        app.logger.info(f"Streamed response finished; Server-Timing: {server_timing}")
+
+    def run():
+        try:
+            while True:
+                try:
+                    chunk = context.run(next, chunks)
+                except StopIteration:
+                    return
+                yield chunk
+        finally:
+            context.run(finish)
+
+    return run()
+
+def _stream_recommendations_response(user_input: str, domain: str) -> Response:
+    """
+    Builds the text/event-stream response. Events, in order:
+      entities -> {"entities": [...], "status": "..."}
+      chunk    -> {"text": "..."} (repeated)
+      error    -> {"error": "..."} (only if generation fails)
+      done     -> {} ({"degraded": true} when the Gemini budget was spent and Qloo picks were sent instead)
+    If the client disconnects, the generator is closed at its next yield and the
+    upstream Gemini stream is cancelled.
+    """
+    def generate():
+        qloo_status_message_for_gemini, qloo_specific_recommendations = _get_qloo_context(user_input, domain)
+        yield _sse_event("entities", {"entities": qloo_specific_recommendations, "status": qloo_status_message_for_gemini})
+
+        genAI_model = get_gemini_model()
+        if not genAI_model:
+            record_fallback("gemini_not_configured")
+            yield _sse_event("chunk", {"text": fallback_recommendations_text(user_input, domain, qloo_status_message_for_gemini)})
+            yield _sse_event("done", {})
+            return
+
+        narrative_cache = get_narrative_cache()
+        cached_text = narrative_cache.get(domain, user_input, qloo_status_message_for_gemini, qloo_specific_recommendations)
+        if cached_text is not None:
+            yield _sse_event("chunk", {"text": cached_text})
+            yield _sse_event("done", {})
+            return
+
+        with stage("prompt_build"):
+            prompt = build_narrative_prompt(user_input, domain, qloo_status_message_for_gemini, qloo_specific_recommendations)
+
+        try:
+            get_rate_limiter().acquire("gemini")
+        except RateLimitExceeded:
+            record_fallback("gemini_rate_limited")
+            yield _sse_event("chunk", {"text": _degraded_recommendations(user_input, domain, qloo_specific_recommendations)})
+            yield _sse_event("done", {"degraded": True})
+            return
+
+        stream_response = None
+        completed = False
+        streamed_text = []
+        try:
+            with stage("gemini_stream"):
+                stream_response = genAI_model.generate_content(
+                    prompt.text, stream=True, generation_config=prompt.generation_config
+                )
+                finish_reason = None
+                for chunk in stream_response:
+                    # The last chunk of a reply cut off by max_output_tokens has no parts, and chunk.text would raise.
+                    text = gemini_chunk_text(chunk)
+                    finish_reason = gemini_finish_reason(chunk) or finish_reason
+                    if text:
+                        streamed_text.append(text)
+                        yield _sse_event("chunk", {"text": text})
+            if finish_reason == "MAX_TOKENS":
+                record_fallback("gemini_max_tokens")
+                app.logger.warning("Streamed Gemini reply stopped at max_output_tokens.")
+            if not "".join(streamed_text).strip():
+                raise GeminiNoTextError(f"Gemini streamed no text (finish reason: {finish_reason}).")
+            completed = True
+            narrative_cache.set(
+                domain, user_input, qloo_status_message_for_gemini, qloo_specific_recommendations, "".join(streamed_text)
+            )
+        except GeneratorExit:
+            app.logger.info("Client disconnected from recommendation stream; cancelling Gemini generation.")
+            raise
+        except Exception as gemini_error:
+            app.logger.error(f"❌ Error streaming recommendations with Gemini: {gemini_error}", exc_info=True)
+            record_fallback("gemini_error")
+            yield _sse_event("error", {"error": GEMINI_ERROR_TEXT})
+        finally:
+            if not completed and stream_response is not None:
+                _cancel_gemini_stream(stream_response)
+
+        yield _sse_event("done", {})
+
+    return Response(
+        stream_with_context(_run_stream_in_request_context(generate(), request.endpoint or "unknown")),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Multi-domain variant: concurrent per-domain Qloo lookups, then one Gemini call for all narratives
+@app.route('/api/recommendations/batch', methods=['POST'])
+def recommendations_batch():
+    data = request.get_json()
+    user_input = data.get('userInput')
+    domains = data.get('domains')
+
+    if not user_input or not isinstance(domains, list) or not domains:
+        return jsonify({"error": "Missing required fields (userInput, domains)"}), 400
+
+    domains = list(dict.fromkeys(str(domain).lower() for domain in domains))
+    unknown_domains = [domain for domain in domains if domain not in QLOO_DOMAIN_MAPPING]
+    if unknown_domains:
+        return jsonify({
+            "error": f"Unknown domains: {', '.join(unknown_domains)}",
+            "supported_domains": sorted(QLOO_DOMAIN_MAPPING),
+        }), 400
+
+    # --- Step 1: Fan out the Qloo lookups under one shared deadline ---
+    # Each lookup gets a copy of this request's context (Server-Timing collector, request ID)
+    # with the batch deadline, or the request's own if that is sooner, as its deadline.
+    remaining = time_remaining()
+    lookup_seconds = BATCH_DEADLINE_SECONDS if remaining is None else min(BATCH_DEADLINE_SECONDS, remaining)
+    futures = {}
+    for domain in domains:
+        lookup_context = contextvars.copy_context()
+        lookup_context.run(set_request_deadline, lookup_seconds)
+        futures[domain] = _batch_executor.submit(lookup_context.run, _get_qloo_context, user_input, domain)
+    done, _ = wait(futures.values(), timeout=lookup_seconds)
+
+    domain_results = {}
+    for domain, future in futures.items():
+        if future in done:
+            qloo_status_message_for_gemini, qloo_specific_recommendations = future.result()
+            domain_results[domain] = {
+                "status": "ok" if qloo_specific_recommendations else "no_results",
+                "qloo_status": qloo_status_message_for_gemini,
+                "entities": qloo_specific_recommendations,
+            }
+        else:
+            # Not started yet: drop it so it does not hold a pool thread for nobody. One already
+            # running ends with its deadline; a late result still warms the entity and insights caches.
+            future.cancel()
+            app.logger.warning(f"Qloo lookup for '{domain}' missed the {BATCH_DEADLINE_SECONDS}s batch deadline.")
+            record_fallback("batch_deadline")
+            domain_results[domain] = {
+                "status": "timeout",
+                "qloo_status": f"Qloo did not respond within {BATCH_DEADLINE_SECONDS} seconds.",
+                "entities": [],
+            }
+
+    # --- Step 2: One Gemini call for every domain ---
+    if not get_gemini_model():
+        record_fallback("gemini_not_configured")
+        narratives = {
+            domain: fallback_recommendations_text(user_input, domain, result["qloo_status"])
+            for domain, result in domain_results.items()
+        }
+        return jsonify(build_batch_response(domain_results, narratives, GEMINI_ERROR_TEXT))
+
+    with stage("prompt_build"):
+        prompt = build_batch_prompt(
+            user_input, {domain: (result["qloo_status"], result["entities"]) for domain, result in domain_results.items()}
+        )
+    narratives = {}
+    try:
+        response_text = get_singleflight("gemini").do(
+            prompt.text,
+            lambda: _generate_text(prompt, request_options={"timeout": BATCH_GEMINI_TIMEOUT_SECONDS}),
+        )
+        narratives = parse_batch_narratives(response_text, domains)
+        missing = [domain for domain in domains if domain not in narratives]
+        if missing:
+            app.logger.warning(f"Gemini batch reply had no narrative for: {', '.join(missing)}")
+    except RequestDeadlineExceeded:
+        app.logger.warning("Deadline passed waiting for an identical in-flight Gemini call; serving Qloo-only batch narratives.")
+        record_fallback("coalesced_deadline")
+        narratives = {
+            domain: degraded_recommendations_text(user_input, domain, result["entities"])
+            for domain, result in domain_results.items()
+        }
+    except RateLimitExceeded:
+        app.logger.warning("Gemini rate limit budget exhausted; serving Qloo-only batch narratives.")
+        record_fallback("gemini_rate_limited")
+        narratives = {
+            domain: degraded_recommendations_text(user_input, domain, result["entities"])
+            for domain, result in domain_results.items()
+        }
+    except Exception as gemini_error:
+        app.logger.error(f"❌ Error generating batch recommendations with Gemini: {gemini_error}", exc_info=True)
+        record_fallback("gemini_error")
+
+    return jsonify(build_batch_response(domain_results, narratives, GEMINI_ERROR_TEXT))
+
+def _get_chat_qloo_context(state: dict, message: str, domain: str | None) -> tuple[str, list]:
+    """The session's Qloo context for this domain, fetched only on the first turn there or for a new entity."""
+    if domain is None:
+        return "", []
+    local_entity_id = resolve_entity_locally(message, domain)
+    cached = cached_qloo_context(state, domain, local_entity_id)
+    if cached is not None:
+        return cached
+    qloo_status_message_for_gemini, qloo_specific_recommendations = _get_qloo_context(message, domain)
+    # The lookup above caches whatever /search resolved, so this is a local read.
+    remember_qloo_context(
+        state, domain, local_entity_id or resolve_entity_locally(message, domain),
+        qloo_status_message_for_gemini, qloo_specific_recommendations,
+    )
+    return qloo_status_message_for_gemini, qloo_specific_recommendations
+
+# Conversation endpoint for the FloatingAssistant. Session state (Qloo context, compacted history)
+# is kept server-side, so follow-up turns skip Qloo and send Gemini a bounded prompt.
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    data = request.get_json()
+    message = str(data.get('message') or '').strip()
+    page = str(data.get('page') or 'home').lower()
+
+    if not message:
+        return jsonify({"error": "Missing required field (message)"}), 400
+
+    store = get_chat_session_store()
+    state = store.get(data.get('sessionId')) or new_session_state()
+    domain = page if page in QLOO_DOMAIN_MAPPING and page != "general" else None
+    qloo_status_message_for_gemini, qloo_specific_recommendations = _get_chat_qloo_context(state, message, domain)
+
+    degraded = False
+    if not get_gemini_model():
+        record_fallback("gemini_not_configured")
+        reply = chat_fallback_text(page)
+    else:
+        with stage("prompt_build"):
+            prompt = build_chat_prompt(
+                message, page, qloo_status_message_for_gemini, qloo_specific_recommendations,
+                state["summary"], state["recent"],
+            )
+        try:
+            reply = _generate_text(prompt)
+            record_turn(state, message, reply)
+        except RateLimitExceeded:
+            app.logger.warning("Gemini rate limit budget exhausted; sending the chat fallback reply.")
+            record_fallback("gemini_rate_limited")
+            reply, degraded = chat_fallback_text(page), True
+        except Exception as gemini_error:
+            app.logger.error(f"❌ Error generating chat reply with Gemini: {gemini_error}", exc_info=True)
+            record_fallback("gemini_error")
+            reply = GEMINI_ERROR_TEXT
+    # Saved even when generation failed, so the fetched Qloo context is not lost.
+    store.save(state)
+
+    response = {"sessionId": state["session_id"], "reply": reply, "turn": state["turns"]}
+    if degraded:
+        response["degraded"] = True
+    return jsonify(response)
+
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "ok", "timestamp": datetime.now().isoformat()})
 
+# Upstream client and cache status (per worker process)
+@app.route('/api/status', methods=['GET'])
+def upstream_status():
+    return jsonify({
+        "timestamp": datetime.now().isoformat(),
+        "qloo": get_qloo_client().stats(),
+        "entity_cache": get_entity_cache().stats(),
+        "entity_index": get_entity_index().stats(),
+        "clients": get_client_registry().stats(),
+        "rate_limiter": get_rate_limiter().stats(),
+        "admission": get_admission_controller().stats(),
+        "insights_cache": get_insights_cache().stats(),
+        "narrative_cache": get_narrative_cache().stats(),
+        "chat_sessions": get_chat_session_store().stats(),
+        "singleflight": singleflight_stats(),
+    })
+
+# Prometheus metrics, aggregated across gunicorn workers (see gunicorn.conf.py)
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
 # --- SERVER STARTUP ---
 if __name__ == '__main__':
+    warm_up_if_enabled()
     app.run(debug=True, host='0.0.0.0', port=PORT)
 
     print(f"🚀 CultureSphere AI Backend Server running on port {PORT}")
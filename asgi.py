@@ -0,0 +1,539 @@
+import os
+import json
+import time
+import asyncio
+from datetime import datetime
+
+from quart import Quart, Response, g, request, jsonify
+from quart_cors import cors
+from dotenv import load_dotenv
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# --- IMPORTS FOR YOUR SERVICES ---
+from services.qloo_service import get_user_tastes_async, get_cached_user_tastes, resolve_entity_locally, QLOO_DOMAIN_MAPPING
+from services.qloo_async_client import get_async_qloo_client
+from services.clients import get_gemini_model, get_client_registry
+from services.entity_cache import get_entity_cache, normalize_query
+from services.entity_index import get_entity_index
+from services.singleflight import get_singleflight, singleflight_stats
+from services.rate_limiter import (
+    get_rate_limiter, RateLimitExceeded, set_request_deadline, clear_request_deadline, time_remaining,
+    RequestDeadlineExceeded,
+)
+from services.admission import AsyncAdmissionController, AdmissionRejected, request_timeout
+from services.logging_config import configure_logging, set_request_id, clear_request_id
+from services.metrics import (
+    stage, record_fallback, start_request_timing, finish_request_timing, render_metrics,
+)
+from services.insights_cache import get_insights_cache
+from services.narrative_cache import get_narrative_cache
+from services.chat_sessions import (
+    get_chat_session_store, new_session_state, record_turn, cached_qloo_context, remember_qloo_context,
+)
+from services.recommendation_pipeline import (
+    fallback_recommendations_text, degraded_recommendations_text, GEMINI_ERROR_TEXT, gemini_response_text,
+    gemini_chunk_text, gemini_finish_reason, GeminiNoTextError, parse_batch_narratives, build_batch_response,
+    chat_fallback_text,
+)
+from services.prompt_builder import BuiltPrompt, expects_json, build_narrative_prompt, build_batch_prompt, build_chat_prompt
+
+# --- ASGI APP SETUP ---
+# Async entry point for the recommendation pipeline. It keeps the JSON contract of
+# app.py but awaits Qloo (httpx) and Gemini (generate_content_async), so a single
+# event-loop worker holds many requests in flight instead of one per sync worker:
+#   gunicorn asgi:app -k uvicorn.workers.UvicornWorker -w 2
+app = Quart(__name__)
+
+# Maximum number of recommendation pipelines one worker runs at once; extra requests queue
+# (up to ADMISSION_MAX_QUEUE) until their deadline, then get a degraded answer.
+ASYNC_MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", 100))
+BATCH_DEADLINE_SECONDS = float(os.getenv("BATCH_DEADLINE_SECONDS", 8))
+BATCH_GEMINI_TIMEOUT_SECONDS = float(os.getenv("BATCH_GEMINI_TIMEOUT_SECONDS", 60))
+
+# --- CORS CONFIGURATION ---
+FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
+app = cors(app, allow_origin=FRONTEND_URL, allow_credentials=True)
+
+# --- GLOBAL LOGGING CONFIGURATION ---
+# LOG_MODE=dev (default) keeps human-readable lines; LOG_MODE=json logs structured lines off-thread.
+configure_logging()
+
+# --- ENVIRONMENT VARIABLE CHECKS & API INITIALIZATION ---
+QLOO_API_KEY = os.getenv("QLOO_API_KEY")
+if not QLOO_API_KEY:
+    print("❌ QLOO_API_KEY is not set in environment variables! Qloo API calls will likely fail.")
+
+# The Gemini model is built lazily, once per worker process (see services/clients.py)
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+if GEMINI_API_KEY:
+    print("🔑 Gemini AI: ✅ API key found (model is created on first use, async)")
+else:
+    print("🔑 Gemini AI: ❌ No API key found. AI recommendations will be limited.")
+
+_admission = AsyncAdmissionController(max_concurrent=ASYNC_MAX_CONCURRENCY)
+
+# --- REQUEST INSTRUMENTATION ---
+
+@app.before_request
+async def _start_timing():
+    g.request_started = time.perf_counter()
+    g.request_id = set_request_id(request.headers.get("X-Request-ID"))
+    g.request_deadline = set_request_deadline(request_timeout(request.headers.get("X-Request-Timeout")))
+    start_request_timing()
+
+@app.after_request
+async def _add_server_timing(response):
+    started = g.pop("request_started", None)
+    # A streamed body has not been produced yet; _run_stream_in_request_context records its
+    # timing and clears the request ID and deadline when it closes.
+    streamed = g.pop("stream_timing", False)
+    if started is not None and not streamed:
+        response.headers["Server-Timing"] = finish_request_timing(
+            request.endpoint or "unknown", response.status_code, time.perf_counter() - started
+        )
+        response.headers["Timing-Allow-Origin"] = FRONTEND_URL
+    request_id = g.pop("request_id", None)
+    if request_id:
+        response.headers["X-Request-ID"] = request_id
+    if not streamed:
+        clear_request_id()
+        clear_request_deadline()
+    return response
+
+# --- RECOMMENDATION PIPELINE HELPERS ---
+
+async def _get_qloo_context(user_input: str, domain: str) -> tuple[str, list]:
+    """Async counterpart of app._get_qloo_context; never raises."""
+    qloo_status_message_for_gemini = "Qloo could not provide specific insights for this query."
+    qloo_specific_recommendations = []
+
+    try:
+        qloo_result = await get_user_tastes_async(user_input, domain, QLOO_API_KEY)
+        qloo_status_message_for_gemini = qloo_result.get("status_message", qloo_status_message_for_gemini)
+        qloo_specific_recommendations = qloo_result.get("qloo_recommendations", [])
+    except ValueError as e:
+        app.logger.error(f"Qloo service error: {e}")
+        record_fallback("qloo_error")
+        qloo_status_message_for_gemini = f"Qloo service encountered an error: {e}"
+    except Exception as e:
+        app.logger.error(f"An unexpected error in Qloo service call: {e}")
+        record_fallback("qloo_error")
+        qloo_status_message_for_gemini = f"An unexpected error occurred during Qloo processing: {e}"
+
+    return qloo_status_message_for_gemini, qloo_specific_recommendations
+
+async def _degraded_recommendations(user_input: str, domain: str, qloo_specific_recommendations: list | None = None) -> str:
+    """Same as app._degraded_recommendations: cached narrative, else Qloo picks, else a retry hint."""
+    cached_text = get_narrative_cache().get_degraded(domain, user_input)
+    if cached_text is not None:
+        return cached_text
+    if qloo_specific_recommendations is None:
+        # The entity cache lookup may hit SQLite, so keep it off the event loop.
+        qloo_specific_recommendations = await asyncio.to_thread(get_cached_user_tastes, user_input, domain)
+    return degraded_recommendations_text(user_input, domain, qloo_specific_recommendations)
+
+async def _run_admitted_pipeline(user_input: str, domain: str, deadline: float) -> tuple[str, bool]:
+    """Async counterpart of app._run_admitted_pipeline; returns (text, degraded)."""
+    try:
+        async with _admission.admit_async(deadline):
+            return await _run_recommendation_pipeline(user_input, domain)
+    except AdmissionRejected as e:
+        app.logger.warning(f"Shedding recommendation request ({e.reason}); serving a degraded answer.")
+        return await _degraded_recommendations(user_input, domain), True
+
+async def _run_recommendation_pipeline(user_input: str, domain: str) -> tuple[str, bool]:
+    """Async counterpart of app._run_recommendation_pipeline."""
+    qloo_status_message_for_gemini, qloo_specific_recommendations = await _get_qloo_context(user_input, domain)
+
+    if not get_gemini_model():
+        record_fallback("gemini_not_configured")
+        return fallback_recommendations_text(user_input, domain, qloo_status_message_for_gemini), False
+
+    narrative_cache = get_narrative_cache()
+    cached_text = narrative_cache.get(domain, user_input, qloo_status_message_for_gemini, qloo_specific_recommendations)
+    if cached_text is not None:
+        return cached_text, False
+
+    with stage("prompt_build"):
+        prompt = build_narrative_prompt(user_input, domain, qloo_status_message_for_gemini, qloo_specific_recommendations)
+    try:
+        recommendations_text = await get_singleflight("gemini").do_async(prompt.text, lambda: _generate_text_async(prompt))
+        narrative_cache.set(domain, user_input, qloo_status_message_for_gemini, qloo_specific_recommendations, recommendations_text)
+        return recommendations_text, False
+    except RequestDeadlineExceeded:
+        app.logger.warning("Deadline passed waiting for an identical in-flight Gemini call; serving Qloo-only recommendations.")
+        record_fallback("coalesced_deadline")
+        return await _degraded_recommendations(user_input, domain, qloo_specific_recommendations), True
+    except RateLimitExceeded:
+        app.logger.warning("Gemini rate limit budget exhausted; serving Qloo-only recommendations.")
+        record_fallback("gemini_rate_limited")
+        return await _degraded_recommendations(user_input, domain, qloo_specific_recommendations), True
+    except Exception as gemini_error:
+        app.logger.error(f"❌ Error generating recommendations with Gemini: {gemini_error}", exc_info=True)
+        record_fallback("gemini_error")
+        return GEMINI_ERROR_TEXT, False
+
+async def _generate_text_async(prompt: BuiltPrompt, **generate_kwargs) -> str:
+    """Async counterpart of app._generate_text."""
+    await get_rate_limiter().acquire_async("gemini")
+    with stage("gemini"):
+        result = await get_gemini_model().generate_content_async(
+            prompt.text, generation_config=prompt.generation_config, **generate_kwargs
+        )
+    return gemini_response_text(result, json_reply=expects_json(prompt))
+def _sse_event(event: str, payload: dict) -> str:
+    """Formats one Server-Sent Events message with a JSON data line."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+async def _cancel_gemini_stream(stream_response):
+    """
+    Async counterpart of app._cancel_gemini_stream. The async SDK reads the gRPC call through
+    an async generator, so the call is taken from that generator's frame; only closing the
+    generator would leave the call running until it is garbage collected.
+    """
+    upstream = getattr(stream_response, "_iterator", None)
+    frame = getattr(upstream, "ag_frame", None)
+    upstream_call = frame.f_locals.get("self") if frame is not None else upstream
+    cancel = getattr(upstream_call, "cancel", None)
+    aclose = getattr(upstream, "aclose", None)
+    try:
+        if callable(cancel):
+            cancel()
+        if callable(aclose):
+            await aclose()
+    except Exception as e:
+        app.logger.debug(f"Cancelling Gemini stream failed: {e}")
+
+# --- API ROUTES ---
+
+@app.route('/api/recommendations', methods=['POST'])
+async def recommendations():
+    data = await request.get_json()
+    user_input = data.get('userInput')
+    domain = data.get('domain')
+
+    if not user_input or not domain:
+        return jsonify({"error": "Missing required fields (userInput, domain)"}), 400
+
+    # Clients that ask for an event stream get the streaming variant of this endpoint
+    if request.accept_mimetypes.best == "text/event-stream":
+        return _stream_recommendations_response(user_input, domain)
+
+    deadline = g.request_deadline
+    try:
+        recommendations_text, degraded = await get_singleflight("recommendations").do_async(
+            (normalize_query(user_input), domain.lower()),
+            lambda: _run_admitted_pipeline(user_input, domain, deadline),
+        )
+    except RequestDeadlineExceeded:
+        app.logger.warning("Deadline passed waiting for an identical in-flight request; serving a degraded answer.")
+        record_fallback("coalesced_deadline")
+        recommendations_text, degraded = await _degraded_recommendations(user_input, domain), True
+    if degraded:
+        return jsonify({"recommendations": recommendations_text, "degraded": True})
+    return jsonify({"recommendations": recommendations_text})
+
+# Streaming (Server-Sent Events) variant: Qloo entities first, then Gemini chunks as they arrive
+@app.route('/api/recommendations/stream', methods=['POST'])
+async def recommendations_stream():
+    data = await request.get_json()
+    user_input = data.get('userInput')
+    domain = data.get('domain')
+
+    if not user_input or not domain:
+        return jsonify({"error": "Missing required fields (userInput, domain)"}), 400
+
+    return _stream_recommendations_response(user_input, domain)
+
+def _run_stream_in_request_context(chunks, endpoint: str):
+    """
+    Async counterpart of app._run_stream_in_request_context. Quart sends the body after
+    after_request has run, which leaves the request ID, deadline and stage timings in place
+    for streamed responses; this records the request's latency and clears them when the
+    stream closes, and logs the Server-Timing value since the headers are long sent.
+    """
+    started = g.request_started
+    g.stream_timing = True
+
+    async def run():
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+            server_timing = finish_request_timing(endpoint, 200, time.perf_counter() - started)
+            app.logger.info(f"Streamed response finished; Server-Timing: {server_timing}")
+            clear_request_id()
+            clear_request_deadline()
+
+    return run()
+
+def _stream_recommendations_response(user_input: str, domain: str) -> Response:
+    """
+    Async counterpart of app._stream_recommendations_response, with the same events:
+      entities -> {"entities": [...], "status": "..."}
+      chunk    -> {"text": "..."} (repeated)
+      error    -> {"error": "..."} (only if generation fails)
+      done     -> {} ({"degraded": true} when the Gemini budget was spent and Qloo picks were sent instead)
+    If the client disconnects, Quart cancels the body (or closes it at its next yield) and
+    the upstream Gemini stream is cancelled.
+    """
+    async def generate():
+        qloo_status_message_for_gemini, qloo_specific_recommendations = await _get_qloo_context(user_input, domain)
+        yield _sse_event("entities", {"entities": qloo_specific_recommendations, "status": qloo_status_message_for_gemini})
+
+        genAI_model = get_gemini_model()
+        if not genAI_model:
+            record_fallback("gemini_not_configured")
+            yield _sse_event("chunk", {"text": fallback_recommendations_text(user_input, domain, qloo_status_message_for_gemini)})
+            yield _sse_event("done", {})
+            return
+
+        narrative_cache = get_narrative_cache()
+        cached_text = narrative_cache.get(domain, user_input, qloo_status_message_for_gemini, qloo_specific_recommendations)
+        if cached_text is not None:
+            yield _sse_event("chunk", {"text": cached_text})
+            yield _sse_event("done", {})
+            return
+
+        with stage("prompt_build"):
+            prompt = build_narrative_prompt(user_input, domain, qloo_status_message_for_gemini, qloo_specific_recommendations)
+
+        try:
+            await get_rate_limiter().acquire_async("gemini")
+        except RateLimitExceeded:
+            record_fallback("gemini_rate_limited")
+            yield _sse_event("chunk", {"text": await _degraded_recommendations(user_input, domain, qloo_specific_recommendations)})
+            yield _sse_event("done", {"degraded": True})
+            return
+
+        stream_response = None
+        completed = False
+        streamed_text = []
+        try:
+            with stage("gemini_stream"):
+                stream_response = await genAI_model.generate_content_async(
+                    prompt.text, stream=True, generation_config=prompt.generation_config
+                )
+                finish_reason = None
+                async for chunk in stream_response:
+                    # The last chunk of a reply cut off by max_output_tokens has no parts, and chunk.text would raise.
+                    text = gemini_chunk_text(chunk)
+                    finish_reason = gemini_finish_reason(chunk) or finish_reason
+                    if text:
+                        streamed_text.append(text)
+                        yield _sse_event("chunk", {"text": text})
+            if finish_reason == "MAX_TOKENS":
+                record_fallback("gemini_max_tokens")
+                app.logger.warning("Streamed Gemini reply stopped at max_output_tokens.")
+            if not "".join(streamed_text).strip():
+                raise GeminiNoTextError(f"Gemini streamed no text (finish reason: {finish_reason}).")
+            completed = True
+            narrative_cache.set(
+                domain, user_input, qloo_status_message_for_gemini, qloo_specific_recommendations, "".join(streamed_text)
+            )
+        except (GeneratorExit, asyncio.CancelledError):
+            app.logger.info("Client disconnected from recommendation stream; cancelling Gemini generation.")
+            raise
+        except Exception as gemini_error:
+            app.logger.error(f"❌ Error streaming recommendations with Gemini: {gemini_error}", exc_info=True)
+            record_fallback("gemini_error")
+            yield _sse_event("error", {"error": GEMINI_ERROR_TEXT})
+        finally:
+            if not completed and stream_response is not None:
+                await _cancel_gemini_stream(stream_response)
+
+        yield _sse_event("done", {})
+
+    return Response(
+        _run_stream_in_request_context(generate(), request.endpoint or "unknown"),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _get_batch_qloo_context(user_input: str, domain: str, lookup_seconds: float) -> tuple[str, list]:
+    """
+    _get_qloo_context under the batch deadline. Each task runs in its own copy of the request's
+    context, so the Qloo client stops retrying and shortens its timeouts to end close to the
+    deadline instead of spending tokens and breaker trials after the response has been sent.
+    """
+    set_request_deadline(lookup_seconds)
+    return await _get_qloo_context(user_input, domain)
+
+@app.route('/api/recommendations/batch', methods=['POST'])
+async def recommendations_batch():
+    data = await request.get_json()
+    user_input = data.get('userInput')
+    domains = data.get('domains')
+
+    if not user_input or not isinstance(domains, list) or not domains:
+        return jsonify({"error": "Missing required fields (userInput, domains)"}), 400
+
+    domains = list(dict.fromkeys(str(domain).lower() for domain in domains))
+    unknown_domains = [domain for domain in domains if domain not in QLOO_DOMAIN_MAPPING]
+    if unknown_domains:
+        return jsonify({
+            "error": f"Unknown domains: {', '.join(unknown_domains)}",
+            "supported_domains": sorted(QLOO_DOMAIN_MAPPING),
+        }), 400
+
+    remaining = time_remaining()
+    lookup_seconds = BATCH_DEADLINE_SECONDS if remaining is None else min(BATCH_DEADLINE_SECONDS, remaining)
+    tasks = {
+        domain: asyncio.ensure_future(_get_batch_qloo_context(user_input, domain, lookup_seconds)) for domain in domains
+    }
+    done, _ = await asyncio.wait(tasks.values(), timeout=lookup_seconds)
+
+    domain_results = {}
+    for domain, task in tasks.items():
+        if task in done:
+            qloo_status_message_for_gemini, qloo_specific_recommendations = task.result()
+            domain_results[domain] = {
+                "status": "ok" if qloo_specific_recommendations else "no_results",
+                "qloo_status": qloo_status_message_for_gemini,
+                "entities": qloo_specific_recommendations,
+            }
+        else:
+            # Left to end with its deadline: a late result still warms the entity and insights caches.
+            app.logger.warning(f"Qloo lookup for '{domain}' missed the {BATCH_DEADLINE_SECONDS}s batch deadline.")
+            record_fallback("batch_deadline")
+            domain_results[domain] = {
+                "status": "timeout",
+                "qloo_status": f"Qloo did not respond within {BATCH_DEADLINE_SECONDS} seconds.",
+                "entities": [],
+            }
+
+    if not get_gemini_model():
+        record_fallback("gemini_not_configured")
+        narratives = {
+            domain: fallback_recommendations_text(user_input, domain, result["qloo_status"])
+            for domain, result in domain_results.items()
+        }
+        return jsonify(build_batch_response(domain_results, narratives, GEMINI_ERROR_TEXT))
+
+    with stage("prompt_build"):
+        prompt = build_batch_prompt(
+            user_input, {domain: (result["qloo_status"], result["entities"]) for domain, result in domain_results.items()}
+        )
+    narratives = {}
+    try:
+        response_text = await get_singleflight("gemini").do_async(
+            prompt.text,
+            lambda: _generate_text_async(prompt, request_options={"timeout": BATCH_GEMINI_TIMEOUT_SECONDS}),
+        )
+        narratives = parse_batch_narratives(response_text, domains)
+    except RequestDeadlineExceeded:
+        app.logger.warning("Deadline passed waiting for an identical in-flight Gemini call; serving Qloo-only batch narratives.")
+        record_fallback("coalesced_deadline")
+        narratives = {
+            domain: degraded_recommendations_text(user_input, domain, result["entities"])
+            for domain, result in domain_results.items()
+        }
+    except RateLimitExceeded:
+        app.logger.warning("Gemini rate limit budget exhausted; serving Qloo-only batch narratives.")
+        record_fallback("gemini_rate_limited")
+        narratives = {
+            domain: degraded_recommendations_text(user_input, domain, result["entities"])
+            for domain, result in domain_results.items()
+        }
+    except Exception as gemini_error:
+        app.logger.error(f"❌ Error generating batch recommendations with Gemini: {gemini_error}", exc_info=True)
+        record_fallback("gemini_error")
+
+    return jsonify(build_batch_response(domain_results, narratives, GEMINI_ERROR_TEXT))
+
+async def _get_chat_qloo_context(state: dict, message: str, domain: str | None) -> tuple[str, list]:
+    """Async counterpart of app._get_chat_qloo_context."""
+    if domain is None:
+        return "", []
+    local_entity_id = await asyncio.to_thread(resolve_entity_locally, message, domain)
+    cached = cached_qloo_context(state, domain, local_entity_id)
+    if cached is not None:
+        return cached
+    qloo_status_message_for_gemini, qloo_specific_recommendations = await _get_qloo_context(message, domain)
+    if local_entity_id is None:
+        local_entity_id = await asyncio.to_thread(resolve_entity_locally, message, domain)
+    remember_qloo_context(
+        state, domain, local_entity_id,
+        qloo_status_message_for_gemini, qloo_specific_recommendations,
+    )
+    return qloo_status_message_for_gemini, qloo_specific_recommendations
+
+@app.route('/api/chat', methods=['POST'])
+async def chat():
+    data = await request.get_json()
+    message = str(data.get('message') or '').strip()
+    page = str(data.get('page') or 'home').lower()
+
+    if not message:
+        return jsonify({"error": "Missing required field (message)"}), 400
+
+    # The session store is SQLite with a 1 s busy timeout, so keep its reads and writes off the event loop.
+    store = get_chat_session_store()
+    state = await asyncio.to_thread(store.get, data.get('sessionId')) or new_session_state()
+    domain = page if page in QLOO_DOMAIN_MAPPING and page != "general" else None
+    qloo_status_message_for_gemini, qloo_specific_recommendations = await _get_chat_qloo_context(state, message, domain)
+
+    degraded = False
+    if not get_gemini_model():
+        record_fallback("gemini_not_configured")
+        reply = chat_fallback_text(page)
+    else:
+        with stage("prompt_build"):
+            prompt = build_chat_prompt(
+                message, page, qloo_status_message_for_gemini, qloo_specific_recommendations,
+                state["summary"], state["recent"],
+            )
+        try:
+            reply = await _generate_text_async(prompt)
+            record_turn(state, message, reply)
+        except RateLimitExceeded:
+            app.logger.warning("Gemini rate limit budget exhausted; sending the chat fallback reply.")
+            record_fallback("gemini_rate_limited")
+            reply, degraded = chat_fallback_text(page), True
+        except Exception as gemini_error:
+            app.logger.error(f"❌ Error generating chat reply with Gemini: {gemini_error}", exc_info=True)
+            record_fallback("gemini_error")
+            reply = GEMINI_ERROR_TEXT
+    await asyncio.to_thread(store.save, state)
+
+    response = {"sessionId": state["session_id"], "reply": reply, "turn": state["turns"]}
+    if degraded:
+        response["degraded"] = True
+    return jsonify(response)
+
+# Health check endpoint
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    return jsonify({"status": "ok", "timestamp": datetime.now().isoformat()})
+
+# Upstream client and cache status (per worker process)
+@app.route('/api/status', methods=['GET'])
+async def upstream_status():
+    return jsonify({
+        "timestamp": datetime.now().isoformat(),
+        "max_concurrency": ASYNC_MAX_CONCURRENCY,
+        "qloo": get_async_qloo_client().stats(),
+        "entity_cache": get_entity_cache().stats(),
+        "entity_index": get_entity_index().stats(),
+        "clients": get_client_registry().stats(),
+        "rate_limiter": get_rate_limiter().stats(),
+        "admission": _admission.stats(),
+        "insights_cache": get_insights_cache().stats(),
+        "narrative_cache": get_narrative_cache().stats(),
+        "chat_sessions": get_chat_session_store().stats(),
+        "singleflight": singleflight_stats(),
+    })
+
+# Prometheus metrics, aggregated across gunicorn workers (see gunicorn.conf.py)
+@app.route('/api/metrics', methods=['GET'])
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.after_serving
+async def close_upstream_clients():
+    await get_async_qloo_client().aclose()
@@ -0,0 +1,103 @@
+# benchmarks/bench_async.py
+
+"""
+Requests-per-second of POST /api/recommendations at a fixed worker count,
+sync Flask workers (app.py) vs. event-loop workers (asgi.py).
+
+Both servers run under gunicorn against a local FakeQlooServer and a
+FakeGenerativeModel, so no API keys or network access are needed:
+
+    python -m benchmarks.bench_async --workers 2 --concurrency 64 --duration 15
+"""
+
+import os
+import time
+import asyncio
+import argparse
+
+import httpx
+
+from benchmarks.fakes import FakeQlooServer
+from benchmarks.harness import (
+    SERVER_MODES, free_port, isolated_env, is_degraded, start_server, stop_server, wait_until_healthy, summarize,
+)
+
+
+async def _drive_load(base_url: str, concurrency: int, duration: float) -> dict:
+    latencies = []
+    errors = 0
+    degraded = 0
+    deadline = time.monotonic() + duration
+    counter = iter(range(10**9))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def user():
+            nonlocal errors, degraded
+            while time.monotonic() < deadline:
+                # Unique queries keep the entity and insights caches out of the measurement.
+                body = {"userInput": f"benchmark query {next(counter)}", "domain": "music"}
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/api/recommendations", json=body)
+                    if response.status_code != 200:
+                        errors += 1
+                        continue
+                    if is_degraded(response):
+                        degraded += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, errors, elapsed, degraded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent client connections")
+    parser.add_argument("--duration", type=float, default=15, help="seconds of load per mode")
+    parser.add_argument("--qloo-latency-ms", type=float, default=100)
+    parser.add_argument("--gemini-latency-ms", type=float, default=1500)
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"], choices=sorted(SERVER_MODES))
+    args = parser.parse_args()
+
+    qloo = FakeQlooServer(latency_ms=args.qloo_latency_ms).start()
+    results = {}
+    try:
+        for mode in args.modes:
+            port = free_port()
+            env = isolated_env(os.environ)
+            env.update(
+                QLOO_BASE_URL=qloo.url,
+                QLOO_API_KEY="benchmark",
+                BENCH_GEMINI_LATENCY=str(args.gemini_latency_ms),
+                QLOO_POOL_SIZE=str(args.concurrency),
+            )
+            server = start_server(mode, args.workers, port, env)
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                wait_until_healthy(base_url)
+                print(f"▶ {mode}: {args.workers} workers, {args.concurrency} clients, {args.duration:.0f}s ...", flush=True)
+                results[mode] = asyncio.run(_drive_load(base_url, args.concurrency, args.duration))
+            finally:
+                stop_server(server)
+    finally:
+        qloo.stop()
+
+    print()
+    print(f"Qloo latency {args.qloo_latency_ms:.0f} ms/call, Gemini latency {args.gemini_latency_ms:.0f} ms/call")
+    print(f"{'mode':<6} {'workers':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'degraded':>8}")
+    for mode, r in results.items():
+        print(f"{mode:<6} {args.workers:>7} {r['rps']:>8.1f} {r['p50_ms']:>8.0f} {r['p95_ms']:>8.0f} {r['p99_ms']:>8.0f} "
+              f"{r['errors']:>7} {r['degraded']:>8}")
+
+
+if __name__ == "__main__":
+    main()
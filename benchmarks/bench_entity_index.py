@@ -0,0 +1,128 @@
+# benchmarks/bench_entity_index.py
+
+"""
+Lookup latency and memory footprint of the offline entity index (services/entity_index.py)
+on a synthetic catalogue, reported per million entities:
+
+    python -m benchmarks.bench_entity_index --entities 1000000 --lookups 20000
+
+Lookups are split into exact names, unique whole-word prefixes, one-typo fuzzy queries
+and misses, and timed separately. Memory is reported as the index file size (page cache,
+shared by every worker) and the growth in this process's RSS after loading and querying.
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from services.entity_index import EntityIndex, write_index, index_filename
+
+SEARCH_TYPE = "urn:entity:artist"
+# Consonant-vowel(-consonant) syllables give names a trigram spread closer to real artist
+# and title names than random letters or a handful of fixed syllables would.
+_ONSETS = ["", "b", "c", "d", "f", "g", "h", "j", "k", "l", "m", "n", "p", "r", "s", "t", "v", "w", "z",
+           "br", "ch", "cr", "dr", "fl", "gr", "pl", "sh", "st", "th", "tr"]
+_VOWELS = ["a", "e", "i", "o", "u", "ai", "ea", "ee", "ou", "y"]
+_CODAS = ["", "", "", "n", "r", "s", "l", "m", "t", "ck", "nd", "rt", "st"]
+_SYLLABLES = [onset + vowel + coda for onset in _ONSETS for vowel in _VOWELS for coda in _CODAS]
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _synthetic_catalogue(count: int, rng: random.Random) -> dict:
+    def word() -> str:
+        return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, 3)))
+
+    entities = {}
+    while len(entities) < count:
+        name = " ".join(word() for _ in range(rng.randint(1, 3)))
+        entities.setdefault(name, f"ENT-{len(entities):08d}")
+    return entities
+
+
+def _typo(name: str, rng: random.Random) -> str:
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice("aeiou") + name[i + 1:]
+
+
+def _time_lookups(index: EntityIndex, queries: list) -> dict:
+    latencies, hits = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        match = index.lookup(query, SEARCH_TYPE)
+        latencies.append(time.perf_counter() - started)
+        hits += match is not None
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1e6
+
+    return {
+        "hit_rate": hits / len(queries),
+        "p50_us": percentile(0.50),
+        "p99_us": percentile(0.99),
+        "per_sec": len(queries) / sum(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entities", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=20_000, help="lookups per query kind")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    directory = tempfile.mkdtemp(prefix="bench-entity-index-")
+    path = os.path.join(directory, index_filename(SEARCH_TYPE))
+
+    print(f"Generating {args.entities:,} synthetic entities ...", flush=True)
+    entities = _synthetic_catalogue(args.entities, rng)
+    names = list(entities)
+
+    started = time.perf_counter()
+    write_index(path, entities)
+    build_seconds = time.perf_counter() - started
+    file_bytes = os.path.getsize(path)
+
+    # Build the query sets before loading so their memory does not count towards the index.
+    multi_word = [name for name in names if " " in name]
+    queries = {
+        "exact": [rng.choice(names) for _ in range(args.lookups)],
+        "prefix": [" ".join(name.split()[:-1]) for name in rng.sample(multi_word, min(args.lookups, len(multi_word)))],
+        "fuzzy": [_typo(name, rng) for name in rng.sample(names, args.lookups)],
+        "miss": [f"zzq {rng.random():.12f}" for _ in range(args.lookups)],
+    }
+    del entities
+
+    rss_before = _rss_bytes()
+    index = EntityIndex(directory)
+    started = time.perf_counter()
+    index.lookup("warm up", SEARCH_TYPE)
+    load_ms = (time.perf_counter() - started) * 1000
+    results = {kind: _time_lookups(index, kind_queries) for kind, kind_queries in queries.items()}
+    rss_growth = _rss_bytes() - rss_before
+
+    per_million = 1_000_000 / args.entities
+    print()
+    print(f"Entities: {args.entities:,}   build: {build_seconds:.1f}s   open: {load_ms:.1f} ms")
+    print(f"Index file: {file_bytes / 2**20:.1f} MiB ({file_bytes * per_million / 2**20:.1f} MiB per million entities)")
+    print(f"RSS growth after loading and {args.lookups * len(queries):,} lookups: "
+          f"{rss_growth / 2**20:.1f} MiB ({rss_growth * per_million / 2**20:.1f} MiB per million entities)")
+    print()
+    print(f"{'lookup':<8} {'hit rate':>9} {'p50 µs':>9} {'p99 µs':>9} {'lookups/s':>11}")
+    for kind, r in results.items():
+        print(f"{kind:<8} {r['hit_rate']:>9.1%} {r['p50_us']:>9.1f} {r['p99_us']:>9.1f} {r['per_sec']:>11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# benchmarks/bench_load.py
+
+"""
+Load test for POST /api/recommendations across a matrix of gunicorn worker and
+thread counts, reporting RPS and p50/p95/p99 latency for each configuration.
+
+Runs fully offline: Qloo is a local FakeQlooServer and Gemini a FakeGenerativeModel,
+both with configurable latency distributions, error rates and 429 injection. Requests
+follow a Zipfian query mix across all domains (see benchmarks/workload.py).
+
+    python -m benchmarks.bench_load --workers 1 2 4 --threads 1 4 8 --duration 20
+    python -m benchmarks.bench_load --qloo-latency lognormal:120:0.6 --qloo-429-rate 0.02 \\
+        --gemini-latency lognormal:1500:0.4 --gemini-error-rate 0.01 --output results.json
+    python -m benchmarks.bench_load --baseline results.json   # flag regressions against an earlier run
+
+Latency specs: "120", "uniform:50:300", "normal:800:200", "lognormal:800:0.5" (ms).
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+
+import httpx
+
+from benchmarks.fakes import FakeQlooServer, LatencyDistribution
+from benchmarks.harness import (
+    SERVER_MODES, free_port, isolated_env, is_degraded, start_server, stop_server, wait_until_healthy, summarize,
+)
+from benchmarks.workload import ZipfianWorkload
+
+# A configuration regresses when RPS drops, or p95 rises, by more than this fraction.
+REGRESSION_TOLERANCE = 0.10
+
+
+async def _drive_load(base_url: str, workload: ZipfianWorkload, concurrency: int, duration: float, warmup: float) -> dict:
+    latencies = []
+    errors = 0
+    degraded = 0
+    status_counts = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        measure_from = time.monotonic() + warmup
+        deadline = measure_from + duration
+
+        async def user():
+            nonlocal errors, degraded
+            while time.monotonic() < deadline:
+                domain, user_input = workload.next_request()
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/api/recommendations", json={"userInput": user_input, "domain": domain})
+                    status = response.status_code
+                    if status == 200 and is_degraded(response):
+                        status = "200_degraded"
+                except httpx.HTTPError:
+                    status = "transport_error"
+                finished = time.monotonic()
+                if finished < measure_from:
+                    continue
+                status_counts[status] = status_counts.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(time.perf_counter() - started)
+                elif status == "200_degraded":
+                    degraded += 1
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+
+    result = summarize(latencies, errors, duration, degraded)
+    result["status_counts"] = {str(k): v for k, v in status_counts.items()}
+    return result
+
+
+def _run_configuration(args, qloo: FakeQlooServer, mode: str, workers: int, threads: int) -> dict:
+    port = free_port()
+    # Fresh shared stores per configuration so earlier runs don't warm (or throttle) later ones.
+    env = isolated_env(os.environ, rate_limits=args.rate_limits)
+    env.update(
+        QLOO_BASE_URL=qloo.url,
+        QLOO_API_KEY="benchmark",
+        BENCH_GEMINI_LATENCY=args.gemini_latency,
+        BENCH_GEMINI_ERROR_RATE=str(args.gemini_error_rate),
+        BENCH_GEMINI_RATE_LIMIT_RATE=str(args.gemini_429_rate),
+        QLOO_POOL_SIZE=str(max(10, threads, args.concurrency // workers)),
+    )
+    server = start_server(mode, workers, port, env, threads=threads)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until_healthy(base_url)
+        qloo_before = qloo.stats()
+        workload = ZipfianWorkload(skew=args.skew, tail_size=args.tail_size, seed=args.seed)
+        result = asyncio.run(_drive_load(base_url, workload, args.concurrency, args.duration, args.warmup))
+        qloo_after = qloo.stats()
+        result["qloo_calls"] = {name: qloo_after[name] - qloo_before[name] for name in qloo_after}
+        return result
+    finally:
+        stop_server(server)
+
+
+def _config_key(mode: str, workers: int, threads: int) -> str:
+    return f"{mode}/w{workers}/t{threads}"
+
+
+def _print_report(results: dict, baseline: dict | None):
+    print()
+    print(f"{'configuration':<16} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'degraded':>8} "
+          f"{'qloo calls':>11}  vs baseline")
+    for key, r in results.items():
+        line = (f"{key:<16} {r['rps']:>8.1f} {r['p50_ms']:>8.0f} {r['p95_ms']:>8.0f} {r['p99_ms']:>8.0f} "
+                f"{r['errors']:>7} {r.get('degraded', 0):>8} {r['qloo_calls']['calls']:>11}")
+        base = (baseline or {}).get(key)
+        if base:
+            rps_change = (r["rps"] - base["rps"]) / base["rps"] if base["rps"] else 0.0
+            p95_change = (r["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+            regressed = rps_change < -REGRESSION_TOLERANCE or p95_change > REGRESSION_TOLERANCE
+            line += f"  rps {rps_change:+.0%}, p95 {p95_change:+.0%}{'  ⚠️ REGRESSION' if regressed else ''}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8], help="gunicorn --threads (sync mode only)")
+    parser.add_argument("--modes", nargs="+", default=["sync"], choices=sorted(SERVER_MODES))
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent client connections")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per configuration")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before each measurement")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of the query mix")
+    parser.add_argument("--tail-size", type=int, default=2000, help="number of long-tail queries")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--qloo-latency", default="lognormal:100:0.5")
+    parser.add_argument("--qloo-error-rate", type=float, default=0.0)
+    parser.add_argument("--qloo-429-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-latency", default="lognormal:1500:0.4")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-429-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="keep the upstream rate limits on (measures load shedding, not the pipeline)")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="JSON results from an earlier run to compare against")
+    args = parser.parse_args()
+
+    # Fail fast on a malformed spec rather than inside a gunicorn worker.
+    LatencyDistribution.parse(args.gemini_latency)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    workload = ZipfianWorkload(skew=args.skew, tail_size=args.tail_size, seed=args.seed)
+    print(f"Query mix: {len(workload.catalogue)} queries, top 10 take {workload.head_share(10):.0%} of requests")
+    print(f"Qloo {args.qloo_latency} ms (errors {args.qloo_error_rate:.0%}, 429s {args.qloo_429_rate:.0%}), "
+          f"Gemini {args.gemini_latency} ms (errors {args.gemini_error_rate:.0%}, 429s {args.gemini_429_rate:.0%})")
+
+    qloo = FakeQlooServer(
+        latency_ms=args.qloo_latency, error_rate=args.qloo_error_rate, rate_limit_rate=args.qloo_429_rate
+    ).start()
+    results = {}
+    try:
+        for mode in args.modes:
+            for workers in args.workers:
+                for threads in (args.threads if mode == "sync" else [1]):
+                    key = _config_key(mode, workers, threads)
+                    print(f"▶ {key}: {args.concurrency} clients, {args.duration:.0f}s ...", flush=True)
+                    results[key] = _run_configuration(args, qloo, mode, workers, threads)
+    finally:
+        qloo.stop()
+
+    _print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
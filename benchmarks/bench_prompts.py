@@ -0,0 +1,190 @@
+# benchmarks/bench_prompts.py
+
+"""
+Prompt size and generation latency per domain, before and after the token-budgeted
+prompt builder (services/prompt_builder.py):
+
+    python -m benchmarks.bench_prompts --repeat 3
+    python -m benchmarks.bench_prompts --live --domains music travel   # real Gemini calls
+
+"before" is the prompt the backend sent until the builder existed: the whole user input,
+every Qloo name and no generation config. "standard" and "fast" are the builder's two
+generation modes. Inputs are each domain's seed queries plus one long pasted paragraph,
+with a full page of Qloo results. Prompt tokens are the builder's local estimate
+(count_tokens); with --live, Gemini's own prompt and output token counts are reported too.
+
+Without --live the fake Gemini model takes --base-latency-ms plus --ms-per-output-token
+for every output token: --thinking-tokens first (Gemini 2.5 thinking counts toward
+max_output_tokens), then --natural-output-tokens of reply, unless max_output_tokens
+stops it earlier. The latency column shows what output caps buy, not model speed; the
+finish column shows whether a cap cut the reply short ("cut") or left no text ("EMPTY").
+"""
+
+import json
+import time
+import argparse
+import statistics
+from collections import Counter
+
+from benchmarks.fakes import FakeGenerativeModel
+from benchmarks.workload import SEED_QUERIES
+from services.prompt_builder import BuiltPrompt, build_narrative_prompt, count_tokens
+from services.recommendation_pipeline import GeminiNoTextError, gemini_finish_reason, gemini_response_text
+
+VARIANTS = ("before", "standard", "fast")
+
+# What users actually paste into the box: a paragraph about themselves, not a search term.
+LONG_INPUT = (
+    "So I've been in a bit of a rut lately and I'd love some fresh ideas. I grew up on my parents' "
+    "old records, mostly soul, highlife and a lot of 70s folk, then went through an indie phase in "
+    "university and now I mostly listen to whatever my friends send me. I like things that feel warm "
+    "and a little nostalgic but not cheesy, I travel for work a lot so anything that works on a plane "
+    "or a long train ride is a plus, and I'm trying to get out of the habit of just rewatching the same "
+    "comfort shows every evening. I'm 34, based in Nairobi, and I'm open to anything as long as it has "
+    "some heart to it. "
+) * 2
+# The longest status message the Qloo service produces, for prompts without recommendations.
+QLOO_STATUS = "Qloo API returned an error (HTTP 400) for the insights request; no recommendations available."
+
+
+def _fake_recommendations(domain: str, count: int) -> list:
+    return [{"name": f"{domain.title()} Pick Number {i} From The Extended Catalogue", "entity_id": f"e{i}"}
+            for i in range(count)]
+
+
+def legacy_prompt(user_input: str, domain: str, qloo_status_message: str, qloo_recommendations: list) -> BuiltPrompt:
+    """The prompt as recommendation_pipeline built it before prompt_builder, with no generation config."""
+    recommended_names = [item.get('name', 'unknown') for item in qloo_recommendations if item.get('name')]
+    if recommended_names:
+        qloo_context = f"Based on Qloo's Taste AI, here are some specific recommendations: {', '.join(recommended_names)}."
+    else:
+        qloo_context = f"Qloo could not provide specific insights for this query. (Status: {qloo_status_message})"
+    text = f"""
+        You are a cultural intelligence AI that creates beautiful, personalized recommendations.
+
+        User Input: "{user_input}"
+        Domain: {domain}
+
+        {qloo_context}
+
+        Given the user's input, the domain, AND the specific recommendations from Qloo (if any), create a beautifully written, personalized recommendation that:
+        1. Acknowledges their cultural preferences and mood
+        2. Integrates and elaborates on the specific recommendations provided by Qloo (if available). If Qloo had no specific recommendations, state that your recommendations are based on general knowledge.
+        3. Explains the cultural connections and why these fit their taste.
+        4. Uses a warm, creative, and inspiring tone
+        5. Formats your response as a cohesive, flowing narrative (not a list) that feels personal and insightful.
+        Make it feel like advice from a culturally savvy friend who truly understands their taste.
+        """
+    return BuiltPrompt(text, None, count_tokens(text))
+
+
+def build_variant(variant: str, user_input: str, domain: str, status: str, recommendations: list) -> BuiltPrompt:
+    if variant == "before":
+        return legacy_prompt(user_input, domain, status, recommendations)
+    return build_narrative_prompt(user_input, domain, status, recommendations, mode=variant)
+
+
+def _generate(model, prompt: BuiltPrompt) -> dict:
+    kwargs = {"generation_config": prompt.generation_config} if prompt.generation_config else {}
+    started = time.perf_counter()
+    response = model.generate_content(prompt.text, **kwargs)
+    sample = {"latency": time.perf_counter() - started, "finish": "ok"}
+    try:
+        gemini_response_text(response)
+        if gemini_finish_reason(response) == "MAX_TOKENS":
+            sample["finish"] = "cut"
+    except GeminiNoTextError:
+        sample["finish"] = "EMPTY"
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        sample["gemini_prompt_tokens"] = usage.prompt_token_count
+        sample["gemini_output_tokens"] = usage.candidates_token_count
+    return sample
+
+
+def bench_domain(domain: str, model, repeat: int, recommendations: int) -> dict:
+    inputs = SEED_QUERIES[domain] + [LONG_INPUT]
+    contexts = [("Successfully retrieved recommendations.", _fake_recommendations(domain, recommendations)),
+                (QLOO_STATUS, [])]
+    results = {}
+    for variant in VARIANTS:
+        prompts = [build_variant(variant, user_input, domain, status, recs)
+                   for user_input in inputs for status, recs in contexts]
+        started = time.perf_counter()
+        for _ in range(20):
+            for user_input in inputs:
+                build_variant(variant, user_input, domain, *contexts[0])
+        build_us = (time.perf_counter() - started) / (20 * len(inputs)) * 1e6
+        # Generation is timed on the worst case: the long input with a full page of Qloo results.
+        samples = [_generate(model, prompts[-2]) for _ in range(repeat)]
+        results[variant] = {
+            "prompt_tokens_mean": statistics.mean(p.tokens for p in prompts),
+            "prompt_tokens_max": max(p.tokens for p in prompts),
+            "prompt_chars_max": max(len(p.text) for p in prompts),
+            "build_us": build_us,
+            "max_output_tokens": (prompts[-2].generation_config or {}).get("max_output_tokens"),
+            "latency_ms": statistics.median(s["latency"] for s in samples) * 1000,
+            "finish": Counter(s["finish"] for s in samples).most_common(1)[0][0],
+        }
+        if "gemini_output_tokens" in samples[0]:
+            results[variant]["gemini_prompt_tokens"] = samples[0]["gemini_prompt_tokens"]
+            results[variant]["gemini_output_tokens"] = statistics.median(s["gemini_output_tokens"] for s in samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--domains", nargs="+", default=list(SEED_QUERIES), choices=sorted(SEED_QUERIES))
+    parser.add_argument("--repeat", type=int, default=1, help="generation calls per variant (medians are reported)")
+    parser.add_argument("--recommendations", type=int, default=20, help="Qloo results per prompt")
+    parser.add_argument("--live", action="store_true", help="call Gemini with GEMINI_API_KEY instead of the fake model")
+    parser.add_argument("--base-latency-ms", type=float, default=150)
+    parser.add_argument("--ms-per-output-token", type=float, default=2.0)
+    parser.add_argument("--natural-output-tokens", type=int, default=900,
+                        help="reply tokens the fake model writes when nothing caps it")
+    parser.add_argument("--thinking-tokens", type=int, default=600,
+                        help="tokens the fake model spends thinking before it replies")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.live:
+        from dotenv import load_dotenv
+        from services.clients import get_gemini_model
+
+        load_dotenv()
+        model = get_gemini_model()
+        if model is None:
+            parser.error("--live needs GEMINI_API_KEY set (and a working Gemini setup).")
+    else:
+        model = FakeGenerativeModel(
+            latency_ms=args.base_latency_ms,
+            ms_per_output_token=args.ms_per_output_token,
+            natural_output_tokens=args.natural_output_tokens,
+            thinking_tokens=args.thinking_tokens,
+        )
+
+    results = {}
+    for domain in args.domains:
+        print(f"▶ {domain} ...", flush=True)
+        results[domain] = bench_domain(domain, model, args.repeat, args.recommendations)
+
+    print()
+    print(f"{'domain':<10} {'variant':<9} {'tokens avg':>10} {'tokens max':>10} {'chars max':>9} "
+          f"{'build µs':>8} {'max out':>7} {'gen ms':>7} {'finish':>6}")
+    for domain, variants in results.items():
+        for variant, r in variants.items():
+            print(f"{domain:<10} {variant:<9} {r['prompt_tokens_mean']:>10.0f} {r['prompt_tokens_max']:>10} "
+                  f"{r['prompt_chars_max']:>9} {r['build_us']:>8.1f} {r['max_output_tokens'] or '-':>7} "
+                  f"{r['latency_ms']:>7.0f} {r['finish']:>6}")
+            if "gemini_output_tokens" in r:
+                print(f"{'':<20} Gemini counted {r['gemini_prompt_tokens']} prompt / "
+                      f"{r['gemini_output_tokens']:.0f} output tokens")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
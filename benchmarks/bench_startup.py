@@ -0,0 +1,126 @@
+# benchmarks/bench_startup.py
+
+"""
+Worker startup cost: how long the entry points take to import, how long the lazily
+built Gemini client takes on first use, and how long a gunicorn worker takes to boot
+and answer its first request, with and without CLIENT_WARMUP:
+
+    python -m benchmarks.bench_startup --repeat 5 --modes sync async
+
+Every measurement runs in a fresh interpreter. The server runs use the fake Qloo
+server and fake Gemini model, but keep the real Gemini SDK import and configure()
+(BENCH_GEMINI_SDK=1), so their first request pays what a production worker pays.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+import httpx
+
+from benchmarks.fakes import FakeQlooServer
+from benchmarks.harness import (
+    REPO_ROOT, SERVER_MODES, free_port, isolated_env, start_server, stop_server, wait_until_healthy,
+)
+
+# Each snippet prints the seconds it measured as its last line of output.
+_IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+_GEMINI_BUILD_SNIPPET = (
+    "import time; from services.clients import get_gemini_model; "
+    "t = time.perf_counter(); get_gemini_model(); print(time.perf_counter() - t)"
+)
+
+
+def _time_in_subprocess(code: str, env: dict) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def _median_ms(samples: list) -> float:
+    return statistics.median(samples) * 1000
+
+
+def _first_requests(mode: str, env: dict, settle: float, preload: bool) -> dict:
+    """Boot time to a healthy worker, then the latency of the first and second recommendation requests."""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = start_server(mode, 1, port, env, extra_args=["--preload"] if preload else None)
+    try:
+        wait_until_healthy(base_url, timeout=60)
+        boot = time.perf_counter() - started
+        # Lets a background warmup finish, as it would between boot and the first real request.
+        time.sleep(settle)
+        latencies = []
+        with httpx.Client(base_url=base_url, timeout=120) as client:
+            for i in range(2):
+                body = {"userInput": f"startup benchmark {i}", "domain": "music"}
+                request_started = time.perf_counter()
+                client.post("/api/recommendations", json=body).raise_for_status()
+                latencies.append(time.perf_counter() - request_started)
+    finally:
+        stop_server(server)
+    return {"boot": boot, "first": latencies[0], "second": latencies[1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (medians are reported)")
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"], choices=sorted(SERVER_MODES))
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds between boot and the first request")
+    parser.add_argument("--preload", action="store_true", help="start gunicorn with --preload")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    base_env = isolated_env(os.environ)
+    base_env.update(QLOO_API_KEY="benchmark", GEMINI_API_KEY="benchmark", LOG_MODE="json", LOG_LEVEL="WARNING")
+    results = {"imports": {}, "servers": {}}
+
+    print(f"▶ imports ({args.repeat} runs each) ...", flush=True)
+    for module in ("google.generativeai", "app", "asgi"):
+        samples = [_time_in_subprocess(_IMPORT_SNIPPET.format(module=module), base_env) for _ in range(args.repeat)]
+        results["imports"][module] = _median_ms(samples)
+    samples = [_time_in_subprocess(_GEMINI_BUILD_SNIPPET, base_env) for _ in range(args.repeat)]
+    results["imports"]["first get_gemini_model()"] = _median_ms(samples)
+
+    qloo = FakeQlooServer(latency_ms=1).start()
+    try:
+        for mode in args.modes:
+            for warmup in (False, True):
+                label = f"{mode}, warmup {'on' if warmup else 'off'}"
+                print(f"▶ {label} ...", flush=True)
+                env = dict(
+                    base_env,
+                    QLOO_BASE_URL=qloo.url,
+                    BENCH_GEMINI_LATENCY="1",
+                    BENCH_GEMINI_SDK="1",
+                    CLIENT_WARMUP="true" if warmup else "false",
+                )
+                runs = [_first_requests(mode, env, args.settle, args.preload) for _ in range(args.repeat)]
+                results["servers"][label] = {key: _median_ms([run[key] for run in runs]) for key in runs[0]}
+    finally:
+        qloo.stop()
+
+    print()
+    print(f"{'import (fresh interpreter)':<30} {'median ms':>10}")
+    for name, ms in results["imports"].items():
+        print(f"{name:<30} {ms:>10.0f}")
+    print()
+    print(f"{'server (1 worker)':<24} {'boot ms':>9} {'1st req ms':>11} {'2nd req ms':>11}")
+    for label, r in results["servers"].items():
+        print(f"{label:<24} {r['boot']:>9.0f} {r['first']:>11.0f} {r['second']:>11.0f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
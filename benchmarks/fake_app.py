@@ -0,0 +1,14 @@
+# benchmarks/fake_app.py
+
+# The Flask app with Gemini replaced by FakeGenerativeModel:
+#   gunicorn benchmarks.fake_app:app
+# Point QLOO_BASE_URL at a FakeQlooServer to take Qloo out of the loop as well.
+# BENCH_GEMINI_LATENCY (a LatencyDistribution spec), BENCH_GEMINI_ERROR_RATE and
+# BENCH_GEMINI_RATE_LIMIT_RATE shape the fake Gemini's behaviour; BENCH_GEMINI_SDK=1 keeps
+# the real SDK import and configure() on first use (see fakes.install_fake_gemini).
+
+import app as flask_app
+from benchmarks.fakes import install_fake_gemini
+
+install_fake_gemini()
+app = flask_app.app
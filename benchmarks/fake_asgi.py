@@ -0,0 +1,10 @@
+# benchmarks/fake_asgi.py
+
+# The ASGI app with Gemini replaced by FakeGenerativeModel:
+#   gunicorn benchmarks.fake_asgi:app -k uvicorn.workers.UvicornWorker
+
+import asgi as asgi_app
+from benchmarks.fakes import install_fake_gemini
+
+install_fake_gemini()
+app = asgi_app.app
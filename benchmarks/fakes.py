@@ -0,0 +1,311 @@
+# benchmarks/fakes.py
+
+# Local stand-ins for Qloo and Gemini so the backend can be load-tested offline.
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from types import SimpleNamespace
+
+from google.api_core import exceptions as google_exceptions
+
+
+# --- LATENCY DISTRIBUTIONS ---
+
+class LatencyDistribution:
+    """
+    Per-call latency in milliseconds, parsed from a spec string:
+
+        "120"                  fixed 120 ms (same as "fixed:120")
+        "uniform:50:300"       uniform between 50 and 300 ms
+        "normal:800:200"       normal, mean 800 ms, stddev 200 ms (clipped at 0)
+        "lognormal:800:0.5"    log-normal with median 800 ms and sigma 0.5 (long right tail)
+    """
+
+    KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+
+    def __init__(self, kind: str, *params: float):
+        if kind not in self.KINDS or len(params) != self.KINDS[kind]:
+            raise ValueError(f"Invalid latency distribution: {kind}:{':'.join(map(str, params))}")
+        self.kind = kind
+        self.params = params
+        self._random = random.Random()
+
+    @classmethod
+    def parse(cls, spec) -> "LatencyDistribution":
+        if isinstance(spec, LatencyDistribution):
+            return spec
+        if isinstance(spec, (int, float)):
+            return cls("fixed", float(spec))
+        kind, *params = str(spec).split(":")
+        if not params:
+            kind, params = "fixed", [kind]
+        return cls(kind, *(float(p) for p in params))
+
+    def sample_ms(self) -> float:
+        a = self.params[0]
+        if self.kind == "fixed":
+            return a
+        b = self.params[1]
+        if self.kind == "uniform":
+            return self._random.uniform(a, b)
+        if self.kind == "normal":
+            return max(0.0, self._random.gauss(a, b))
+        return self._random.lognormvariate(0, b) * a
+
+    def sample_seconds(self) -> float:
+        return self.sample_ms() / 1000
+
+    def __str__(self) -> str:
+        return ":".join([self.kind, *(f"{p:g}" for p in self.params)])
+
+
+class _FaultCounters:
+    """Thread-safe tally of calls served and faults injected by a fake."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"calls": 0, "errors_injected": 0, "rate_limited": 0}
+
+    def incr(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+# --- FAKE QLOO ---
+
+class _FakeQlooHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict | None = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        server.counters.incr("calls")
+        time.sleep(server.latency.sample_seconds())
+
+        roll = random.random()
+        if roll < server.rate_limit_rate:
+            server.counters.incr("rate_limited")
+            self._send_json(429, {"error": "rate limited"}, {"Retry-After": str(server.retry_after)})
+            return
+        if roll < server.rate_limit_rate + server.error_rate:
+            server.counters.incr("errors_injected")
+            self._send_json(503, {"error": "injected failure"})
+            return
+
+        if url.path == "/search":
+            query = params.get("query", [""])[0]
+            self._send_json(200, {"results": [{"entity_id": f"FAKE-{abs(hash(query)) % 10**8}", "name": query}]})
+        elif url.path == "/v2/insights":
+            limit = int(params.get("limit", ["5"])[0])
+            filter_type = params.get("filter.type", [""])[0]
+            entities = [{"name": f"Fake Entity {i}", "entity_id": f"FAKE-REC-{i}", "type": filter_type} for i in range(limit)]
+            self._send_json(200, {"results": {"entities": entities}})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+
+class FakeQlooServer:
+    """
+    Serves /search and /v2/insights on 127.0.0.1. Each request sleeps for a sample of
+    `latency` (a LatencyDistribution spec or a number of ms), then fails with a 429
+    (carrying Retry-After) with probability `rate_limit_rate`, or with a 503 with
+    probability `error_rate`.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float | str = 100,
+        port: int = 0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: int = 1,
+    ):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _FakeQlooHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = LatencyDistribution.parse(latency_ms)
+        self.httpd.error_rate = error_rate
+        self.httpd.rate_limit_rate = rate_limit_rate
+        self.httpd.retry_after = retry_after
+        self.httpd.counters = _FaultCounters()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def stats(self) -> dict:
+        return self.httpd.counters.snapshot()
+
+    def start(self) -> "FakeQlooServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# --- FAKE GEMINI ---
+
+class _FakeResponse:
+    """Just enough of a GenerateContentResponse: one candidate with its parts and finish reason."""
+
+    def __init__(self, text: str, finish_reason: str = "STOP"):
+        parts = [SimpleNamespace(text=text)] if text else []
+        self.candidates = [SimpleNamespace(content=SimpleNamespace(parts=parts), finish_reason=SimpleNamespace(name=finish_reason))]
+
+    @property
+    def text(self) -> str:
+        parts = self.candidates[0].content.parts
+        if not parts:
+            # As the SDK does for a candidate without parts.
+            raise ValueError("The `response.text` quick accessor only works when the response contains a valid `Part`.")
+        return parts[0].text
+
+
+class FakeGenerativeModel:
+    """
+    Drop-in for google.generativeai.GenerativeModel that sleeps instead of calling Gemini.
+    Failures are raised as the same google.api_core exceptions the real SDK raises:
+    ResourceExhausted (HTTP 429) with probability `rate_limit_rate`, InternalServerError
+    with probability `error_rate`. With `ms_per_output_token` set, each call also takes that
+    long per output token: `thinking_tokens` first, as Gemini 2.5 models think before they
+    answer, then `natural_output_tokens` of reply (fewer if the prompt asks to keep it under
+    some number of words), all within generation_config's
+    max_output_tokens. A reply that hits the cap finishes with MAX_TOKENS, and one left with
+    no room after thinking has no text at all, as the real model does.
+    """
+
+    NARRATIVE = "This is a fake recommendation narrative for benchmarking."
+    # "Keep it under N words" in a prompt, and roughly how many words one output token carries.
+    _WORD_LIMIT_RE = re.compile(r"under (\d+) words")
+    _WORDS_PER_TOKEN = 0.6
+
+    def __init__(self, latency_ms: float | str = 1500, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 ms_per_output_token: float = 0.0, natural_output_tokens: int = 900, thinking_tokens: int = 0):
+        self.latency = LatencyDistribution.parse(latency_ms)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.ms_per_output_token = ms_per_output_token
+        self.natural_output_tokens = natural_output_tokens
+        self.thinking_tokens = thinking_tokens
+        self.counters = _FaultCounters()
+
+    def _generation(self, prompt, generation_config) -> tuple[float, str]:
+        """(seconds the call takes, finish reason); the reply is text unless the finish reason says otherwise."""
+        wanted = self.natural_output_tokens
+        word_limit = self._WORD_LIMIT_RE.search(prompt) if isinstance(prompt, str) else None
+        if word_limit:
+            wanted = min(wanted, int(int(word_limit.group(1)) / self._WORDS_PER_TOKEN))
+        cap = (generation_config or {}).get("max_output_tokens") or float("inf")
+        thinking = min(self.thinking_tokens, cap)
+        reply = min(wanted, cap - thinking)
+        seconds = self.latency.sample_seconds() + (thinking + reply) * self.ms_per_output_token / 1000
+        if not self.ms_per_output_token or reply >= wanted:
+            return seconds, "STOP"
+        return seconds, "MAX_TOKENS" if reply > 0 else "MAX_TOKENS_EMPTY"
+
+    def _response(self, finish_reason: str, text: str) -> _FakeResponse:
+        if finish_reason == "MAX_TOKENS_EMPTY":
+            return _FakeResponse("", "MAX_TOKENS")
+        return _FakeResponse(text, finish_reason)
+
+    def _maybe_fail(self):
+        self.counters.incr("calls")
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            self.counters.incr("rate_limited")
+            raise google_exceptions.ResourceExhausted("Resource has been exhausted (injected by FakeGenerativeModel).")
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.counters.incr("errors_injected")
+            raise google_exceptions.InternalServerError("Injected failure from FakeGenerativeModel.")
+
+    def generate_content(self, prompt, stream: bool = False, generation_config=None, **kwargs):
+        if stream:
+            return self._stream(prompt, generation_config)
+        seconds, finish_reason = self._generation(prompt, generation_config)
+        time.sleep(seconds)
+        self._maybe_fail()
+        return self._response(finish_reason, self.NARRATIVE)
+
+    def _stream(self, prompt, generation_config=None, chunks: int = 10):
+        latency, finish_reason = self._generation(prompt, generation_config)
+        self._maybe_fail()
+        if finish_reason == "MAX_TOKENS_EMPTY":
+            time.sleep(latency)
+            yield self._response(finish_reason, "")
+            return
+        for i in range(chunks):
+            time.sleep(latency / chunks)
+            yield self._response(finish_reason if i == chunks - 1 else "STOP", f"chunk {i} ")
+
+    async def generate_content_async(self, prompt, stream: bool = False, generation_config=None, **kwargs):
+        if stream:
+            return self._stream_async(prompt, generation_config)
+        seconds, finish_reason = self._generation(prompt, generation_config)
+        await asyncio.sleep(seconds)
+        self._maybe_fail()
+        return self._response(finish_reason, self.NARRATIVE)
+
+    async def _stream_async(self, prompt, generation_config=None, chunks: int = 10):
+        latency, finish_reason = self._generation(prompt, generation_config)
+        self._maybe_fail()
+        if finish_reason == "MAX_TOKENS_EMPTY":
+            await asyncio.sleep(latency)
+            yield self._response(finish_reason, "")
+            return
+        for i in range(chunks):
+            await asyncio.sleep(latency / chunks)
+            yield self._response(finish_reason if i == chunks - 1 else "STOP", f"chunk {i} ")
+
+
+def fake_model_from_env() -> FakeGenerativeModel:
+    """Builds the FakeGenerativeModel the benchmark servers use from BENCH_GEMINI_* variables."""
+    return FakeGenerativeModel(
+        latency_ms=os.getenv("BENCH_GEMINI_LATENCY", os.getenv("BENCH_GEMINI_LATENCY_MS", "1500")),
+        error_rate=float(os.getenv("BENCH_GEMINI_ERROR_RATE", 0)),
+        rate_limit_rate=float(os.getenv("BENCH_GEMINI_RATE_LIMIT_RATE", 0)),
+        ms_per_output_token=float(os.getenv("BENCH_GEMINI_MS_PER_OUTPUT_TOKEN", 0)),
+        thinking_tokens=int(os.getenv("BENCH_GEMINI_THINKING_TOKENS", 0)),
+    )
+
+
+def install_fake_gemini():
+    """
+    Points the client registry's "gemini" entry at fake_model_from_env(). With BENCH_GEMINI_SDK=1
+    (and any GEMINI_API_KEY) the real SDK is still imported and configured lazily on first use,
+    as in production, so startup benchmarks include its cost.
+    """
+    from services.clients import get_client_registry, _build_gemini_model
+
+    registry = get_client_registry()
+    if os.getenv("BENCH_GEMINI_SDK", "0") == "1":
+        registry.register("gemini", lambda: _build_gemini_model() and fake_model_from_env())
+    else:
+        registry.override("gemini", fake_model_from_env())
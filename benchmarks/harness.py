@@ -0,0 +1,107 @@
+# benchmarks/harness.py
+
+# Shared plumbing for the benchmarks: starting the backend under gunicorn and
+# summarising latency samples.
+
+import os
+import sys
+import time
+import socket
+import tempfile
+import statistics
+import subprocess
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER_MODES = {
+    "sync": ["benchmarks.fake_app:app"],
+    "async": ["benchmarks.fake_asgi:app", "-k", "uvicorn.workers.UvicornWorker"],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def isolated_env(base: dict, rate_limits: bool = False) -> dict:
+    """
+    `base` plus fresh files for every worker-shared store (entity cache, rate limiter, chat
+    sessions), so runs don't share state with each other or with a dev server. The upstream
+    rate limits are off unless `rate_limits` is set: with them on, a run mostly measures
+    load shedding rather than the pipeline.
+    """
+    state_dir = tempfile.mkdtemp(prefix="bench-")
+    env = dict(
+        base,
+        ENTITY_CACHE_PATH=os.path.join(state_dir, "entities.sqlite3"),
+        RATE_LIMIT_PATH=os.path.join(state_dir, "rate_limits.sqlite3"),
+        CHAT_SESSION_PATH=os.path.join(state_dir, "chat_sessions.sqlite3"),
+    )
+    if not rate_limits:
+        env.update(RATE_LIMIT_QLOO_SEARCH_RPS="0", RATE_LIMIT_QLOO_INSIGHTS_RPS="0", RATE_LIMIT_GEMINI_RPS="0")
+    return env
+
+
+def is_degraded(response: httpx.Response) -> bool:
+    """True for a 200 answered by load shedding or a fallback (`"degraded": true`) rather than the full pipeline."""
+    try:
+        return bool(response.json().get("degraded"))
+    except ValueError:
+        return False
+
+
+def start_server(mode: str, workers: int, port: int, env: dict, threads: int = 1, extra_args: list | None = None) -> subprocess.Popen:
+    """Starts the fake-Gemini backend under gunicorn; threads > 1 makes sync workers gthread workers."""
+    command = [sys.executable, "-m", "gunicorn", *SERVER_MODES[mode], "-w", str(workers),
+               "-b", f"127.0.0.1:{port}", "--log-level", "warning", "--timeout", "120"]
+    if mode == "sync":
+        # Always explicit: gunicorn.conf.py gives sync workers many threads by default.
+        command += ["--threads", str(threads)]
+    command += extra_args or []
+    return subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    server.wait(timeout=30)
+
+
+def wait_until_healthy(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become healthy within {timeout}s")
+
+
+def summarize(latencies: list, errors: int, elapsed: float, degraded: int = 0) -> dict:
+    """
+    RPS and latency percentiles (ms) for one load run. `latencies` are full (non-degraded)
+    successful requests in seconds; degraded 200s are only counted, as they skip the work
+    being measured.
+    """
+    latencies = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "degraded": degraded,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
@@ -0,0 +1,59 @@
+# benchmarks/workload.py
+
+# A Zipfian mix of recommendation requests across every domain.
+# Real traffic is heavily skewed: a few popular tastes ("Taylor Swift", "Italian food")
+# account for most requests while a long tail is asked for once. Rank k is drawn with
+# probability proportional to 1 / k**s, so the skew exponent s controls how much the
+# entity and insights caches and single-flight coalescing can help.
+
+import random
+import itertools
+
+from services.qloo_service import QLOO_DOMAIN_MAPPING
+
+# Popular head of each domain's query distribution, most popular first.
+SEED_QUERIES = {
+    "music": ["Taylor Swift", "I love jazz", "Radiohead", "Beyoncé", "lo-fi hip hop for studying",
+              "The Beatles", "Afrobeats like Burna Boy", "classical piano"],
+    "movies": ["Inception", "Studio Ghibli films", "The Godfather", "feel-good comedies",
+               "Christopher Nolan", "Parasite", "90s action movies", "Pixar"],
+    "books": ["Harry Potter", "Sally Rooney", "epic fantasy like Brandon Sanderson", "Dune",
+              "Chimamanda Ngozi Adichie", "true crime", "Haruki Murakami", "self-help classics"],
+    "dining": ["Italian food", "best ramen", "vegan restaurants", "Ethiopian cuisine",
+               "cozy brunch spots", "sushi", "street tacos", "fine dining"],
+    "travel": ["Japan", "beach holidays", "Lisbon", "hiking in Patagonia", "Nairobi",
+               "European city breaks", "Bali", "road trips in Iceland"],
+    "fashion": ["Nike", "minimalist style", "Zara", "vintage streetwear", "Gucci",
+                "sustainable brands", "Uniqlo", "Ankara prints"],
+    "wellness": ["yoga", "meditation for beginners", "Andrew Huberman", "marathon training",
+                 "better sleep", "Brené Brown", "pilates", "mindful eating"],
+    "learning": ["learn Python", "Khan Academy", "Yuval Noah Harari", "public speaking",
+                 "learn Spanish", "data science", "Stoic philosophy", "negotiation skills"],
+    "general": ["I like cozy autumn things", "anything sci-fi", "Kendrick Lamar", "slow living",
+                "tech startups", "Nollywood", "board games", "photography"],
+}
+
+
+class ZipfianWorkload:
+    """
+    Yields (domain, user_input) pairs. The catalogue is every seed query in every domain
+    plus `tail_size` long-tail queries; catalogue ranks are shuffled across domains with
+    a fixed seed so every run of the same configuration sees the same request sequence.
+    """
+
+    def __init__(self, skew: float = 1.1, tail_size: int = 2000, seed: int = 7, domains: list | None = None):
+        domains = list(domains or QLOO_DOMAIN_MAPPING)
+        self._random = random.Random(seed)
+        head = [(domain, query) for domain in domains for query in SEED_QUERIES.get(domain, [])]
+        tail = [(domains[i % len(domains)], f"niche taste #{i}") for i in range(tail_size)]
+        self._random.shuffle(head)
+        self.catalogue = head + tail
+        weights = [1 / rank ** skew for rank in range(1, len(self.catalogue) + 1)]
+        self._cumulative = list(itertools.accumulate(weights))
+
+    def next_request(self) -> tuple[str, str]:
+        return self._random.choices(self.catalogue, cum_weights=self._cumulative)[0]
+
+    def head_share(self, top: int = 10) -> float:
+        """Fraction of requests that go to the `top` most popular queries."""
+        return self._cumulative[top - 1] / self._cumulative[-1]
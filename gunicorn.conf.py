@@ -0,0 +1,62 @@
+# gunicorn.conf.py
+# Picked up automatically by `gunicorn app:app` (see Procfile) and `gunicorn asgi:app`.
+
+import os
+import sys
+import shutil
+import tempfile
+
+# --- LOGGING ---
+# Structured JSON lines written by a background thread (see services/logging_config.py);
+# export LOG_MODE=dev for the human-readable format.
+os.environ.setdefault("LOG_MODE", "json")
+
+# --- PROMETHEUS MULTIPROCESS MODE ---
+# Each worker writes its metric samples to files in this directory and /api/metrics
+# merges them, so the numbers cover every worker rather than whichever one answered.
+# It must be in the environment before any worker imports prometheus_client.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), f"culturesphere-prometheus-{os.getpid()}")
+)
+
+
+def on_starting(server):
+    # Start every server run with an empty metrics directory.
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+# --- WORKER CONCURRENCY ---
+# Threads per sync worker; above 1, gunicorn runs gthread workers. Admission control
+# (services/admission.py) can only queue or shed requests a worker is serving at once, so
+# each worker gets a thread for every running and every queued pipeline, plus spare ones
+# for health/status/chat requests and so that a full queue sheds instead of backing up in
+# the listen socket. Async workers (-k uvicorn.workers.UvicornWorker) ignore this.
+threads = int(os.getenv(
+    "GUNICORN_THREADS",
+    int(os.getenv("ADMISSION_MAX_CONCURRENT", 16)) + int(os.getenv("ADMISSION_MAX_QUEUE", 32)) + 16,
+))
+
+
+# --- CLIENTS AFTER FORK ---
+# Safe with --preload: no Gemini/Qloo client is built at import time (services/clients.py),
+# and each worker drops anything inherited from the master. With CLIENT_WARMUP=true the
+# worker builds its clients and opens connections in the background once the app is loaded.
+def post_fork(server, worker):
+    # Without --preload the app (and its .env) is not loaded yet and there is nothing to reset.
+    clients = sys.modules.get("services.clients")
+    if clients is not None:
+        clients.post_fork_reset()
+
+
+def post_worker_init(worker):
+    from services.clients import warm_up_if_enabled
+
+    warm_up_if_enabled()
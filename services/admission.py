@@ -0,0 +1,170 @@
+# services/admission.py
+
+import os
+import math
+import time
+import asyncio
+import threading
+import logging
+from contextlib import contextmanager, asynccontextmanager
+
+from services.metrics import record_fallback
+
+logger = logging.getLogger(__name__)
+
+# --- ADMISSION CONFIGURATION (all overridable via environment) ---
+# Recommendation pipelines one worker runs at once, and how many more may wait for a slot.
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", 16))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 32))
+# Every recommendation request must finish within this many seconds (clients may ask for
+# less with an X-Request-Timeout header). Queue waits and rate-limit waits draw on it.
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", 30))
+# Requests that would have less than this left after queueing are shed instead of started.
+ADMISSION_MIN_REMAINING_SECONDS = float(os.getenv("ADMISSION_MIN_REMAINING_SECONDS", 2))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed: the wait queue is full or its deadline ran out while queued."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def request_timeout(header_value: str | None) -> float:
+    """The request's time budget: X-Request-Timeout (seconds) if valid and shorter, else the default."""
+    try:
+        requested = float(header_value) if header_value else REQUEST_DEADLINE_SECONDS
+    except ValueError:
+        requested = REQUEST_DEADLINE_SECONDS
+    # "nan" and "inf" parse as floats; a NaN deadline never expires and would block waits forever.
+    if not math.isfinite(requested):
+        requested = REQUEST_DEADLINE_SECONDS
+    return min(max(requested, 0.0), REQUEST_DEADLINE_SECONDS)
+
+
+class _AdmissionCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_deadline": 0}
+
+    def incr(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+
+class AdmissionController:
+    """
+    Bounded concurrency for worker threads: up to max_concurrent requests run, up to
+    max_queue more wait in FIFO-ish order, and anything beyond that (or anything whose
+    deadline passes while it waits) is rejected straight away.
+    """
+
+    def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT, max_queue: int = ADMISSION_MAX_QUEUE):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._counters = _AdmissionCounters()
+
+    def _reject(self, reason: str):
+        self._counters.incr(f"shed_{reason}")
+        record_fallback(f"shed_{reason}")
+        raise AdmissionRejected(reason)
+
+    @contextmanager
+    def admit(self, deadline: float):
+        """Holds a pipeline slot for the body; `deadline` is a time.monotonic() value."""
+        with self._condition:
+            if self._active >= self.max_concurrent:
+                if self._waiting >= self.max_queue:
+                    self._reject("queue_full")
+                self._waiting += 1
+                self._counters.incr("queued")
+                try:
+                    while self._active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic() - ADMISSION_MIN_REMAINING_SECONDS
+                        if remaining <= 0:
+                            self._reject("deadline")
+                        self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._active += 1
+        self._counters.incr("admitted")
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify()
+
+    def stats(self) -> dict:
+        with self._condition:
+            active, waiting = self._active, self._waiting
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": active,
+            "waiting": waiting,
+            "counters": self._counters.snapshot(),
+        }
+
+
+class AsyncAdmissionController(AdmissionController):
+    """Event-loop variant: the same limits, enforced with an asyncio.Condition on the running loop."""
+
+    def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT, max_queue: int = ADMISSION_MAX_QUEUE):
+        super().__init__(max_concurrent, max_queue)
+        self._async_condition = None
+
+    @asynccontextmanager
+    async def admit_async(self, deadline: float):
+        if self._async_condition is None:
+            # Created lazily so it binds to the worker's event loop, not the importing one.
+            self._async_condition = asyncio.Condition()
+        condition = self._async_condition
+        async with condition:
+            if self._active >= self.max_concurrent:
+                if self._waiting >= self.max_queue:
+                    self._reject("queue_full")
+                self._waiting += 1
+                self._counters.incr("queued")
+                try:
+                    while self._active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic() - ADMISSION_MIN_REMAINING_SECONDS
+                        if remaining <= 0:
+                            self._reject("deadline")
+                        try:
+                            await asyncio.wait_for(condition.wait(), remaining)
+                        except asyncio.TimeoutError:
+                            pass
+                finally:
+                    self._waiting -= 1
+            self._active += 1
+        self._counters.incr("admitted")
+        try:
+            yield
+        finally:
+            async with condition:
+                self._active -= 1
+                condition.notify()
+
+
+# --- PER-PROCESS CONTROLLERS ---
+_admission = None
+_admission_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Returns the process-wide AdmissionController, creating it on first use."""
+    global _admission
+    if _admission is None:
+        with _admission_lock:
+            if _admission is None:
+                _admission = AdmissionController()
+    return _admission
@@ -0,0 +1,225 @@
+# services/chat_sessions.py
+
+import os
+import re
+import time
+import json
+import random
+import secrets
+import sqlite3
+import tempfile
+import threading
+import logging
+
+from services.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# --- SESSION STORE CONFIGURATION (all overridable via environment) ---
+# Session state lives in one SQLite file so a conversation can continue on any gunicorn worker.
+CHAT_SESSION_PATH = os.getenv(
+    "CHAT_SESSION_PATH", os.path.join(tempfile.gettempdir(), "culturesphere_chat_sessions.sqlite3")
+)
+# Sessions idle for longer than this are dropped.
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", 2 * 60 * 60))
+# Beyond this many sessions, the least recently used ones are evicted.
+CHAT_SESSION_MAX_SESSIONS = int(os.getenv("CHAT_SESSION_MAX_SESSIONS", 10000))
+# Latest exchanges kept word for word; older ones are compacted into the summary.
+CHAT_RECENT_TURNS = int(os.getenv("CHAT_RECENT_TURNS", 3))
+# Upper bound on the compacted summary; its oldest lines are dropped first.
+CHAT_SUMMARY_MAX_CHARS = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", 1200))
+# Fraction of writes that also sweep expired and excess sessions out of the store.
+CHAT_SESSION_PRUNE_PROBABILITY = 0.05
+
+# Longest slice of a message or reply carried into the summary.
+_SUMMARY_SNIPPET_CHARS = 160
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def new_session_state() -> dict:
+    """
+    Fresh state for a conversation:
+      summary -> compacted lines for turns older than the recent window
+      recent  -> [[user message, reply], ...], newest last
+      qloo    -> per domain: {"entity_ids": [...], "status": "...", "entities": [...]}
+    """
+    return {
+        "session_id": secrets.token_urlsafe(18),
+        "created_at": time.time(),
+        "turns": 0,
+        "summary": [],
+        "recent": [],
+        "qloo": {},
+    }
+
+
+def _snippet(text: str) -> str:
+    # The first sentence usually carries the point; cap it for the rare run-on one.
+    text = " ".join(text.split())
+    first_sentence = _SENTENCE_END_RE.split(text, maxsplit=1)[0]
+    if len(first_sentence) > _SUMMARY_SNIPPET_CHARS:
+        first_sentence = first_sentence[: _SUMMARY_SNIPPET_CHARS - 3].rstrip() + "..."
+    return first_sentence
+
+
+def compact_turn(user_message: str, reply: str) -> str:
+    """One summary line for an exchange that has left the recent window."""
+    return f"User asked: {_snippet(user_message)} Guide answered: {_snippet(reply)}"
+
+
+def record_turn(state: dict, user_message: str, reply: str):
+    """Appends an exchange, folding the ones that fall out of the recent window into the summary."""
+    state["turns"] += 1
+    state["recent"].append([user_message, reply])
+    while len(state["recent"]) > CHAT_RECENT_TURNS:
+        state["summary"].append(compact_turn(*state["recent"].pop(0)))
+    while state["summary"] and sum(len(line) + 1 for line in state["summary"]) > CHAT_SUMMARY_MAX_CHARS:
+        state["summary"].pop(0)
+
+
+def cached_qloo_context(state: dict, domain: str, local_entity_id: str | None) -> tuple[str, list] | None:
+    """
+    The Qloo context already fetched for this domain, or None if it must be fetched: nothing
+    is cached yet, or the new message resolves locally to an entity the session has not seen.
+    """
+    context = state["qloo"].get(domain)
+    if context is None or (local_entity_id and local_entity_id not in context["entity_ids"]):
+        record_cache_lookup("chat_context", "miss")
+        return None
+    record_cache_lookup("chat_context", "hit")
+    return context["status"], context["entities"]
+
+
+def remember_qloo_context(state: dict, domain: str, entity_id: str | None, status: str, entities: list):
+    """Stores a freshly fetched Qloo context; later turns in this domain reuse it."""
+    previous = state["qloo"].get(domain, {}).get("entity_ids", [])
+    entity_ids = previous + [entity_id] if entity_id and entity_id not in previous else previous
+    state["qloo"][domain] = {"entity_ids": entity_ids, "status": status, "entities": entities}
+
+
+class ChatSessionStore:
+    """
+    Conversation state keyed by session ID in a SQLite file shared by every worker.
+    Sessions expire after the idle TTL, and once there are more than max_sessions the
+    least recently used are evicted. If the store cannot be used, conversations still
+    work but each turn starts from a fresh session.
+    """
+
+    def __init__(
+        self,
+        path: str = CHAT_SESSION_PATH,
+        ttl: float = CHAT_SESSION_TTL,
+        max_sessions: int = CHAT_SESSION_MAX_SESSIONS,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._thread_state = threading.local()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "errors": 0}
+
+    def _connection(self) -> sqlite3.Connection | None:
+        # sqlite3 connections are neither thread- nor fork-safe, so keep one per thread per process.
+        state = self._thread_state
+        if getattr(state, "pid", None) != os.getpid():
+            state.conn = None
+            state.pid = os.getpid()
+        if state.conn is None:
+            try:
+                conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS chat_sessions ("
+                    "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS chat_sessions_updated_at ON chat_sessions (updated_at)")
+                state.conn = conn
+            except sqlite3.Error as e:
+                self._count("errors")
+                logger.error(f"Could not open chat session store at {self.path}: {e}")
+                return None
+        return state.conn
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def get(self, session_id: str | None) -> dict | None:
+        """The live state for session_id, or None if it is unknown, malformed or expired."""
+        # sessionId comes straight from the request JSON, so it may be a number, list, ...
+        if not isinstance(session_id, str) or not _SESSION_ID_RE.match(session_id):
+            return None
+        conn = self._connection()
+        row = None
+        if conn is not None:
+            try:
+                row = conn.execute(
+                    "SELECT state FROM chat_sessions WHERE session_id = ? AND updated_at > ?",
+                    (session_id, time.time() - self.ttl),
+                ).fetchone()
+            except sqlite3.Error as e:
+                self._count("errors")
+                logger.error(f"Chat session read failed: {e}")
+        if row is None:
+            self._count("misses")
+            record_cache_lookup("chat_session", "miss")
+            return None
+        self._count("hits")
+        record_cache_lookup("chat_session", "hit")
+        return json.loads(row[0])
+
+    def save(self, state: dict):
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO chat_sessions (session_id, state, updated_at) VALUES (?, ?, ?)",
+                (state["session_id"], json.dumps(state, separators=(",", ":")), time.time()),
+            )
+            self._count("writes")
+            if random.random() < CHAT_SESSION_PRUNE_PROBABILITY:
+                self._prune(conn)
+        except sqlite3.Error as e:
+            self._count("errors")
+            logger.error(f"Chat session write failed: {e}")
+
+    def _prune(self, conn: sqlite3.Connection):
+        expired = conn.execute("DELETE FROM chat_sessions WHERE updated_at <= ?", (time.time() - self.ttl,)).rowcount
+        excess = conn.execute(
+            "DELETE FROM chat_sessions WHERE session_id IN ("
+            "SELECT session_id FROM chat_sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        ).rowcount
+        if expired or excess:
+            self._count("evictions", expired + excess)
+            logger.info(f"Chat session store: dropped {expired} expired and {excess} least recently used sessions.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "path": self.path,
+            "ttl": self.ttl,
+            "max_sessions": self.max_sessions,
+            "recent_turns": CHAT_RECENT_TURNS,
+            "summary_max_chars": CHAT_SUMMARY_MAX_CHARS,
+            "counters": counters,
+        }
+
+
+# --- PER-PROCESS SHARED STORE ---
+_chat_session_store = None
+_chat_session_store_lock = threading.Lock()
+
+
+def get_chat_session_store() -> ChatSessionStore:
+    """Returns the process-wide ChatSessionStore, creating it on first use."""
+    global _chat_session_store
+    if _chat_session_store is None:
+        with _chat_session_store_lock:
+            if _chat_session_store is None:
+                _chat_session_store = ChatSessionStore()
+    return _chat_session_store
@@ -0,0 +1,158 @@
+# services/clients.py
+
+import os
+import time
+import threading
+import logging
+
+from services.qloo_client import get_qloo_client
+
+logger = logging.getLogger(__name__)
+
+# --- CLIENT CONFIGURATION (all overridable via environment) ---
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "models/gemini-2.5-flash")
+# Build the clients (and open their first connections) in a background thread as soon as a
+# worker starts, instead of on its first request. Off by default.
+CLIENT_WARMUP = os.getenv("CLIENT_WARMUP", "false").lower() in ("1", "true", "yes")
+CLIENT_WARMUP_TIMEOUT_SECONDS = float(os.getenv("CLIENT_WARMUP_TIMEOUT_SECONDS", 5))
+
+
+class ClientRegistry:
+    """
+    Named clients built lazily, at most once per process. Nothing is constructed at
+    import time, so a gunicorn master started with --preload forks before any gRPC
+    channel or socket exists; after a fork the child drops whatever it inherited and
+    builds its own on first use. Instances set with override() (fakes in benchmarks)
+    are kept across forks.
+    """
+
+    def __init__(self):
+        self._factories = {}  # name -> (factory, warm)
+        self._instances = {}
+        self._overrides = {}
+        self._build_seconds = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._warmup_thread = None
+
+    def register(self, name: str, factory, warm=None):
+        """`factory()` builds the client (or returns None if it cannot); `warm(client)` opens its connections."""
+        self._factories[name] = (factory, warm)
+
+    def override(self, name: str, instance):
+        with self._lock:
+            self._overrides[name] = instance
+
+    def reset(self):
+        """Forgets every built client; runs in the child after each fork."""
+        # The lock may have been held by another thread at fork time, so replace it.
+        self._lock = threading.Lock()
+        self._instances = {}
+        self._build_seconds = {}
+        self._warmup_thread = None
+        self._pid = os.getpid()
+
+    def get(self, name: str):
+        if self._pid != os.getpid():
+            self.reset()
+        if name in self._overrides:
+            return self._overrides[name]
+        if name in self._instances:
+            return self._instances[name]
+        with self._lock:
+            if name not in self._instances:
+                factory, _ = self._factories[name]
+                started = time.perf_counter()
+                self._instances[name] = factory()
+                self._build_seconds[name] = time.perf_counter() - started
+                logger.info(f"Built '{name}' client in {self._build_seconds[name] * 1000:.0f} ms (pid {os.getpid()}).")
+        return self._instances[name]
+
+    def warm_up(self, names: list | None = None):
+        """Builds the named clients (default: all) and lets each open its first connections."""
+        for name in names or list(self._factories):
+            try:
+                client = self.get(name)
+                _, warm = self._factories[name]
+                if client is not None and warm is not None and name not in self._overrides:
+                    warm(client)
+            except Exception as e:
+                logger.warning(f"Warming up the '{name}' client failed: {e}")
+
+    def warm_up_in_background(self) -> threading.Thread:
+        """Starts warm_up() on a daemon thread, once per process."""
+        if self._pid != os.getpid():
+            self.reset()
+        with self._lock:
+            if self._warmup_thread is None:
+                self._warmup_thread = threading.Thread(target=self.warm_up, name="client-warmup", daemon=True)
+                self._warmup_thread.start()
+            return self._warmup_thread
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "built": {name: round(seconds * 1000, 1) for name, seconds in self._build_seconds.items()},
+            "overridden": sorted(self._overrides),
+            "warmup": CLIENT_WARMUP,
+        }
+
+
+# --- CLIENT FACTORIES ---
+
+def _build_gemini_model():
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return None
+    try:
+        # Imported here: google.generativeai pulls in grpc and protobuf, which would otherwise
+        # dominate worker import time, and must not set up gRPC state before a fork.
+        import google.generativeai as genai
+
+        # configure() also discards any generative clients inherited from a parent process.
+        genai.configure(api_key=api_key)
+        return genai.GenerativeModel(model_name=GEMINI_MODEL_NAME)
+    except Exception as e:
+        logger.error(f"Gemini AI initialization failed: {e}")
+        return None
+
+
+def _warm_gemini_model(model):
+    # Creates the SDK's transport (and its channel) ahead of the first generate_content call.
+    from google.generativeai import client as genai_client
+
+    genai_client.get_default_generative_client()
+
+
+def _warm_qloo_client(client):
+    # Any response will do: the point is a pooled, already-connected socket.
+    client.session.head(client.base_url, timeout=CLIENT_WARMUP_TIMEOUT_SECONDS)
+
+
+# --- PER-PROCESS REGISTRY ---
+_registry = ClientRegistry()
+_registry.register("gemini", _build_gemini_model, _warm_gemini_model)
+_registry.register("qloo", get_qloo_client, _warm_qloo_client)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_registry.reset)
+
+
+def get_client_registry() -> ClientRegistry:
+    return _registry
+
+
+def get_gemini_model():
+    """The worker's Gemini GenerativeModel, or None when GEMINI_API_KEY is missing or setup failed."""
+    return _registry.get("gemini")
+
+
+def post_fork_reset():
+    """For gunicorn's post_fork hook: drop clients inherited from a preloaded master."""
+    _registry.reset()
+
+
+def warm_up_if_enabled():
+    """Starts the background warmup when CLIENT_WARMUP is set; call once the app is loaded."""
+    if CLIENT_WARMUP:
+        _registry.warm_up_in_background()
@@ -0,0 +1,190 @@
+# services/entity_cache.py
+
+import os
+import time
+import random
+import sqlite3
+import tempfile
+import threading
+import unicodedata
+import logging
+from cachetools import TLRUCache
+
+from services.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# --- CACHE CONFIGURATION (all overridable via environment) ---
+# The on-disk tier lives in one SQLite file shared by every gunicorn worker on the host.
+ENTITY_CACHE_PATH = os.getenv(
+    "ENTITY_CACHE_PATH", os.path.join(tempfile.gettempdir(), "culturesphere_entity_cache.sqlite3")
+)
+ENTITY_CACHE_MAXSIZE = int(os.getenv("ENTITY_CACHE_MAXSIZE", 4096))
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", 24 * 60 * 60))
+ENTITY_CACHE_NEGATIVE_TTL = float(os.getenv("ENTITY_CACHE_NEGATIVE_TTL", 15 * 60))
+# Fraction of writes that also sweep expired rows out of the shared store.
+ENTITY_CACHE_PRUNE_PROBABILITY = 0.01
+
+
+def normalize_query(query: str) -> str:
+    """Case-folds, NFKC-normalizes and collapses whitespace so trivial variants share a key."""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+# Counter name -> result label exported to /api/metrics.
+_LOOKUP_RESULTS = {"local_hits": "hit", "shared_hits": "shared_hit", "negative_hits": "negative_hit", "misses": "miss"}
+
+
+def _entry_expiry(_key, value, _now):
+    # value is (entity_id, expires_at); TLRUCache uses this as the per-item expiry.
+    return value[1]
+
+
+class EntityCache:
+    """
+    Two-tier cache for Qloo /search resolutions keyed by (normalized query, search_type).
+    Tier 1 is a per-process LRU with per-entry expiry; tier 2 is a SQLite file shared
+    across worker processes. A cached entity_id of None is a negative result
+    ("Qloo has no match") and is kept for the shorter negative TTL.
+    """
+
+    def __init__(
+        self,
+        path: str = ENTITY_CACHE_PATH,
+        maxsize: int = ENTITY_CACHE_MAXSIZE,
+        ttl: float = ENTITY_CACHE_TTL,
+        negative_ttl: float = ENTITY_CACHE_NEGATIVE_TTL,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._local = TLRUCache(maxsize=maxsize, ttu=_entry_expiry, timer=time.time)
+        self._lock = threading.Lock()
+        self._thread_state = threading.local()
+        self._counters = {"local_hits": 0, "shared_hits": 0, "negative_hits": 0, "misses": 0, "writes": 0, "errors": 0}
+
+    # --- SHARED (SQLITE) TIER ---
+
+    def _connection(self) -> sqlite3.Connection | None:
+        # sqlite3 connections are neither thread- nor fork-safe, so keep one per thread per process.
+        state = self._thread_state
+        if getattr(state, "pid", None) != os.getpid():
+            state.conn = None
+            state.pid = os.getpid()
+        if state.conn is None:
+            try:
+                conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entity_cache ("
+                    "cache_key TEXT PRIMARY KEY, entity_id TEXT, expires_at REAL NOT NULL)"
+                )
+                state.conn = conn
+            except sqlite3.Error as e:
+                self._count("errors")
+                logger.error(f"Could not open shared entity cache at {self.path}: {e}")
+                return None
+        return state.conn
+
+    def _shared_get(self, key: str):
+        conn = self._connection()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT entity_id, expires_at FROM entity_cache WHERE cache_key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._count("errors")
+            logger.error(f"Shared entity cache read failed: {e}")
+            return None
+        return row
+
+    def _shared_set(self, key: str, entity_id: str | None, expires_at: float):
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO entity_cache (cache_key, entity_id, expires_at) VALUES (?, ?, ?)",
+                (key, entity_id, expires_at),
+            )
+            if random.random() < ENTITY_CACHE_PRUNE_PROBABILITY:
+                conn.execute("DELETE FROM entity_cache WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error as e:
+            self._count("errors")
+            logger.error(f"Shared entity cache write failed: {e}")
+
+    # --- PUBLIC API ---
+
+    @staticmethod
+    def make_key(query: str, search_type: str) -> str:
+        return f"{search_type}|{normalize_query(query)}"
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+        if name in _LOOKUP_RESULTS:
+            record_cache_lookup("entity", _LOOKUP_RESULTS[name])
+
+    def get(self, query: str, search_type: str) -> tuple[bool, str | None]:
+        """
+        Returns (found, entity_id). found is False on a miss; found with entity_id None
+        means Qloo was recently asked and had no match.
+        """
+        key = self.make_key(query, search_type)
+        with self._lock:
+            entry = self._local.get(key)
+        if entry is not None:
+            self._count("local_hits" if entry[0] else "negative_hits")
+            return True, entry[0]
+
+        row = self._shared_get(key)
+        if row is not None:
+            with self._lock:
+                self._local[key] = (row[0], row[1])
+            self._count("shared_hits" if row[0] else "negative_hits")
+            return True, row[0]
+
+        self._count("misses")
+        return False, None
+
+    def set(self, query: str, search_type: str, entity_id: str | None):
+        """Stores a resolution; pass entity_id=None to record that Qloo had no match."""
+        key = self.make_key(query, search_type)
+        expires_at = time.time() + (self.ttl if entity_id else self.negative_ttl)
+        with self._lock:
+            self._local[key] = (entity_id, expires_at)
+        self._shared_set(key, entity_id, expires_at)
+        self._count("writes")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            local_size = len(self._local)
+        lookups = counters["local_hits"] + counters["shared_hits"] + counters["negative_hits"] + counters["misses"]
+        hits = lookups - counters["misses"]
+        return {
+            "path": self.path,
+            "local_entries": local_size,
+            "local_maxsize": self._local.maxsize,
+            "counters": counters,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# --- PER-PROCESS SHARED CACHE ---
+_entity_cache = None
+_entity_cache_lock = threading.Lock()
+
+
+def get_entity_cache() -> EntityCache:
+    """Returns the process-wide EntityCache, creating it on first use."""
+    global _entity_cache
+    if _entity_cache is None:
+        with _entity_cache_lock:
+            if _entity_cache is None:
+                _entity_cache = EntityCache()
+    return _entity_cache
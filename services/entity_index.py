@@ -0,0 +1,429 @@
+# services/entity_index.py
+
+"""
+Local, offline catalogue of Qloo entities used to resolve a query without a /search call.
+
+There is one index file per Qloo search_type (e.g. urn:entity:artist), built offline by
+
+    python -m services.entity_index build --from-cache --import entities.jsonl
+
+from the shared entity cache (which holds every live /search resolution) and import files
+(JSON lines or CSV with search_type, name, entity_id columns). Files are memory-mapped
+read-only, so every gunicorn worker on the host shares the same pages.
+
+File layout (u32 arrays in native byte order, names sorted):
+    header      magic "CSEI", version, byte-order mark, entity count, trigram count, posting count
+    name_offs   (count + 1) offsets into the names blob
+    id_offs     (count + 1) offsets into the entity-ID blob
+    tri_keys    sorted crc32 of each name trigram
+    tri_starts  (trigram count + 1) offsets into postings
+    postings    entity numbers containing each trigram
+    names blob, entity-ID blob (UTF-8)
+"""
+
+import os
+import csv
+import json
+import math
+import mmap
+import zlib
+import struct
+import sqlite3
+import argparse
+import tempfile
+import threading
+import unicodedata
+import logging
+from array import array
+from bisect import bisect_left
+from collections import Counter, namedtuple
+
+from cachetools import LRUCache
+
+from services.entity_cache import normalize_query, ENTITY_CACHE_PATH
+from services.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# --- INDEX CONFIGURATION (all overridable via environment) ---
+ENTITY_INDEX_DIR = os.getenv("ENTITY_INDEX_DIR", os.path.join(tempfile.gettempdir(), "culturesphere_entity_index"))
+# Minimum trigram (Dice) similarity for a fuzzy match to be trusted without calling /search.
+ENTITY_INDEX_FUZZY_THRESHOLD = float(os.getenv("ENTITY_INDEX_FUZZY_THRESHOLD", 0.8))
+# A prefix match is trusted when it is the only entity starting with the query as whole
+# words and the query covers at least this fraction of the entity's name.
+ENTITY_INDEX_PREFIX_MIN_COVERAGE = float(os.getenv("ENTITY_INDEX_PREFIX_MIN_COVERAGE", 0.5))
+# Live /search resolutions kept in memory per worker until the next build picks them up
+# from the shared entity cache; the least recently used are dropped beyond this many.
+ENTITY_INDEX_OVERLAY_MAX_ENTRIES = int(os.getenv("ENTITY_INDEX_OVERLAY_MAX_ENTRIES", 10000))
+
+# Fuzzy matching stops collecting candidates from trigrams shared by more entities than
+# this; they are too common to discriminate and would make the candidate count explode.
+_MAX_POSTINGS_PER_TRIGRAM = 20000
+_FUZZY_CANDIDATES = 20
+_FUZZY_MAX_QUERY_LENGTH = 80
+
+_MAGIC = b"CSEI"
+_VERSION = 1
+# Native byte order throughout; the byte-order mark rejects files built on a different-endian machine.
+_HEADER = "=4sIIIII"
+_HEADER_SIZE = struct.calcsize(_HEADER)
+_BYTE_ORDER_MARK = 0x01020304
+
+IndexMatch = namedtuple("IndexMatch", ["entity_id", "name", "match", "score"])
+
+# Counter name -> result label exported to /api/metrics.
+_LOOKUP_RESULTS = {"exact_hits": "hit", "prefix_hits": "prefix_hit", "fuzzy_hits": "fuzzy_hit", "misses": "miss"}
+
+
+def index_name(name: str) -> str:
+    """normalize_query plus accent folding, so "Beyonce" finds "Beyoncé"."""
+    decomposed = unicodedata.normalize("NFKD", normalize_query(name))
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def index_filename(search_type: str) -> str:
+    return search_type.replace(":", "_") + ".idx"
+
+
+def trigrams(normalized_name: str) -> set:
+    padded = f"  {normalized_name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _trigram_key(trigram: str) -> int:
+    return zlib.crc32(trigram.encode("utf-8"))
+
+
+# --- BUILDING ---
+
+def write_index(path: str, entities: dict):
+    """Writes {index_name: entity_id} to an index file, atomically replacing any existing one."""
+    names = sorted(entities)
+    name_offs, id_offs = array("I", [0]), array("I", [0])
+    name_blob, id_blob = bytearray(), bytearray()
+    postings_by_key = {}
+    for number, name in enumerate(names):
+        name_blob += name.encode("utf-8")
+        id_blob += entities[name].encode("utf-8")
+        name_offs.append(len(name_blob))
+        id_offs.append(len(id_blob))
+        for trigram in trigrams(name):
+            postings_by_key.setdefault(_trigram_key(trigram), array("I")).append(number)
+
+    tri_keys, tri_starts, postings = array("I"), array("I", [0]), array("I")
+    for key in sorted(postings_by_key):
+        tri_keys.append(key)
+        postings.extend(postings_by_key[key])
+        tri_starts.append(len(postings))
+
+    header = struct.pack(_HEADER, _MAGIC, _VERSION, _BYTE_ORDER_MARK, len(names), len(tri_keys), len(postings))
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for section in (name_offs, id_offs, tri_keys, tri_starts, postings):
+            f.write(section.tobytes())
+        f.write(name_blob)
+        f.write(id_blob)
+    os.replace(tmp_path, path)
+
+
+class _IndexFile:
+    """One memory-mapped, read-only index file."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+        self.size_bytes = len(self._mmap)
+        magic, version, byte_order, count, tri_count, posting_count = struct.unpack_from(_HEADER, self._mmap)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a version {_VERSION} entity index")
+        if byte_order != _BYTE_ORDER_MARK:
+            raise ValueError(f"{path} was built on a machine with a different byte order")
+
+        view = memoryview(self._mmap)
+        offset = _HEADER_SIZE
+
+        def u32_section(length: int):
+            nonlocal offset
+            section = view[offset:offset + 4 * length].cast("I")
+            offset += 4 * length
+            return section
+
+        self.count = count
+        self._name_offs = u32_section(count + 1)
+        self._id_offs = u32_section(count + 1)
+        self._tri_keys = u32_section(tri_count)
+        self._tri_starts = u32_section(tri_count + 1)
+        self._postings = u32_section(posting_count)
+        self._names_start = offset
+        self._ids_start = offset + self._name_offs[count]
+        self._view = view
+
+    def name(self, number: int) -> str:
+        start = self._names_start
+        return str(self._view[start + self._name_offs[number]:start + self._name_offs[number + 1]], "utf-8")
+
+    def entity_id(self, number: int) -> str:
+        start = self._ids_start
+        return str(self._view[start + self._id_offs[number]:start + self._id_offs[number + 1]], "utf-8")
+
+    # Sequence protocol over the sorted names, so bisect can search the mapped file directly.
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, number: int) -> str:
+        return self.name(number)
+
+    def exact(self, name: str) -> int | None:
+        number = bisect_left(self, name)
+        if number < self.count and self.name(number) == name:
+            return number
+        return None
+
+    def word_prefix(self, name: str, limit: int = 64) -> list:
+        """Entity numbers whose name starts with `name` followed by a space (at most `limit`)."""
+        prefix = name + " "
+        matches = []
+        number = bisect_left(self, prefix)
+        while number < self.count and len(matches) < limit and self.name(number).startswith(prefix):
+            matches.append(number)
+            number += 1
+        return matches
+
+    def fuzzy(self, query_trigrams: set, min_shared: int) -> Counter:
+        """Entity number -> query trigrams it shares, for entities sharing at least min_shared."""
+        postings_lists = []
+        for trigram in query_trigrams:
+            key = _trigram_key(trigram)
+            slot = bisect_left(self._tri_keys, key)
+            if slot < len(self._tri_keys) and self._tri_keys[slot] == key:
+                postings_lists.append(self._postings[self._tri_starts[slot]:self._tri_starts[slot + 1]])
+        postings_lists.sort(key=len)
+
+        # An entity sharing min_shared trigrams must appear in at least one of the rarest
+        # len - min_shared + 1 lists, so only those are scanned for candidates.
+        seed_lists = len(postings_lists) - min_shared + 1
+        if seed_lists <= 0:
+            return Counter()
+        shared = Counter()
+        for postings in postings_lists[:seed_lists]:
+            if len(postings) > _MAX_POSTINGS_PER_TRIGRAM:
+                break
+            shared.update(postings)
+
+        # The remaining (more common) lists are only probed for surviving candidates, dropping
+        # each candidate as soon as it can no longer reach min_shared.
+        remaining = len(postings_lists) - seed_lists
+        for postings in postings_lists[seed_lists:]:
+            if not shared:
+                break
+            remaining -= 1
+            if len(postings) <= 16 * len(shared):
+                hits = shared.keys() & set(postings)
+            else:
+                # Postings hold ascending entity numbers, so a few candidates are cheaper to binary-search.
+                hits = [n for n in shared if (slot := bisect_left(postings, n)) < len(postings) and postings[slot] == n]
+            for number in hits:
+                shared[number] += 1
+            shared = Counter({number: count for number, count in shared.items() if count + remaining >= min_shared})
+        return shared
+
+
+class EntityIndex:
+    """
+    Per-search_type entity lookup: exact, whole-word prefix and trigram-fuzzy name matching
+    against the memory-mapped catalogue, plus a bounded in-process overlay of resolutions
+    learned from live /search calls since the files were built.
+    """
+
+    def __init__(self, directory: str = ENTITY_INDEX_DIR, fuzzy_threshold: float = ENTITY_INDEX_FUZZY_THRESHOLD,
+                 overlay_max_entries: int = ENTITY_INDEX_OVERLAY_MAX_ENTRIES):
+        self.directory = directory
+        self.fuzzy_threshold = fuzzy_threshold
+        self._lock = threading.Lock()
+        self._files = {}  # search_type -> _IndexFile | None (None: no file for this type)
+        # (search_type, normalized name) -> entity_id, least recently used evicted first
+        self._overlay = LRUCache(maxsize=max(1, overlay_max_entries))
+        self._counters = {"exact_hits": 0, "prefix_hits": 0, "fuzzy_hits": 0, "misses": 0, "additions": 0, "errors": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+        if name in _LOOKUP_RESULTS:
+            record_cache_lookup("entity_index", _LOOKUP_RESULTS[name])
+
+    def _file(self, search_type: str) -> _IndexFile | None:
+        if search_type in self._files:
+            return self._files[search_type]
+        path = os.path.join(self.directory, index_filename(search_type))
+        index_file = None
+        if os.path.exists(path):
+            try:
+                index_file = _IndexFile(path)
+                logger.info(f"Loaded entity index {path} ({index_file.count} entities).")
+            except (OSError, ValueError) as e:
+                self._count("errors")
+                logger.error(f"Could not load entity index {path}: {e}")
+        with self._lock:
+            return self._files.setdefault(search_type, index_file)
+
+    def lookup(self, query: str, search_type: str) -> IndexMatch | None:
+        """Returns a confident local match for query, or None if /search should be asked."""
+        name = index_name(query)
+        if not name:
+            return None
+        index_file = self._file(search_type)
+
+        with self._lock:
+            learned = self._overlay.get((search_type, name))
+        if learned is not None:
+            self._count("exact_hits")
+            return IndexMatch(learned, name, "exact", 1.0)
+        if index_file is None:
+            self._count("misses")
+            return None
+
+        number = index_file.exact(name)
+        if number is not None:
+            self._count("exact_hits")
+            return IndexMatch(index_file.entity_id(number), name, "exact", 1.0)
+
+        prefixed = index_file.word_prefix(name, limit=2)
+        if len(prefixed) == 1:
+            candidate = index_file.name(prefixed[0])
+            coverage = len(name) / len(candidate)
+            if coverage >= ENTITY_INDEX_PREFIX_MIN_COVERAGE:
+                self._count("prefix_hits")
+                return IndexMatch(index_file.entity_id(prefixed[0]), candidate, "prefix", round(coverage, 3))
+
+        if len(name) <= _FUZZY_MAX_QUERY_LENGTH:
+            query_trigrams = trigrams(name)
+            # Dice >= t implies sharing at least t / (2 - t) of the query's trigrams.
+            min_shared = math.ceil(self.fuzzy_threshold / (2 - self.fuzzy_threshold) * len(query_trigrams))
+            best = None
+            for number, shared in index_file.fuzzy(query_trigrams, min_shared).most_common(_FUZZY_CANDIDATES):
+                candidate = index_file.name(number)
+                score = 2 * shared / (len(query_trigrams) + len(trigrams(candidate)))
+                if score >= self.fuzzy_threshold and (best is None or score > best[1]):
+                    best = (number, score, candidate)
+            if best is not None:
+                self._count("fuzzy_hits")
+                return IndexMatch(index_file.entity_id(best[0]), best[2], "fuzzy", round(best[1], 3))
+
+        self._count("misses")
+        return None
+
+    def add(self, name: str, search_type: str, entity_id: str):
+        """Records a live /search resolution so later lookups of the same name stay local."""
+        normalized = index_name(name)
+        if not normalized or not entity_id:
+            return
+        with self._lock:
+            self._overlay[(search_type, normalized)] = entity_id
+        self._count("additions")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            files = {t: f.count for t, f in self._files.items() if f is not None}
+            overlay = len(self._overlay)
+        lookups = counters["exact_hits"] + counters["prefix_hits"] + counters["fuzzy_hits"] + counters["misses"]
+        return {
+            "directory": self.directory,
+            "indexed_entities": files,
+            "learned_entities": overlay,
+            "learned_max_entries": self._overlay.maxsize,
+            "counters": counters,
+            "hit_ratio": round((lookups - counters["misses"]) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# --- PER-PROCESS SHARED INDEX ---
+_entity_index = None
+_entity_index_lock = threading.Lock()
+
+
+def get_entity_index() -> EntityIndex:
+    """Returns the process-wide EntityIndex, creating it on first use."""
+    global _entity_index
+    if _entity_index is None:
+        with _entity_index_lock:
+            if _entity_index is None:
+                _entity_index = EntityIndex()
+    return _entity_index
+
+
+# --- OFFLINE BUILD ---
+
+def _read_import_file(path: str):
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            yield row["search_type"], row["name"], row["entity_id"]
+
+
+def _read_entity_cache(path: str):
+    # Positive resolutions in the shared cache: "search_type|normalized query" -> entity_id.
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        for cache_key, entity_id in conn.execute("SELECT cache_key, entity_id FROM entity_cache WHERE entity_id IS NOT NULL"):
+            search_type, _, name = cache_key.partition("|")
+            yield search_type, name, entity_id
+    finally:
+        conn.close()
+
+
+def _read_existing_index(path: str):
+    index_file = _IndexFile(path)
+    for number in range(index_file.count):
+        yield index_file.name(number), index_file.entity_id(number)
+
+
+def build(directory: str, import_paths: list, cache_path: str | None) -> dict:
+    """Merges existing index files, the entity cache and import files; returns entity counts per type."""
+    catalogue = {}
+    os.makedirs(directory, exist_ok=True)
+    for filename in os.listdir(directory):
+        if filename.endswith(".idx"):
+            search_type = filename[:-4].replace("_", ":")
+            catalogue.setdefault(search_type, {}).update(_read_existing_index(os.path.join(directory, filename)))
+
+    sources = []
+    if cache_path and os.path.exists(cache_path):
+        sources.append(_read_entity_cache(cache_path))
+    sources.extend(_read_import_file(path) for path in import_paths)
+
+    for source in sources:
+        for search_type, name, entity_id in source:
+            normalized = index_name(name)
+            if normalized and entity_id:
+                catalogue.setdefault(search_type, {})[normalized] = entity_id
+
+    for search_type, entities in catalogue.items():
+        write_index(os.path.join(directory, index_filename(search_type)), entities)
+    return {search_type: len(entities) for search_type, entities in catalogue.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline Qloo entity index.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build_parser = subcommands.add_parser("build", help="merge sources into the index files")
+    build_parser.add_argument("--dir", default=ENTITY_INDEX_DIR, help="index directory")
+    build_parser.add_argument("--import", dest="imports", nargs="*", default=[],
+                              help="JSON lines or CSV files with search_type, name, entity_id")
+    build_parser.add_argument("--from-cache", nargs="?", const=ENTITY_CACHE_PATH, default=None,
+                              help="also import positive resolutions from the shared entity cache")
+    args = parser.parse_args()
+
+    counts = build(args.dir, args.imports, args.from_cache)
+    for search_type, count in sorted(counts.items()):
+        print(f"{search_type}: {count} entities")
+    print(f"Index written to {args.dir}. Restart workers to pick it up.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# services/insights_cache.py
+
+import os
+import json
+import time
+import asyncio
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from services.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# --- CACHE CONFIGURATION (all overridable via environment) ---
+# Entries younger than FRESH_TTL are served as-is; entries up to FRESH_TTL + STALE_TTL old
+# are served immediately while a background refresh fetches a new copy.
+INSIGHTS_CACHE_FRESH_TTL = float(os.getenv("INSIGHTS_CACHE_FRESH_TTL", 10 * 60))
+INSIGHTS_CACHE_STALE_TTL = float(os.getenv("INSIGHTS_CACHE_STALE_TTL", 6 * 60 * 60))
+INSIGHTS_CACHE_MAX_BYTES = int(os.getenv("INSIGHTS_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+INSIGHTS_CACHE_REFRESH_WORKERS = int(os.getenv("INSIGHTS_CACHE_REFRESH_WORKERS", 2))
+
+
+# Counter name -> result label exported to /api/metrics.
+_LOOKUP_RESULTS = {"fresh_hits": "hit", "stale_hits": "stale_hit", "misses": "miss"}
+
+
+def _estimate_size(key: tuple, value) -> int:
+    # Serialized size is a stable, cheap proxy for the memory an entry holds.
+    return len(json.dumps(value, separators=(",", ":"))) + len(repr(key))
+
+
+class InsightsCache:
+    """
+    Stale-while-revalidate cache for parsed Qloo /v2/insights results, keyed by
+    (target_entity_id, filter_type, limit). Memory is capped by an approximate
+    byte budget with least-recently-used eviction.
+    """
+
+    def __init__(
+        self,
+        fresh_ttl: float = INSIGHTS_CACHE_FRESH_TTL,
+        stale_ttl: float = INSIGHTS_CACHE_STALE_TTL,
+        max_bytes: int = INSIGHTS_CACHE_MAX_BYTES,
+        refresh_workers: int = INSIGHTS_CACHE_REFRESH_WORKERS,
+    ):
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self.refresh_workers = refresh_workers
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size, fetched_at)
+        self._current_bytes = 0
+        self._refreshing = set()
+        self._background_tasks = set()
+        self._executor = None
+        self._executor_pid = None
+        self._counters = {
+            "fresh_hits": 0, "stale_hits": 0, "misses": 0,
+            "refreshes": 0, "refresh_errors": 0, "evictions": 0, "oversized": 0,
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+        if name in _LOOKUP_RESULTS:
+            record_cache_lookup("insights", _LOOKUP_RESULTS[name])
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Threads do not survive a fork, so each worker process gets its own pool.
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.refresh_workers, thread_name_prefix="insights-refresh"
+                )
+                self._executor_pid = os.getpid()
+                self._refreshing = set()
+            return self._executor
+
+    def _store(self, key: tuple, value):
+        size = _estimate_size(key, value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._current_bytes -= old[1]
+            if size > self.max_bytes:
+                self._counters["oversized"] += 1
+                return
+            self._entries[key] = (value, size, time.monotonic())
+            self._current_bytes += size
+            while self._current_bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._current_bytes -= evicted_size
+                self._counters["evictions"] += 1
+
+    def _refresh(self, key: tuple, fetch):
+        try:
+            self._store(key, fetch())
+            self._count("refreshes")
+            logger.info(f"Refreshed stale Qloo insights cache entry {key}.")
+        except Exception as e:
+            # Keep serving the stale copy; the next stale hit will try again.
+            self._count("refresh_errors")
+            logger.warning(f"Background refresh of Qloo insights {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key: tuple, fetch):
+        executor = self._get_executor()
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        executor.submit(self._refresh, key, fetch)
+
+    def peek(self, key: tuple):
+        """Returns the cached value (fresh or stale) without fetching, refreshing or counting a lookup; None if absent."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[2] >= self.fresh_ttl + self.stale_ttl:
+            return None
+        return entry[0]
+
+    def get_or_fetch(self, key: tuple, fetch):
+        """
+        Returns the cached value for key, calling fetch() synchronously on a miss or
+        when the entry is past its stale window. Exceptions from a synchronous fetch
+        propagate and nothing is cached.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None:
+            value, _, fetched_at = entry
+            age = now - fetched_at
+            if age < self.fresh_ttl:
+                self._count("fresh_hits")
+                return value
+            if age < self.fresh_ttl + self.stale_ttl:
+                self._count("stale_hits")
+                self._schedule_refresh(key, fetch)
+                return value
+
+        self._count("misses")
+        value = fetch()
+        self._store(key, value)
+        return value
+
+    async def _refresh_async(self, key: tuple, fetch):
+        try:
+            self._store(key, await fetch())
+            self._count("refreshes")
+            logger.info(f"Refreshed stale Qloo insights cache entry {key}.")
+        except Exception as e:
+            self._count("refresh_errors")
+            logger.warning(f"Background refresh of Qloo insights {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def aget_or_fetch(self, key: tuple, fetch):
+        """
+        asyncio variant of get_or_fetch: fetch is a coroutine function and stale
+        entries are refreshed in a task on the running event loop.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None:
+            value, _, fetched_at = entry
+            age = now - fetched_at
+            if age < self.fresh_ttl:
+                self._count("fresh_hits")
+                return value
+            if age < self.fresh_ttl + self.stale_ttl:
+                self._count("stale_hits")
+                with self._lock:
+                    schedule = key not in self._refreshing
+                    self._refreshing.add(key)
+                if schedule:
+                    task = asyncio.get_running_loop().create_task(self._refresh_async(key, fetch))
+                    # Hold a reference until the task finishes so it is not garbage collected.
+                    self._background_tasks.add(task)
+                    task.add_done_callback(self._background_tasks.discard)
+                return value
+
+        self._count("misses")
+        value = await fetch()
+        self._store(key, value)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+            current_bytes = self._current_bytes
+        lookups = counters["fresh_hits"] + counters["stale_hits"] + counters["misses"]
+        return {
+            "entries": entries,
+            "bytes": current_bytes,
+            "max_bytes": self.max_bytes,
+            "counters": counters,
+            "hit_ratio": round((lookups - counters["misses"]) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# --- PER-PROCESS SHARED CACHE ---
+_insights_cache = None
+_insights_cache_lock = threading.Lock()
+
+
+def get_insights_cache() -> InsightsCache:
+    """Returns the process-wide InsightsCache, creating it on first use."""
+    global _insights_cache
+    if _insights_cache is None:
+        with _insights_cache_lock:
+            if _insights_cache is None:
+                _insights_cache = InsightsCache()
+    return _insights_cache
@@ -0,0 +1,157 @@
+# services/logging_config.py
+
+import os
+import sys
+import json
+import queue
+import uuid
+import atexit
+import random
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+# --- LOGGING CONFIGURATION (all overridable via environment) ---
+# "dev" keeps the original human-readable lines written straight to stderr.
+# "json" writes one compact JSON object per line from a background thread, so request
+# threads only pay for putting the record on a queue. gunicorn.conf.py defaults to "json".
+LOG_MODE = os.getenv("LOG_MODE", "dev").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if LOG_MODE == "dev" else "INFO").upper()
+# Fraction of upstream payload logs (full Qloo responses) that are actually emitted.
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 1.0 if LOG_MODE == "dev" else 0.01))
+
+DEV_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+
+# --- REQUEST IDS ---
+
+def set_request_id(request_id: str | None = None) -> str:
+    """Binds a request ID (an incoming X-Request-ID, or a new one) to the current context."""
+    request_id = request_id or uuid.uuid4().hex
+    _request_id.set(request_id)
+    return request_id
+
+
+def clear_request_id():
+    _request_id.set(None)
+
+
+def get_request_id() -> str | None:
+    return _request_id.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the current request ID on the thread that logged them, before any queue hop."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+
+# --- PAYLOAD LOGGING ---
+
+def log_payload(logger: logging.Logger, message: str, payload):
+    """
+    Logs an upstream payload at DEBUG for a LOG_PAYLOAD_SAMPLE_RATE sample of calls.
+    The payload object rides on the record and is only serialized by the formatter,
+    i.e. on the listener thread in json mode and never for records that are dropped.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if LOG_PAYLOAD_SAMPLE_RATE < 1.0 and random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    logger.debug(message, extra={"payload": payload})
+
+
+# --- FORMATTERS ---
+
+class DevFormatter(logging.Formatter):
+    """The original human-readable format, with payloads pretty-printed after the message."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        payload = getattr(record, "payload", None)
+        if payload is not None:
+            line = f"{line}: {json.dumps(payload, indent=2, default=str)}"
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        payload = getattr(record, "payload", None)
+        if payload is not None:
+            entry["payload"] = payload
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() formats the message on the calling thread. The queue never
+    # leaves this process, so hand the record over as-is and let the listener format it.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+# --- SETUP ---
+_configured = False
+_listener = None
+_queue_handler = None
+
+
+def _start_listener(output_handler: logging.Handler):
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, output_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_listener_after_fork():
+    # The listener thread does not survive fork (gunicorn --preload), so each worker starts its own.
+    if _listener is not None:
+        _start_listener(_listener.handlers[0])
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def configure_logging():
+    """Configures the root logger for LOG_MODE; safe to call more than once."""
+    global _configured, _queue_handler
+    if _configured:
+        return
+    _configured = True
+
+    root = logging.getLogger()
+    output_handler = logging.StreamHandler(sys.stderr)
+    root.setLevel(LOG_LEVEL)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if LOG_MODE == "json":
+        output_handler.setFormatter(JsonFormatter())
+        _queue_handler = _DeferredQueueHandler(queue.SimpleQueue())
+        _queue_handler.addFilter(RequestIdFilter())
+        root.addHandler(_queue_handler)
+        _start_listener(output_handler)
+        os.register_at_fork(after_in_child=_restart_listener_after_fork)
+        atexit.register(_stop_listener)
+    else:
+        output_handler.setFormatter(DevFormatter(DEV_FORMAT))
+        output_handler.addFilter(RequestIdFilter())
+        root.addHandler(output_handler)
@@ -0,0 +1,138 @@
+# services/metrics.py
+
+import os
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+logger = logging.getLogger(__name__)
+
+# --- METRIC DEFINITIONS ---
+# Under gunicorn, gunicorn.conf.py sets PROMETHEUS_MULTIPROC_DIR before workers import this
+# module, so every worker writes its samples to shared files and /api/metrics aggregates them.
+
+# Upstream calls take anywhere from a few ms (cache-warm Qloo) to tens of seconds (long Gemini generations).
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+STAGE_LATENCY = Histogram(
+    "culturesphere_stage_duration_seconds",
+    "Latency of each recommendation pipeline stage.",
+    ["stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+STAGE_ERRORS = Counter(
+    "culturesphere_stage_errors_total",
+    "Pipeline stages that raised an error.",
+    ["stage"],
+)
+REQUEST_LATENCY = Histogram(
+    "culturesphere_request_duration_seconds",
+    "End-to-end latency of API requests.",
+    ["endpoint", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+FALLBACKS = Counter(
+    "culturesphere_fallbacks_total",
+    "Times the pipeline degraded to a fallback path.",
+    ["reason"],
+)
+CACHE_LOOKUPS = Counter(
+    "culturesphere_cache_lookups_total",
+    "Cache lookups by cache and result; hit ratio = hits / all lookups.",
+    ["cache", "result"],
+)
+RATE_LIMITED = Counter(
+    "culturesphere_rate_limited_total",
+    "Upstream calls refused by the shared rate limiter because no token arrived before the deadline.",
+    ["upstream"],
+)
+COALESCED_CALLS = Counter(
+    "culturesphere_singleflight_coalesced_total",
+    "Calls that shared another caller's in-flight computation instead of running their own.",
+    ["group"],
+)
+PROMPT_TOKENS = Histogram(
+    "culturesphere_prompt_tokens",
+    "Estimated input tokens of each Gemini prompt, by prompt kind.",
+    ["kind"],
+    buckets=(50, 100, 200, 300, 400, 600, 800, 1200, 2000),
+)
+
+# Per-request list of (stage, seconds) used to build the Server-Timing header.
+_request_timings: ContextVar[list | None] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Times a pipeline stage into the latency histogram and the current request's Server-Timing."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage=name).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_LATENCY.labels(stage=name).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def record_fallback(reason: str):
+    FALLBACKS.labels(reason=reason).inc()
+
+
+def record_cache_lookup(cache: str, result: str):
+    CACHE_LOOKUPS.labels(cache=cache, result=result).inc()
+
+
+def record_rate_limited(upstream: str):
+    RATE_LIMITED.labels(upstream=upstream).inc()
+
+
+def record_coalesced(group: str):
+    COALESCED_CALLS.labels(group=group).inc()
+
+
+def record_prompt_tokens(kind: str, tokens: int):
+    PROMPT_TOKENS.labels(kind=kind).observe(tokens)
+
+
+# --- PER-REQUEST TIMING ---
+
+def start_request_timing():
+    """Starts collecting stage timings for the current request (call from before_request)."""
+    _request_timings.set([])
+
+
+def finish_request_timing(endpoint: str, status_code: int, total_seconds: float) -> str:
+    """Records the request latency and returns the Server-Timing header value."""
+    REQUEST_LATENCY.labels(endpoint=endpoint, status=str(status_code)).observe(total_seconds)
+    timings = _request_timings.get() or []
+    _request_timings.set(None)
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+
+# --- EXPOSITION ---
+
+def render_metrics() -> tuple[bytes, str]:
+    """Returns (body, content_type) in Prometheus text format, aggregated across workers when multiprocess."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
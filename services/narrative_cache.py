@@ -0,0 +1,243 @@
+# services/narrative_cache.py
+
+import os
+import re
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+from services.entity_cache import normalize_query
+from services.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# --- CACHE CONFIGURATION (all overridable via environment) ---
+NARRATIVE_CACHE_TTL = float(os.getenv("NARRATIVE_CACHE_TTL", 6 * 60 * 60))
+# Set to 0 to turn the cache off.
+NARRATIVE_CACHE_MAX_BYTES = int(os.getenv("NARRATIVE_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+# Minimum similarity (0-1) for a near-duplicate input to reuse a cached narrative; 0 turns
+# near-duplicate matching off so only exact (normalized) repeats hit.
+NARRATIVE_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("NARRATIVE_CACHE_SIMILARITY_THRESHOLD", 0))
+# Near-duplicate lookups compare against at most this many recent inputs with the same entities.
+NARRATIVE_CACHE_SIMILARITY_CANDIDATES = 256
+
+_WORD_RE = re.compile(r"\w+")
+# Words that change the phrasing of a request but not what is being asked for.
+_STOPWORDS = frozenset(
+    "a an and any are as at be but by can for from get give i im in into is it like love me "
+    "my of on or please recommend recommendations show some something suggest that the this "
+    "to want what with you".split()
+)
+_SUFFIXES = ("ing", "ers", "ies", "ed", "er", "es", "s")
+
+# Counter name -> result label exported to /api/metrics.
+_LOOKUP_RESULTS = {"exact_hits": "hit", "similar_hits": "similar_hit", "misses": "miss"}
+
+
+def normalize_input(user_input: str) -> str:
+    """normalize_query plus punctuation removal, so "Jazz!" and "jazz" share an exact key."""
+    return " ".join(_WORD_RE.findall(normalize_query(user_input)))
+
+
+def _stem(word: str) -> str:
+    # Crude suffix stripping: enough to match "studying"/"study" or "movies"/"movie".
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+def input_features(user_input: str) -> frozenset:
+    """Stemmed content words of the input, used for near-duplicate matching."""
+    return frozenset(_stem(word) for word in normalize_input(user_input).split() if word not in _STOPWORDS)
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    """Jaccard similarity of two feature sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def entity_signature(qloo_status_message: str, qloo_recommendations: list) -> str:
+    """
+    The part of the key that captures the Qloo context Gemini saw: the sorted entity names,
+    or the status message when Qloo returned none.
+    """
+    names = sorted({normalize_query(item["name"]) for item in qloo_recommendations if item.get("name")})
+    if names:
+        return "|".join(names)
+    return f"status:{normalize_query(qloo_status_message)}"
+
+
+class NarrativeCache:
+    """
+    Cache of generated Gemini narratives keyed by (domain, Qloo entity signature, normalized input).
+    Lookups try the exact key first, then (if a similarity threshold is set) the most similar
+    recent input with the same domain and entities. Entries expire after the TTL and memory
+    is capped by an approximate byte budget with least-recently-used eviction.
+    """
+
+    def __init__(
+        self,
+        ttl: float = NARRATIVE_CACHE_TTL,
+        max_bytes: int = NARRATIVE_CACHE_MAX_BYTES,
+        similarity_threshold: float = NARRATIVE_CACHE_SIMILARITY_THRESHOLD,
+    ):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (text, size, stored_at, features)
+        # (domain, entity signature) -> OrderedDict of key -> features, most recent last
+        self._groups = {}
+        # (domain, normalized input) -> most recently stored key, whatever the entities were
+        self._latest_by_input = {}
+        self._current_bytes = 0
+        self._counters = {"writes": 0, "evictions": 0, "expirations": 0, "oversized": 0, "degraded_hits": 0}
+        self._domain_counters = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    # --- INTERNAL BOOKKEEPING (call with self._lock held) ---
+
+    def _drop(self, key: tuple):
+        _, size, _, _ = self._entries.pop(key)
+        self._current_bytes -= size
+        group_key = key[:2]
+        group = self._groups.get(group_key)
+        if group is not None:
+            group.pop(key, None)
+            if not group:
+                del self._groups[group_key]
+        input_key = (key[0], key[2])
+        if self._latest_by_input.get(input_key) == key:
+            del self._latest_by_input[input_key]
+
+    def _live_entry(self, key: tuple, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry[2] >= self.ttl:
+            self._drop(key)
+            self._counters["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _find_similar(self, group_key: tuple, features: frozenset, now: float):
+        group = self._groups.get(group_key)
+        if not group or not features:
+            return None
+        best_key, best_score = None, self.similarity_threshold
+        for key, candidate in list(group.items())[-NARRATIVE_CACHE_SIMILARITY_CANDIDATES:]:
+            score = similarity(features, candidate)
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            return None
+        return self._live_entry(best_key, now)
+
+    def _count(self, domain: str, result: str):
+        counters = self._domain_counters.setdefault(domain, {"exact_hits": 0, "similar_hits": 0, "misses": 0})
+        counters[result] += 1
+
+    # --- PUBLIC API ---
+
+    @staticmethod
+    def make_key(domain: str, user_input: str, qloo_status_message: str, qloo_recommendations: list) -> tuple:
+        return (domain.lower(), entity_signature(qloo_status_message, qloo_recommendations), normalize_input(user_input))
+
+    def get(self, domain: str, user_input: str, qloo_status_message: str, qloo_recommendations: list) -> str | None:
+        """Returns a cached narrative for this request (exact or near-duplicate), or None."""
+        if not self.enabled:
+            return None
+        key = self.make_key(domain, user_input, qloo_status_message, qloo_recommendations)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live_entry(key, now)
+            result = "exact_hits"
+            if entry is None and self.similarity_threshold > 0:
+                entry = self._find_similar(key[:2], input_features(user_input), now)
+                result = "similar_hits"
+            if entry is None:
+                result = "misses"
+            self._count(key[0], result)
+        record_cache_lookup("narrative", _LOOKUP_RESULTS[result])
+        if result == "similar_hits":
+            logger.info(f"Narrative cache: reusing a near-duplicate narrative for '{user_input}' ({key[0]}).")
+        return entry[0] if entry is not None else None
+
+    def get_degraded(self, domain: str, user_input: str) -> str | None:
+        """
+        The latest narrative stored for this domain and normalized input, whatever Qloo entities
+        it was built from. Used when a request is shed before its Qloo context is known.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            key = self._latest_by_input.get((domain.lower(), normalize_input(user_input)))
+            entry = self._live_entry(key, time.monotonic()) if key is not None else None
+            if entry is not None:
+                self._counters["degraded_hits"] += 1
+        return entry[0] if entry is not None else None
+
+    def set(self, domain: str, user_input: str, qloo_status_message: str, qloo_recommendations: list, text: str):
+        """Stores a generated narrative; only call this for successful Gemini output."""
+        if not self.enabled or not text:
+            return
+        key = self.make_key(domain, user_input, qloo_status_message, qloo_recommendations)
+        size = len(text.encode("utf-8")) + len(repr(key))
+        features = input_features(user_input)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                self._counters["oversized"] += 1
+                return
+            self._entries[key] = (text, size, time.monotonic(), features)
+            self._groups.setdefault(key[:2], OrderedDict())[key] = features
+            self._latest_by_input[(key[0], key[2])] = key
+            self._current_bytes += size
+            self._counters["writes"] += 1
+            while self._current_bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            domains = {domain: dict(c) for domain, c in self._domain_counters.items()}
+            entries = len(self._entries)
+            current_bytes = self._current_bytes
+        for c in domains.values():
+            lookups = c["exact_hits"] + c["similar_hits"] + c["misses"]
+            c["hit_ratio"] = round((lookups - c["misses"]) / lookups, 4) if lookups else 0.0
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "bytes": current_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "similarity_threshold": self.similarity_threshold,
+            "counters": counters,
+            "domains": domains,
+        }
+
+
+# --- PER-PROCESS SHARED CACHE ---
+_narrative_cache = None
+_narrative_cache_lock = threading.Lock()
+
+
+def get_narrative_cache() -> NarrativeCache:
+    """Returns the process-wide NarrativeCache, creating it on first use."""
+    global _narrative_cache
+    if _narrative_cache is None:
+        with _narrative_cache_lock:
+            if _narrative_cache is None:
+                _narrative_cache = NarrativeCache()
+    return _narrative_cache
@@ -0,0 +1,326 @@
+# services/prompt_builder.py
+
+# Every Gemini prompt the backend sends is built here: the single-domain narrative, the batch
+# narrative, the FloatingAssistant chat turn and gemini_service's recommendation. Templates are
+# compiled once at import, user text and Qloo context are held to token budgets, and each
+# prompt comes with the generation config (output length, temperature) for its domain.
+
+import os
+import re
+import textwrap
+import logging
+from collections import namedtuple
+
+from services.clients import GEMINI_MODEL_NAME
+from services.metrics import record_prompt_tokens
+
+logger = logging.getLogger(__name__)
+
+# --- PROMPT BUDGETS (all overridable via environment) ---
+# Estimated tokens allowed for the user's own text and for the Qloo context in one prompt.
+PROMPT_INPUT_TOKEN_BUDGET = int(os.getenv("PROMPT_INPUT_TOKEN_BUDGET", 200))
+PROMPT_QLOO_CONTEXT_TOKEN_BUDGET = int(os.getenv("PROMPT_QLOO_CONTEXT_TOKEN_BUDGET", 120))
+# Estimated tokens of conversation history (summary plus recent turns) in a chat prompt.
+PROMPT_HISTORY_TOKEN_BUDGET = int(os.getenv("PROMPT_HISTORY_TOKEN_BUDGET", 400))
+# "standard" or "fast": fast profiles ask for shorter narratives and cap output harder.
+GEMINI_GENERATION_MODE = os.getenv("GEMINI_GENERATION_MODE", "standard")
+# Gemini 2.5 models think before they answer, and thinking tokens count toward max_output_tokens.
+# The SDK in use cannot set a thinking budget, so this many tokens are added on top of every
+# visible-text cap below; without them a short cap can be spent entirely on thinking.
+GEMINI_THINKING_TOKEN_ALLOWANCE = int(os.getenv(
+    "GEMINI_THINKING_TOKEN_ALLOWANCE", 1024 if "gemini-2.5" in GEMINI_MODEL_NAME else 0
+))
+
+# --- GENERATION PROFILES ---
+# Per mode, per domain: max_output_tokens for the visible reply (before the thinking allowance)
+# and temperature. "default" covers domains not listed.
+GENERATION_PROFILES = {
+    "standard": {
+        "default": {"max_output_tokens": 600, "temperature": 0.9},
+        "travel": {"max_output_tokens": 750, "temperature": 0.9},
+        "learning": {"max_output_tokens": 700, "temperature": 0.7},
+        "wellness": {"max_output_tokens": 650, "temperature": 0.8},
+    },
+    "fast": {
+        "default": {"max_output_tokens": 260, "temperature": 0.8},
+        "travel": {"max_output_tokens": 320, "temperature": 0.8},
+    },
+}
+# FloatingAssistant turns are 2-3 sentences whatever the mode.
+CHAT_GENERATION_PROFILE = {"max_output_tokens": 160, "temperature": 0.7}
+# A batch reply holds one narrative per domain, each shorter than a single-domain one.
+BATCH_NARRATIVE_SHARE = 0.6
+# Output tokens per domain for the batch reply's JSON around the narratives: the key,
+# quotes and separators, and the escapes the narrative's own quotes need.
+BATCH_JSON_TOKENS_PER_DOMAIN = 40
+
+# Roughly how many words a model writes per output token, used to state a length target
+# that ends well before max_output_tokens cuts the reply off.
+_WORDS_PER_OUTPUT_TOKEN = 0.6
+
+# Domain-specific direction appended to the shared narrative brief.
+DOMAIN_GUIDANCE = {
+    "music": "Name specific artists, albums or songs and describe the sound and mood that connects them.",
+    "movies": "Name specific films or directors and what makes each worth watching for this viewer.",
+    "books": "Name specific books or authors and the themes and reading experience they share.",
+    "dining": "Name specific cuisines, dishes or kinds of places and the atmosphere to look for.",
+    "travel": "Name specific destinations or experiences and the best way to enjoy them.",
+    "fashion": "Name specific brands, pieces or styling ideas and the aesthetic they express.",
+    "wellness": "Name specific practices, teachers or routines and how to start with them.",
+    "learning": "Name specific books, courses or skills and a practical first step.",
+    "general": "Connect the user's taste across music, film, food, travel and style where it fits.",
+}
+
+# Word pieces and single punctuation marks; see count_tokens.
+_TOKEN_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+# Characters per subword token assumed for long words.
+_CHARS_PER_SUBWORD = 6
+_SPACE_RUN_RE = re.compile(r"[ \t]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+BuiltPrompt = namedtuple("BuiltPrompt", ["text", "generation_config", "tokens"])
+
+
+# --- TEXT UTILITIES ---
+
+def count_tokens(text: str) -> int:
+    """
+    Estimated token count: one per word or punctuation mark, plus one for every further
+    few characters of a long word. Close to Gemini's own counts for English prose, and
+    free; the count_tokens API would cost a network round trip per prompt.
+    """
+    return sum(1 + (len(piece) - 1) // _CHARS_PER_SUBWORD for piece in _TOKEN_PIECE_RE.findall(text))
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """Cuts text after the last whole piece that fits in `budget` estimated tokens."""
+    used = 0
+    for match in _TOKEN_PIECE_RE.finditer(text):
+        piece = match.group()
+        used += 1 + (len(piece) - 1) // _CHARS_PER_SUBWORD
+        if used > budget:
+            return text[: match.start()].rstrip() + "…"
+    return text
+
+
+def normalize_whitespace(text: str) -> str:
+    """Strips every line, collapses runs of spaces and keeps at most one blank line in a row."""
+    lines = (_SPACE_RUN_RE.sub(" ", line).strip() for line in text.strip().splitlines())
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines))
+
+
+def inline_text(text: str, budget: int) -> str:
+    """User-supplied text as it goes into a prompt: on one line, within its token budget."""
+    return truncate_tokens(" ".join(str(text).split()), budget)
+
+
+class PromptTemplate:
+    """A prompt compiled once: dedented, whitespace-normalized, with str.format placeholders."""
+
+    def __init__(self, text: str):
+        self.text = normalize_whitespace(textwrap.dedent(text))
+
+    def render(self, **values) -> str:
+        return self.text.format(**values)
+
+
+# --- QLOO CONTEXT ---
+
+def format_qloo_context(qloo_status_message: str, qloo_recommendations: list,
+                        budget: int = PROMPT_QLOO_CONTEXT_TOKEN_BUDGET) -> str:
+    """Turns the Qloo result into the sentence Gemini sees about it, within `budget` tokens."""
+    recommended_names = [" ".join(item["name"].split()) for item in qloo_recommendations if item.get("name")]
+    if recommended_names:
+        prefix = "Based on Qloo's Taste AI, here are some specific recommendations: "
+        # Whole names only: drop the least relevant (last) ones rather than cut a name in half.
+        remaining = budget - count_tokens(prefix) - 1
+        kept = []
+        for name in recommended_names:
+            cost = count_tokens(name) + 1
+            if cost > remaining:
+                break
+            kept.append(name)
+            remaining -= cost
+        if kept:
+            return f"{prefix}{', '.join(kept)}."
+    if qloo_recommendations:
+        # If recommendations list is not empty but names couldn't be extracted
+        prefix = "Qloo returned some results, but could not extract specific names."
+    else:
+        # If Qloo returned no specific recommendations or encountered an issue
+        prefix = "Qloo could not provide specific insights for this query."
+    status = inline_text(qloo_status_message, max(0, budget - count_tokens(prefix) - 3))
+    return f"{prefix} (Status: {status})"
+
+
+# --- TEMPLATES ---
+
+_NARRATIVE_BRIEF = """
+    You are a cultural intelligence AI that creates beautiful, personalized recommendations.
+
+    User Input: "{{user_input}}"
+    Domain: {domain}
+
+    {{qloo_context}}
+
+    Write a personalized recommendation that:
+    1. Acknowledges the user's cultural preferences and mood.
+    2. Integrates and elaborates on Qloo's specific recommendations (if any); if there are none, say it is based on general knowledge.
+    3. Explains the cultural connections and why these fit their taste.
+    4. Uses a warm, creative, inspiring tone, as a culturally savvy friend would.
+    5. Is a cohesive, flowing narrative (not a list).
+    {guidance}
+    Keep it under {{word_limit}} words.
+"""
+
+
+def _compile_narrative_template(domain: str, guidance: str) -> PromptTemplate:
+    # Domain and guidance are fixed per template; the doubled braces survive as placeholders.
+    return PromptTemplate(_NARRATIVE_BRIEF.format(domain=domain, guidance=guidance))
+
+
+NARRATIVE_TEMPLATES = {domain: _compile_narrative_template(domain, guidance) for domain, guidance in DOMAIN_GUIDANCE.items()}
+# Domains without their own template (the API accepts any domain string) fill it in per call.
+_GENERIC_NARRATIVE_TEMPLATE = _compile_narrative_template("{domain}", "")
+
+BATCH_TEMPLATE = PromptTemplate("""
+    You are a cultural intelligence AI that creates beautiful, personalized recommendations.
+
+    User Input: "{user_input}"
+
+    Qloo's Taste AI results per domain:
+    {domain_sections}
+
+    For EACH domain above, write a warm, creative, personalized recommendation that acknowledges the user's mood and cultural preferences, elaborates on Qloo's specific recommendations for that domain (or says it is based on general knowledge if there are none), and explains why these fit their taste. Let the domains reference each other where there is a genuine cultural connection. Keep each narrative under {word_limit} words.
+    Respond ONLY with a JSON object whose keys are exactly {domain_keys} and whose values are the narrative for that domain as a single string.
+""")
+
+CHAT_TEMPLATE = PromptTemplate("""
+    You are a helpful AI guide for CultureSphere AI, a cultural intelligence platform that gives personalized recommendations across Music, Dining, Travel, Fashion, Learning, and Wellness based on the user's cultural DNA.
+
+    Current page: {page}
+    {qloo_context}
+
+    Earlier in this conversation: {earlier}
+    Most recent exchanges:
+    {recent}
+
+    User question: "{message}"
+
+    Reply in 2-3 concise, warm and culturally aware sentences that continue the conversation. Help with CultureSphere AI's features or guide the user toward the relevant domain section.
+""")
+
+
+# --- GENERATION CONFIG ---
+
+def generation_profile(domain: str, mode: str | None = None) -> dict:
+    """The visible-reply {max_output_tokens, temperature} profile for a domain in the given (or configured) mode."""
+    profiles = GENERATION_PROFILES.get(mode or GEMINI_GENERATION_MODE)
+    if profiles is None:
+        logger.warning(f"Unknown generation mode '{mode or GEMINI_GENERATION_MODE}'; using 'standard'.")
+        profiles = GENERATION_PROFILES["standard"]
+    return dict(profiles.get(domain.lower(), profiles["default"]))
+
+
+def generation_config(profile: dict, **extra) -> dict:
+    """The config sent to Gemini for a profile: its visible-reply cap plus the thinking allowance."""
+    return {**profile, "max_output_tokens": profile["max_output_tokens"] + GEMINI_THINKING_TOKEN_ALLOWANCE, **extra}
+
+
+def _word_limit(max_output_tokens: int) -> int:
+    return max(40, int(max_output_tokens * _WORDS_PER_OUTPUT_TOKEN) // 10 * 10)
+
+
+# --- PROMPT BUILDERS ---
+
+def expects_json(prompt: BuiltPrompt) -> bool:
+    """Whether the prompt asks Gemini for a JSON reply (the batch prompt) rather than prose."""
+    return (prompt.generation_config or {}).get("response_mime_type") == "application/json"
+
+
+def _built(kind: str, text: str, generation_config: dict) -> BuiltPrompt:
+    tokens = count_tokens(text)
+    record_prompt_tokens(kind, tokens)
+    return BuiltPrompt(text, generation_config, tokens)
+
+
+def build_narrative_prompt(user_input: str, domain: str, qloo_status_message: str, qloo_recommendations: list,
+                           mode: str | None = None) -> BuiltPrompt:
+    """The single-domain recommendation prompt (/api/recommendations and its stream)."""
+    profile = generation_profile(domain, mode)
+    template = NARRATIVE_TEMPLATES.get(domain.lower(), _GENERIC_NARRATIVE_TEMPLATE)
+    text = template.render(
+        domain=inline_text(domain, 8),
+        user_input=inline_text(user_input, PROMPT_INPUT_TOKEN_BUDGET),
+        qloo_context=format_qloo_context(qloo_status_message, qloo_recommendations),
+        word_limit=_word_limit(profile["max_output_tokens"]),
+    )
+    return _built("narrative", text, generation_config(profile))
+
+
+def build_batch_prompt(user_input: str, domain_contexts: dict, mode: str | None = None) -> BuiltPrompt:
+    """
+    One prompt covering several domains. domain_contexts maps each domain to its
+    (qloo_status_message, qloo_recommendations) pair; the Qloo budget is per domain.
+    """
+    profiles = {domain: generation_profile(domain, mode) for domain in domain_contexts}
+    per_domain_tokens = min(int(profile["max_output_tokens"] * BATCH_NARRATIVE_SHARE) for profile in profiles.values())
+    domain_sections = "\n".join(
+        f"- {domain}: {format_qloo_context(status_message, recommendations)}"
+        for domain, (status_message, recommendations) in domain_contexts.items()
+    )
+    text = BATCH_TEMPLATE.render(
+        user_input=inline_text(user_input, PROMPT_INPUT_TOKEN_BUDGET),
+        domain_sections=domain_sections,
+        domain_keys=", ".join(f'"{domain}"' for domain in domain_contexts),
+        word_limit=_word_limit(per_domain_tokens),
+    )
+    # A JSON reply cut short cannot be trimmed like prose, so the cap leaves room for the JSON too.
+    batch_profile = {
+        "max_output_tokens": sum(
+            int(p["max_output_tokens"] * BATCH_NARRATIVE_SHARE) + BATCH_JSON_TOKENS_PER_DOMAIN for p in profiles.values()
+        ),
+        "temperature": min(p["temperature"] for p in profiles.values()),
+    }
+    return _built("batch", text, generation_config(batch_profile, response_mime_type="application/json"))
+
+
+def _fit_history(summary: list, recent_turns: list, budget: int) -> tuple[str, str]:
+    """Newest history first until the budget runs out: recent turns, then summary lines."""
+    recent_lines = []
+    for user_message, reply in reversed(recent_turns):
+        turn = f"User: {inline_text(user_message, PROMPT_INPUT_TOKEN_BUDGET)}\nGuide: {' '.join(reply.split())}"
+        cost = count_tokens(turn)
+        if cost > budget:
+            break
+        recent_lines.insert(0, turn)
+        budget -= cost
+    summary_lines = []
+    for line in reversed(summary):
+        cost = count_tokens(line)
+        if cost > budget:
+            break
+        summary_lines.insert(0, line)
+        budget -= cost
+    return " ".join(summary_lines) or "(none)", "\n".join(recent_lines) or "(none)"
+
+
+def build_chat_prompt(message: str, page: str, qloo_status_message: str, qloo_recommendations: list,
+                      summary: list, recent_turns: list) -> BuiltPrompt:
+    """
+    One FloatingAssistant turn: the session's cached Qloo context, as much of the compacted
+    summary and recent exchanges as the history budget allows, then the new message.
+    Pages without a Qloo domain pass an empty status and no recommendations.
+    """
+    qloo_context = ""
+    if qloo_status_message or qloo_recommendations:
+        qloo_context = format_qloo_context(qloo_status_message, qloo_recommendations)
+    earlier, recent = _fit_history(summary, recent_turns, PROMPT_HISTORY_TOKEN_BUDGET)
+    text = normalize_whitespace(CHAT_TEMPLATE.render(
+        page=inline_text(page, 8),
+        qloo_context=qloo_context,
+        earlier=earlier,
+        recent=recent,
+        message=inline_text(message, PROMPT_INPUT_TOKEN_BUDGET),
+    ))
+    return _built("chat", text, generation_config(CHAT_GENERATION_PROFILE))
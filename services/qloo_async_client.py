@@ -0,0 +1,178 @@
+# services/qloo_async_client.py
+
+import os
+import random
+import asyncio
+import logging
+import httpx
+
+from services.qloo_client import (
+    RATE_LIMIT_BUCKETS,
+    RETRYABLE_STATUS_CODES,
+    QlooCircuitOpenError,
+    QlooDeadlineExceededError,
+    QlooRateLimitedError,
+    get_qloo_client,
+    record_qloo_throttled,
+)
+from services.rate_limiter import get_rate_limiter, time_remaining, RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncQlooClient:
+    """
+    asyncio counterpart of QlooClient for the ASGI entry point.
+    Uses a pooled httpx.AsyncClient with the same timeouts, retry policy and
+    pool size as the sync client, and shares its circuit breaker so both code
+    paths in one process agree on whether Qloo is healthy.
+    """
+
+    def __init__(self):
+        sync_client = get_qloo_client()
+        self.base_url = sync_client.base_url
+        self.pool_size = sync_client.pool_size
+        self.max_retries = sync_client.max_retries
+        self.backoff_base = sync_client.backoff_base
+        self.backoff_max = sync_client.backoff_max
+        self.breaker = sync_client.breaker
+        connect_timeout, read_timeout = sync_client.timeout
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._client = None
+        self._client_loop = None
+        self._client_pid = None
+        self._counters = {"requests": 0, "retries": 0, "failures": 0, "short_circuited": 0, "rate_limited": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # An AsyncClient is bound to the event loop (and process) that created it.
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop or self._client_pid != os.getpid():
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                headers={"Content-Type": "application/json"},
+            )
+            self._client_loop = loop
+            self._client_pid = os.getpid()
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None and self._client_pid == os.getpid():
+            await self._client.aclose()
+        self._client = None
+
+    def _backoff_delay(self, attempt: int, response: httpx.Response | None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def get(self, path: str, qloo_api_key: str, params: dict | None = None) -> httpx.Response:
+        """
+        Performs a GET against the Qloo API and returns the final response.
+        Raises QlooCircuitOpenError while the breaker is open, QlooRateLimitedError
+        when the shared rate limit leaves no token in time, QlooDeadlineExceededError
+        once the request's deadline (if any) has passed, httpx.RequestError
+        for network failures and httpx.HTTPStatusError for non-2xx responses
+        once retries are exhausted.
+        """
+        if not self.breaker.allow_request():
+            self._counters["short_circuited"] += 1
+            raise QlooCircuitOpenError(f"Qloo circuit breaker is open; skipping call to {path}.")
+
+        headers = {"X-Api-Key": qloo_api_key}
+        attempt = 0
+        # Set once the breaker has been told how this call went; see QlooClient.get. Being
+        # rate limited or cancelled (the client disconnected) only frees the trial slot.
+        settled = False
+        try:
+            while True:
+                bucket = RATE_LIMIT_BUCKETS.get(path)
+                if bucket is not None:
+                    try:
+                        await get_rate_limiter().acquire_async(bucket)
+                    except RateLimitExceeded as e:
+                        self._counters["rate_limited"] += 1
+                        raise QlooRateLimitedError(f"Qloo {path} rate limit reached: {e}") from e
+                # As in QlooClient.get: work nobody waits for any more ends with the deadline.
+                timeout = self.timeout
+                remaining = time_remaining()
+                if remaining is not None:
+                    if remaining <= 0:
+                        raise QlooDeadlineExceededError(f"Request deadline passed before calling Qloo {path}.")
+                    timeout = httpx.Timeout(min(self.timeout.read, remaining), connect=min(self.timeout.connect, remaining))
+                self._counters["requests"] += 1
+                response = None
+                try:
+                    response = await self.client.get(path, headers=headers, params=params, timeout=timeout)
+                    if response.status_code == 429:
+                        record_qloo_throttled(path)
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        # 4xx other than 429 means Qloo is healthy and the request was bad.
+                        settled = True
+                        self.breaker.record_success()
+                        response.raise_for_status()
+                        return response
+                    error = httpx.HTTPStatusError(
+                        f"{response.status_code} Error: {response.reason_phrase} for url: {response.url}",
+                        request=response.request,
+                        response=response,
+                    )
+                except httpx.TimeoutException as e:
+                    if timeout is not self.timeout:
+                        raise QlooDeadlineExceededError(f"Request deadline passed while calling Qloo {path}.") from e
+                    error = e
+                except httpx.TransportError as e:
+                    error = e
+
+                if attempt >= self.max_retries:
+                    settled = True
+                    self._counters["failures"] += 1
+                    self.breaker.record_failure()
+                    raise error
+
+                delay = self._backoff_delay(attempt, response)
+                if remaining is not None:
+                    delay = min(delay, max(0.0, time_remaining()))
+                attempt += 1
+                self._counters["retries"] += 1
+                logger.warning(f"Qloo call to {path} failed ({error}); retry {attempt}/{self.max_retries} in {delay:.2f}s.")
+                await asyncio.sleep(delay)
+        except (QlooRateLimitedError, QlooDeadlineExceededError):
+            # Our own limit or deadline, not Qloo's health: the finally below only frees the trial slot.
+            raise
+        except httpx.RequestError:
+            # Undecodable content, a redirect loop: still Qloo failing.
+            if not settled:
+                settled = True
+                self._counters["failures"] += 1
+                self.breaker.record_failure()
+            raise
+        finally:
+            if not settled:
+                self.breaker.release_trial()
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "base_url": self.base_url,
+            "pool_size": self.pool_size,
+            "max_retries": self.max_retries,
+            "counters": dict(self._counters),
+            "circuit_breaker": self.breaker.stats(),
+        }
+
+
+# --- PER-PROCESS SHARED CLIENT ---
+_async_client = None
+
+
+def get_async_qloo_client() -> AsyncQlooClient:
+    """Returns the process-wide AsyncQlooClient, creating it on first use."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncQlooClient()
+    return _async_client
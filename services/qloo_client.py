@@ -0,0 +1,371 @@
+# services/qloo_client.py
+
+import os
+import time
+import random
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.rate_limiter import get_rate_limiter, time_remaining, RateLimitExceeded, RequestDeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# Base URL for the Qloo Hackathon API (confirmed by Qloo)
+QLOO_BASE_URL = os.getenv("QLOO_BASE_URL", "https://hackathon.api.qloo.com")
+
+# --- CLIENT CONFIGURATION (all overridable via environment) ---
+QLOO_POOL_SIZE = int(os.getenv("QLOO_POOL_SIZE", 10))
+QLOO_CONNECT_TIMEOUT = float(os.getenv("QLOO_CONNECT_TIMEOUT", 3.05))
+QLOO_READ_TIMEOUT = float(os.getenv("QLOO_READ_TIMEOUT", 10))
+QLOO_MAX_RETRIES = int(os.getenv("QLOO_MAX_RETRIES", 2))
+QLOO_BACKOFF_BASE = float(os.getenv("QLOO_BACKOFF_BASE", 0.25))
+QLOO_BACKOFF_MAX = float(os.getenv("QLOO_BACKOFF_MAX", 2.0))
+QLOO_BREAKER_FAILURE_THRESHOLD = int(os.getenv("QLOO_BREAKER_FAILURE_THRESHOLD", 5))
+QLOO_BREAKER_RESET_TIMEOUT = float(os.getenv("QLOO_BREAKER_RESET_TIMEOUT", 30))
+
+# Status codes worth retrying: rate limiting and transient upstream failures.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Shared rate limiter bucket charged for each Qloo endpoint (see services/rate_limiter.py).
+RATE_LIMIT_BUCKETS = {"/search": "qloo_search", "/v2/insights": "qloo_insights"}
+
+
+class QlooCircuitOpenError(requests.exceptions.RequestException):
+    """
+    Raised instead of calling Qloo while the circuit breaker is open.
+    Subclasses RequestException so existing network-error handling treats it
+    like any other failed call and falls back accordingly.
+    """
+
+
+class QlooRateLimitedError(requests.exceptions.RequestException):
+    """
+    Raised instead of calling Qloo when the shared rate limiter has no token for
+    this endpoint before the request's deadline. Like QlooCircuitOpenError it is a
+    RequestException, so callers fall back as they would for a failed call.
+    """
+
+
+class QlooDeadlineExceededError(requests.exceptions.Timeout, RequestDeadlineExceeded):
+    """
+    Raised instead of (re)trying a Qloo call once the current request's deadline has passed,
+    or when a timeout shortened to fit that deadline fires. Says nothing about Qloo's
+    health, so the circuit breaker does not count it.
+    """
+
+
+def acquire_qloo_token(path: str):
+    """Takes a token from the endpoint's shared bucket; raises QlooRateLimitedError if none comes in time."""
+    bucket = RATE_LIMIT_BUCKETS.get(path)
+    if bucket is None:
+        return
+    try:
+        get_rate_limiter().acquire(bucket)
+    except RateLimitExceeded as e:
+        raise QlooRateLimitedError(f"Qloo {path} rate limit reached: {e}") from e
+
+
+def record_qloo_throttled(path: str):
+    """Qloo answered 429: empty the shared bucket so every worker slows down, not just this one."""
+    bucket = RATE_LIMIT_BUCKETS.get(path)
+    if bucket is not None:
+        get_rate_limiter().drain(bucket)
+
+
+class CircuitBreaker:
+    """
+    Minimal thread-safe circuit breaker.
+    closed    -> calls flow; consecutive failures are counted.
+    open      -> calls fail fast until reset_timeout has elapsed.
+    half_open -> a single trial call is let through; success closes, failure re-opens.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._times_opened = 0
+        self._rejected_calls = 0
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at >= self.reset_timeout:
+                    self._state = self.HALF_OPEN
+                    self._trial_in_flight = False
+                else:
+                    self._rejected_calls += 1
+                    return False
+            if self._state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    self._rejected_calls += 1
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Qloo circuit breaker closed after successful trial call.")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Frees the half-open trial slot after a call that ended without telling us whether Qloo is healthy."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._times_opened += 1
+                    logger.warning(
+                        f"Qloo circuit breaker opened after {self._consecutive_failures} consecutive failures. "
+                        f"Failing fast for {self.reset_timeout}s."
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def stats(self) -> dict:
+        with self._lock:
+            retry_in = 0.0
+            if self._state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "times_opened": self._times_opened,
+                "rejected_calls": self._rejected_calls,
+                "retry_in_seconds": round(retry_in, 2),
+            }
+
+
+class QlooClient:
+    """
+    Shared HTTP client for the Qloo API.
+    Keeps one pooled keep-alive requests.Session per process, applies
+    connect/read timeouts to every call, retries 429/5xx responses with
+    jittered exponential backoff and guards everything with a circuit breaker.
+    """
+
+    def __init__(
+        self,
+        base_url: str = QLOO_BASE_URL,
+        pool_size: int = QLOO_POOL_SIZE,
+        connect_timeout: float = QLOO_CONNECT_TIMEOUT,
+        read_timeout: float = QLOO_READ_TIMEOUT,
+        max_retries: int = QLOO_MAX_RETRIES,
+        backoff_base: float = QLOO_BACKOFF_BASE,
+        backoff_max: float = QLOO_BACKOFF_MAX,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker(QLOO_BREAKER_FAILURE_THRESHOLD, QLOO_BREAKER_RESET_TIMEOUT)
+        self._lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+        self._counters = {"requests": 0, "retries": 0, "failures": 0, "short_circuited": 0, "rate_limited": 0}
+
+    # --- SESSION MANAGEMENT ---
+
+    def _build_session(self) -> requests.Session:
+        session = requests.Session()
+        # Retries are handled in get() so the breaker sees every attempt.
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Content-Type": "application/json"})
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        # Sockets must not be shared across a fork, so each process gets its own session.
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._lock:
+                if self._session is None or self._session_pid != pid:
+                    self._session = self._build_session()
+                    self._session_pid = pid
+        return self._session
+
+    def close(self):
+        with self._lock:
+            if self._session is not None and self._session_pid == os.getpid():
+                self._session.close()
+            self._session = None
+            self._session_pid = None
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _backoff_delay(self, attempt: int, response: requests.Response | None) -> float:
+        # Honour a numeric Retry-After from Qloo when it is within our cap.
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        # "Full jitter" exponential backoff.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    # --- REQUESTS ---
+
+    def get(self, path: str, qloo_api_key: str, params: dict | None = None) -> requests.Response:
+        """
+        Performs a GET against the Qloo API and returns the final response.
+        Raises QlooCircuitOpenError while the breaker is open, QlooRateLimitedError
+        when the shared rate limit leaves no token in time, QlooDeadlineExceededError
+        once the request's deadline (if any) has passed, requests' own
+        exceptions for network failures and HTTPError (via raise_for_status)
+        for non-2xx responses once retries are exhausted.
+        """
+        if not self.breaker.allow_request():
+            self._count("short_circuited")
+            raise QlooCircuitOpenError(f"Qloo circuit breaker is open; skipping call to {path}.")
+
+        url = f"{self.base_url}{path}"
+        headers = {"X-Api-Key": qloo_api_key}
+        attempt = 0
+        # Set once the breaker has been told how this call went. Any other way out of the loop
+        # must free the half-open trial slot, or the breaker would refuse every later call.
+        settled = False
+        try:
+            while True:
+                try:
+                    acquire_qloo_token(path)
+                except QlooRateLimitedError:
+                    self._count("rate_limited")
+                    raise
+                # Work a caller has stopped waiting for (a batch lookup past its deadline) must
+                # end with the deadline rather than hold a thread for every retry.
+                timeout = self.timeout
+                remaining = time_remaining()
+                if remaining is not None:
+                    if remaining <= 0:
+                        raise QlooDeadlineExceededError(f"Request deadline passed before calling Qloo {path}.")
+                    timeout = (min(timeout[0], remaining), min(timeout[1], remaining))
+                self._count("requests")
+                response = None
+                try:
+                    response = self.session.get(url, headers=headers, params=params, timeout=timeout)
+                    if response.status_code == 429:
+                        record_qloo_throttled(path)
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        # 4xx other than 429 means Qloo is healthy and the request was bad.
+                        settled = True
+                        self.breaker.record_success()
+                        response.raise_for_status()
+                        return response
+                    error = requests.exceptions.HTTPError(
+                        f"{response.status_code} Error: {response.reason} for url: {response.url}", response=response
+                    )
+                except requests.exceptions.Timeout as e:
+                    if timeout != self.timeout:
+                        raise QlooDeadlineExceededError(f"Request deadline passed while calling Qloo {path}.") from e
+                    error = e
+                except requests.exceptions.ConnectionError as e:
+                    error = e
+
+                if attempt >= self.max_retries:
+                    settled = True
+                    self._count("failures")
+                    self.breaker.record_failure()
+                    raise error
+
+                delay = self._backoff_delay(attempt, response)
+                if remaining is not None:
+                    delay = min(delay, max(0.0, time_remaining()))
+                attempt += 1
+                self._count("retries")
+                logger.warning(f"Qloo call to {path} failed ({error}); retry {attempt}/{self.max_retries} in {delay:.2f}s.")
+                time.sleep(delay)
+        except (QlooRateLimitedError, QlooDeadlineExceededError):
+            # Our own limit (including a retry after a 429 drained the bucket) or deadline, not
+            # Qloo's health: the finally below only frees the trial slot.
+            raise
+        except requests.exceptions.RequestException:
+            # A broken chunked body, undecodable content, a redirect loop: still Qloo failing.
+            if not settled:
+                settled = True
+                self._count("failures")
+                self.breaker.record_failure()
+            raise
+        finally:
+            if not settled:
+                self.breaker.release_trial()
+
+    # --- OBSERVABILITY ---
+
+    def pool_stats(self) -> dict:
+        """Per-host urllib3 connection pool statistics for this process."""
+        stats = {}
+        if self._session is None or self._session_pid != os.getpid():
+            return stats
+        adapter = self._session.get_adapter(self.base_url)
+        for key in adapter.poolmanager.pools.keys():
+            pool = adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "maxsize": pool.pool.maxsize if pool.pool else 0,
+                # The pool queue is pre-filled with None placeholders; only real sockets count as idle.
+                "idle_connections": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0,
+                "connections_opened": pool.num_connections,
+                "requests_sent": pool.num_requests,
+            }
+        return stats
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "pid": os.getpid(),
+            "base_url": self.base_url,
+            "pool_size": self.pool_size,
+            "timeouts": {"connect": self.timeout[0], "read": self.timeout[1]},
+            "max_retries": self.max_retries,
+            "counters": counters,
+            "circuit_breaker": self.breaker.stats(),
+            "pools": self.pool_stats(),
+        }
+
+
+# --- PER-PROCESS SHARED CLIENT ---
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_qloo_client() -> QlooClient:
+    """Returns the process-wide QlooClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = QlooClient()
+    return _client
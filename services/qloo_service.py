@@ -2,13 +2,22 @@
 
 import os
 import json
+import asyncio
+import httpx
 import requests
 import logging
 
-logger = logging.getLogger(__name__)
+from services.qloo_client import get_qloo_client, QlooCircuitOpenError, QlooDeadlineExceededError, QlooRateLimitedError
+from services.qloo_async_client import get_async_qloo_client
+from services.entity_cache import get_entity_cache
+from services.entity_index import get_entity_index
+from services.insights_cache import get_insights_cache
+from services.singleflight import get_singleflight
+from services.logging_config import log_payload
+from services.metrics import stage, record_fallback
+from services.rate_limiter import RequestDeadlineExceeded
 
-# Base URL for the Qloo Hackathon API (confirmed by Qloo)
-QLOO_BASE_URL = "https://hackathon.api.qloo.com"
+logger = logging.getLogger(__name__)
 
 
 QLOO_DOMAIN_MAPPING = {
@@ -23,18 +32,85 @@ QLOO_DOMAIN_MAPPING = {
     "general": {"insight_filter_type": "urn:entity:tag", "search_type": "urn:entity:tag", "sample_entity_id": "C1D2E3F4-A5B6-C7D8-E9F0-A1B2C3D4E5F6"}, 
 }
 
+# Number of related entities requested from /v2/insights per call.
+QLOO_INSIGHTS_LIMIT = 5
+
+def _parse_search_results(search_results: dict) -> tuple[str | None, str | None]:
+    """Extracts (entity_id, entity_name) from the first /search result, if any."""
+    if search_results and search_results.get('results'):
+        first_result = search_results['results'][0]
+        
+        entity_id = first_result.get('entity_id') 
+        
+        if not entity_id: 
+            entity_id = first_result.get('id') 
+        
+        if not entity_id and isinstance(first_result.get('entity'), dict):
+            entity_id = first_result['entity'].get('id') 
+        
+        entity_name = first_result.get('name')
+        if not entity_name and isinstance(first_result.get('entity'), dict):
+            entity_name = first_result['entity'].get('name')
+
+        return entity_id, entity_name
+    return None, None
+
+def _record_search_result(query: str, search_type: str, search_results: dict) -> str | None:
+    """Parses a /search response, caches the resolution and returns the entity ID (or None)."""
+    entity_id, entity_name = _parse_search_results(search_results)
+    if entity_id:
+        logger.info(f"Found Qloo entity ID '{entity_id}' for '{entity_name or query}'.") 
+        get_entity_cache().set(query, search_type, entity_id)
+        get_entity_index().add(entity_name or query, search_type, entity_id)
+        return entity_id
+
+    logger.info(f"No Qloo entity found for '{query}'.") 
+    get_entity_cache().set(query, search_type, None)
+    return None
+
+def _lookup_entity_locally(query: str, search_type: str) -> tuple[bool, str | None]:
+    """
+    Resolves query without the network: the entity cache first, then the offline entity index.
+    Returns (found, entity_id) with the same meaning as EntityCache.get.
+    """
+    found, cached_entity_id = get_entity_cache().get(query, search_type)
+    if found:
+        logger.info(f"Qloo entity cache hit for '{query}' ({search_type}): {cached_entity_id or 'no match'}.")
+        return True, cached_entity_id
+
+    match = get_entity_index().lookup(query, search_type)
+    if match:
+        logger.info(f"Local entity index {match.match} match for '{query}' ({search_type}): '{match.name}' -> {match.entity_id}.")
+        return True, match.entity_id
+    return False, None
+
 def _get_qloo_entity_id(query: str, search_type: str, qloo_api_key: str) -> str | None:
     """
     Performs a Qloo /search call to find an entity ID based on a query and type.
     This uses the hackathon base URL for the /search endpoint.
     Returns the entity ID if found, otherwise None.
+    Resolutions (including "no match") are cached across workers and confident
+    matches in the local entity index skip the call; transport and HTTP errors
+    are never cached.
     """
-    search_url = f"{QLOO_BASE_URL}/search"
-    
-    headers = {
-        "X-Api-Key": qloo_api_key,
-        "Content-Type": "application/json"
-    }
+    found, local_entity_id = _lookup_entity_locally(query, search_type)
+    if found:
+        return local_entity_id
+
+    # Concurrent misses for the same normalized query share one /search call.
+    try:
+        return get_singleflight("qloo_search").do(
+            get_entity_cache().make_key(query, search_type),
+            lambda: _search_qloo_entity_id(query, search_type, qloo_api_key),
+        )
+    except RequestDeadlineExceeded as e:
+        logger.error(f"Gave up waiting for a shared Qloo /search call: {e}")
+        return None
+
+def _search_qloo_entity_id(query: str, search_type: str, qloo_api_key: str) -> str | None:
+    """Performs the uncached /search call for _get_qloo_entity_id."""
+    client = get_qloo_client()
+    search_url = f"{client.base_url}/search"
     
     params = {
         "query": query,
@@ -46,33 +122,11 @@ def _get_qloo_entity_id(query: str, search_type: str, qloo_api_key: str) -> str
     logger.info(f"Making Qloo /search API call to {search_url} with params: {params}")
 
     try:
-        response = requests.get(search_url, headers=headers, params=params)
-        response.raise_for_status()
-        search_results = response.json()
-        logger.debug(f"Qloo /search API response: {json.dumps(search_results, indent=2)}")
-
-        if search_results and search_results.get('results'):
-            first_result = search_results['results'][0]
-            
-            entity_id = first_result.get('entity_id') 
-            
-            if not entity_id: 
-                entity_id = first_result.get('id') 
-            
-            if not entity_id and isinstance(first_result.get('entity'), dict):
-                entity_id = first_result['entity'].get('id') 
-            
-            entity_name = first_result.get('name')
-            if not entity_name and isinstance(first_result.get('entity'), dict):
-                entity_name = first_result['entity'].get('name')
-
-
-            if entity_id:
-                logger.info(f"Found Qloo entity ID '{entity_id}' for '{entity_name or query}'.") 
-                return entity_id
-        
-        logger.info(f"No Qloo entity found for '{query}'.") 
-        return None
+        with stage("qloo_search"):
+            response = client.get("/search", qloo_api_key, params=params)
+            search_results = response.json()
+        log_payload(logger, "Qloo /search API response", search_results)
+        return _record_search_result(query, search_type, search_results)
 
     except requests.exceptions.HTTPError as e:
         status_code = e.response.status_code
@@ -89,44 +143,64 @@ def _get_qloo_entity_id(query: str, search_type: str, qloo_api_key: str) -> str
         logger.error(f"An unexpected error occurred in Qloo /search call: {e}", exc_info=True)
         return None
 
-def get_user_tastes(user_input: str, domain: str, qloo_api_key: str) -> dict:
+def _parse_insights_response(qloo_insights_raw_data: dict) -> list:
+    """Turns a raw /v2/insights payload into the list of {name, id, type} dicts used downstream."""
+    qloo_recommendations_list = []
+    if qloo_insights_raw_data and qloo_insights_raw_data.get('results') and qloo_insights_raw_data['results'].get('entities'):
+        for entity_item in qloo_insights_raw_data['results']['entities']: # Changed variable name to entity_item for clarity
+            # Each 'entity_item' is now directly the entity dictionary
+            qloo_recommendations_list.append({
+                "name": entity_item.get('name'), 
+                "id": entity_item.get('entity_id'), # Use 'entity_id' from insights response
+                "type": entity_item.get('subtype') or entity_item.get('type') # Use subtype if available, else type
+            })
+    return qloo_recommendations_list
+
+def _insights_params(target_entity_id: str, filter_type: str, limit: int) -> dict:
+    return {
+        "limit": limit, 
+        "signal.interests.entities": target_entity_id,  
+        "filter.type": filter_type 
+    }
+
+def _fetch_qloo_insights(target_entity_id: str, filter_type: str, limit: int, qloo_api_key: str) -> list:
     """
-    Attempts to get cultural insights from Qloo API.
-    First, tries to find a matching entity using the /search endpoint based on user input.
-    If found, uses that entity's ID for the /v2/insights call.
-    Returns a dictionary with 'status_message' and 'qloo_recommendations' (a list of dicts).
+    Performs the Qloo /v2/insights call for one entity and returns the parsed
+    recommendations list. Errors propagate to the caller.
     """
-    if not qloo_api_key:
-        logger.error("QLOO_API_KEY was not provided to get_user_tastes function.")
-        return {"status_message": "Qloo API key not configured.", "qloo_recommendations": []}
+    insights_params = _insights_params(target_entity_id, filter_type, limit)
+    logger.info(f"Making Qloo /insights API (GET) call with params: {insights_params}")
 
-    headers = {
-        "Content-Type": "application/json", 
-        "X-Api-Key": qloo_api_key
-    }
-    
-    status_message = ""
-    qloo_recommendations_list = [] 
+    with stage("qloo_insights"):
+        response = get_qloo_client().get("/v2/insights", qloo_api_key, params=insights_params)
+        try:
+            qloo_insights_raw_data = response.json()
+        except json.JSONDecodeError:
+            logger.error(f"Raw Qloo /insights response: {response.text}")
+            raise
+    logger.info("Qloo /insights API (GET) call successful.")
+    log_payload(logger, "Qloo /insights API raw response", qloo_insights_raw_data)
 
-    domain_map_info = QLOO_DOMAIN_MAPPING.get(domain.lower(), {})
-    selected_insight_filter_type = domain_map_info.get("insight_filter_type") 
-    selected_search_type = domain_map_info.get("search_type")
-    
-    target_entity_id = None
-    
-    # --- Step 1: Attempt to find entity ID using /search endpoint ---
-    if selected_search_type and user_input:
-        found_entity_id = _get_qloo_entity_id(user_input, selected_search_type, qloo_api_key)
+    return _parse_insights_response(qloo_insights_raw_data)
+
+def _choose_target_entity(user_input: str, domain: str, domain_map_info: dict, found_entity_id: str | None) -> tuple[str | None, str]:
+    """
+    Decides which entity the insights call should use and builds the matching status message.
+    Falls back to the domain's sample entity when search found nothing.
+    """
+    if domain_map_info.get("search_type") and user_input:
         if found_entity_id:
             target_entity_id = found_entity_id
             status_message = f"Qloo found a matching entity for '{user_input}'. Getting insights..."
         else:
+            target_entity_id = None
             status_message = (
                 f"Qloo could not find a specific entity for '{user_input}' in the '{domain}' domain. "
                 f"Recommendations will be based on general AI knowledge."
             )
             logger.info(status_message) 
     else:
+        target_entity_id = None
         status_message = (
             f"Qloo search not attempted for '{user_input}' in '{domain}' domain "
             f"(missing search type or query). Recommendations will be based on general AI knowledge."
@@ -137,43 +211,60 @@ def get_user_tastes(user_input: str, domain: str, qloo_api_key: str) -> dict:
     if not target_entity_id and domain_map_info.get("sample_entity_id"):
         target_entity_id = domain_map_info["sample_entity_id"]
         status_message += " Falling back to sample ID for insights demo."
+        record_fallback("qloo_sample_entity")
         logger.warning(f"No specific entity found, using sample ID: {target_entity_id}")
     elif not target_entity_id: 
         status_message += " No valid entity ID (dynamic or sample) found for insights."
+        record_fallback("qloo_no_entity")
         logger.warning(status_message)
-        return {"status_message": status_message, "qloo_recommendations": []}
 
+    return target_entity_id, status_message
+
+def _insights_result_status(qloo_recommendations_list: list) -> str:
+    if qloo_recommendations_list:
+        return f"\nQloo provided {len(qloo_recommendations_list)} specific recommendations."
+    return "\nQloo /insights API call successful, but no specific results found for the entity's insights."
+
+def get_user_tastes(user_input: str, domain: str, qloo_api_key: str) -> dict:
+    """
+    Attempts to get cultural insights from Qloo API.
+    First, tries to find a matching entity using the /search endpoint based on user input.
+    If found, uses that entity's ID for the /v2/insights call.
+    Returns a dictionary with 'status_message' and 'qloo_recommendations' (a list of dicts).
+    """
+    if not qloo_api_key:
+        logger.error("QLOO_API_KEY was not provided to get_user_tastes function.")
+        record_fallback("qloo_not_configured")
+        return {"status_message": "Qloo API key not configured.", "qloo_recommendations": []}
+
+    qloo_recommendations_list = [] 
+
+    domain_map_info = QLOO_DOMAIN_MAPPING.get(domain.lower(), {})
+    selected_insight_filter_type = domain_map_info.get("insight_filter_type") 
+    selected_search_type = domain_map_info.get("search_type")
     
-    if target_entity_id and selected_insight_filter_type:
-        insights_url = f"{QLOO_BASE_URL}/v2/insights"
-        
-        insights_params = {
-            "limit": 5, 
-            "signal.interests.entities": target_entity_id,  
-            "filter.type": selected_insight_filter_type 
-        }
+    # --- Step 1: Attempt to find entity ID using /search endpoint ---
+    found_entity_id = None
+    if selected_search_type and user_input:
+        found_entity_id = _get_qloo_entity_id(user_input, selected_search_type, qloo_api_key)
 
-        logger.info(f"Making Qloo /insights API (GET) call with params: {insights_params}")
-        
+    target_entity_id, status_message = _choose_target_entity(user_input, domain, domain_map_info, found_entity_id)
+    if not target_entity_id:
+        return {"status_message": status_message, "qloo_recommendations": []}
+
+    # --- Step 2: Get insights for the chosen entity ---
+    if target_entity_id and selected_insight_filter_type:
         try:
-            response = requests.get(insights_url, headers=headers, params=insights_params)
-            response.raise_for_status()
-            qloo_insights_raw_data = response.json()
-            logger.info("Qloo /insights API (GET) call successful.")
-            logger.debug(f"Qloo /insights API raw response: {json.dumps(qloo_insights_raw_data, indent=2)}")
-
-            
-            if qloo_insights_raw_data and qloo_insights_raw_data.get('results') and qloo_insights_raw_data['results'].get('entities'):
-                for entity_item in qloo_insights_raw_data['results']['entities']: # Changed variable name to entity_item for clarity
-                    # Each 'entity_item' is now directly the entity dictionary
-                    qloo_recommendations_list.append({
-                        "name": entity_item.get('name'), 
-                        "id": entity_item.get('entity_id'), # Use 'entity_id' from insights response
-                        "type": entity_item.get('subtype') or entity_item.get('type') # Use subtype if available, else type
-                    })
-                status_message += f"\nQloo provided {len(qloo_recommendations_list)} specific recommendations."
-            else:
-                status_message += "\nQloo /insights API call successful, but no specific results found for the entity's insights."
+            insights_key = (target_entity_id, selected_insight_filter_type, QLOO_INSIGHTS_LIMIT)
+            # Cache misses (and stale refreshes) for the same key share one in-flight /v2/insights call.
+            qloo_recommendations_list = get_insights_cache().get_or_fetch(
+                insights_key,
+                lambda: get_singleflight("qloo_insights").do(
+                    insights_key,
+                    lambda: _fetch_qloo_insights(target_entity_id, selected_insight_filter_type, QLOO_INSIGHTS_LIMIT, qloo_api_key),
+                ),
+            )
+            status_message += _insights_result_status(qloo_recommendations_list)
 
         except requests.exceptions.HTTPError as e:
             status_code = e.response.status_code
@@ -181,11 +272,154 @@ def get_user_tastes(user_input: str, domain: str, qloo_api_key: str) -> dict:
             logger.error(f"HTTP Error calling Qloo /insights API: Status {status_code} - Reason: {e.response.reason}")
             logger.error(f"Response content: {response_text}")
             status_message += f"\nQloo /insights API Error: Status {status_code}. Details: {response_text}"
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, RequestDeadlineExceeded) as e:
+            logger.error(f"Network/Request Error calling Qloo /insights API: {e}")
+            status_message += f"\nQloo /insights API Network Error: {e}"
+        except json.JSONDecodeError as e:
+            logger.error(f"Error decoding JSON response from Qloo /insights: {e}")
+            status_message += "\nQloo /insights API returned unreadable response."
+        except Exception as e:
+            logger.error(f"An unexpected error occurred in Qloo /insights call: {e}", exc_info=True)
+            status_message += f"\nAn unexpected Qloo /insights service error: {e}"
+    else:
+        status_message += "\nQloo insights not attempted due to missing target entity ID or filter type."
+        logger.warning(status_message)
+
+    return {
+        "status_message": status_message,
+        "qloo_recommendations": qloo_recommendations_list
+    }
+
+def resolve_entity_locally(user_input: str, domain: str) -> str | None:
+    """The Qloo entity ID user_input resolves to from the local cache or index, never calling Qloo."""
+    search_type = QLOO_DOMAIN_MAPPING.get(domain.lower(), {}).get("search_type")
+    if not (search_type and user_input):
+        return None
+    _, entity_id = _lookup_entity_locally(user_input, search_type)
+    return entity_id
+
+def get_cached_user_tastes(user_input: str, domain: str) -> list:
+    """
+    Qloo recommendations for this input from local caches only (entity cache/index, then the
+    insights cache), never calling Qloo. Used to answer requests that are shed under load.
+    """
+    domain_map_info = QLOO_DOMAIN_MAPPING.get(domain.lower(), {})
+    search_type = domain_map_info.get("search_type")
+    filter_type = domain_map_info.get("insight_filter_type")
+    if not (search_type and filter_type and user_input):
+        return []
+    found, entity_id = _lookup_entity_locally(user_input, search_type)
+    if not (found and entity_id):
+        return []
+    return get_insights_cache().peek((entity_id, filter_type, QLOO_INSIGHTS_LIMIT)) or []
+
+# --- ASYNC VARIANTS (used by the ASGI entry point in asgi.py) ---
+# These mirror the functions above call for call, but await the shared AsyncQlooClient
+# so one event-loop worker can hold many Qloo calls in flight. The entity cache's shared
+# tier is SQLite, which can wait up to a second on a busy lock, so the local lookups and
+# writes run in a worker thread instead of on the event loop.
+
+async def _get_qloo_entity_id_async(query: str, search_type: str, qloo_api_key: str) -> str | None:
+    """asyncio counterpart of _get_qloo_entity_id."""
+    found, local_entity_id = await asyncio.to_thread(_lookup_entity_locally, query, search_type)
+    if found:
+        return local_entity_id
+
+    try:
+        return await get_singleflight("qloo_search").do_async(
+            get_entity_cache().make_key(query, search_type),
+            lambda: _search_qloo_entity_id_async(query, search_type, qloo_api_key),
+        )
+    except RequestDeadlineExceeded as e:
+        logger.error(f"Gave up waiting for a shared Qloo /search call: {e}")
+        return None
+
+async def _search_qloo_entity_id_async(query: str, search_type: str, qloo_api_key: str) -> str | None:
+    """Performs the uncached /search call for _get_qloo_entity_id_async."""
+    params = {
+        "query": query,
+        "types": search_type,
+        "take": 2
+    }
+    logger.info(f"Making async Qloo /search API call with params: {params}")
+
+    try:
+        with stage("qloo_search"):
+            response = await get_async_qloo_client().get("/search", qloo_api_key, params=params)
+            search_results = response.json()
+        log_payload(logger, "Qloo /search API response", search_results)
+        return await asyncio.to_thread(_record_search_result, query, search_type, search_results)
+
+    except httpx.HTTPStatusError as e:
+        logger.error(f"HTTP Error calling Qloo /search API: Status {e.response.status_code} - Reason: {e.response.reason_phrase}")
+        logger.error(f"Response content: {e.response.text}")
+        return None
+    except (httpx.RequestError, QlooCircuitOpenError, QlooRateLimitedError, QlooDeadlineExceededError) as e:
+        logger.error(f"Network/Request Error calling Qloo /search API: {e}")
+        return None
+    except json.JSONDecodeError as e:
+        logger.error(f"Error decoding JSON response from Qloo /search: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"An unexpected error occurred in Qloo /search call: {e}", exc_info=True)
+        return None
+
+async def _fetch_qloo_insights_async(target_entity_id: str, filter_type: str, limit: int, qloo_api_key: str) -> list:
+    """asyncio counterpart of _fetch_qloo_insights. Errors propagate to the caller."""
+    insights_params = _insights_params(target_entity_id, filter_type, limit)
+    logger.info(f"Making async Qloo /insights API (GET) call with params: {insights_params}")
+
+    with stage("qloo_insights"):
+        response = await get_async_qloo_client().get("/v2/insights", qloo_api_key, params=insights_params)
+        qloo_insights_raw_data = response.json()
+    log_payload(logger, "Qloo /insights API raw response", qloo_insights_raw_data)
+
+    return _parse_insights_response(qloo_insights_raw_data)
+
+async def get_user_tastes_async(user_input: str, domain: str, qloo_api_key: str) -> dict:
+    """asyncio counterpart of get_user_tastes with the same return contract."""
+    if not qloo_api_key:
+        logger.error("QLOO_API_KEY was not provided to get_user_tastes_async function.")
+        record_fallback("qloo_not_configured")
+        return {"status_message": "Qloo API key not configured.", "qloo_recommendations": []}
+
+    qloo_recommendations_list = []
+
+    domain_map_info = QLOO_DOMAIN_MAPPING.get(domain.lower(), {})
+    selected_insight_filter_type = domain_map_info.get("insight_filter_type")
+    selected_search_type = domain_map_info.get("search_type")
+
+    found_entity_id = None
+    if selected_search_type and user_input:
+        found_entity_id = await _get_qloo_entity_id_async(user_input, selected_search_type, qloo_api_key)
+
+    target_entity_id, status_message = _choose_target_entity(user_input, domain, domain_map_info, found_entity_id)
+    if not target_entity_id:
+        return {"status_message": status_message, "qloo_recommendations": []}
+
+    if selected_insight_filter_type:
+        try:
+            insights_key = (target_entity_id, selected_insight_filter_type, QLOO_INSIGHTS_LIMIT)
+            qloo_recommendations_list = await get_insights_cache().aget_or_fetch(
+                insights_key,
+                lambda: get_singleflight("qloo_insights").do_async(
+                    insights_key,
+                    lambda: _fetch_qloo_insights_async(target_entity_id, selected_insight_filter_type, QLOO_INSIGHTS_LIMIT, qloo_api_key),
+                ),
+            )
+            status_message += _insights_result_status(qloo_recommendations_list)
+
+        except httpx.HTTPStatusError as e:
+            status_code = e.response.status_code
+            response_text = e.response.text
+            logger.error(f"HTTP Error calling Qloo /insights API: Status {status_code} - Reason: {e.response.reason_phrase}")
+            logger.error(f"Response content: {response_text}")
+            status_message += f"\nQloo /insights API Error: Status {status_code}. Details: {response_text}"
+        except (httpx.RequestError, QlooCircuitOpenError, QlooRateLimitedError, RequestDeadlineExceeded) as e:
             logger.error(f"Network/Request Error calling Qloo /insights API: {e}")
             status_message += f"\nQloo /insights API Network Error: {e}"
         except json.JSONDecodeError as e:
-            logger.error(f"Error decoding JSON response from Qloo /insights: {e}. Raw response: {response.text}")
+            logger.error(f"Error decoding JSON response from Qloo /insights: {e}")
             status_message += "\nQloo /insights API returned unreadable response."
         except Exception as e:
             logger.error(f"An unexpected error occurred in Qloo /insights call: {e}", exc_info=True)
@@ -0,0 +1,233 @@
+# services/rate_limiter.py
+
+import os
+import time
+import asyncio
+import sqlite3
+import tempfile
+import threading
+import logging
+from contextvars import ContextVar
+
+from services.metrics import record_rate_limited
+
+logger = logging.getLogger(__name__)
+
+# --- LIMITER CONFIGURATION (all overridable via environment) ---
+# Bucket state lives in one SQLite file so every gunicorn worker on the host draws from
+# the same budget. Set an upstream's rate to 0 to leave it unlimited.
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", os.path.join(tempfile.gettempdir(), "culturesphere_rate_limits.sqlite3"))
+RATE_LIMITS = {
+    # upstream: (tokens per second, burst capacity)
+    "qloo_search": (float(os.getenv("RATE_LIMIT_QLOO_SEARCH_RPS", 10)), float(os.getenv("RATE_LIMIT_QLOO_SEARCH_BURST", 20))),
+    "qloo_insights": (float(os.getenv("RATE_LIMIT_QLOO_INSIGHTS_RPS", 10)), float(os.getenv("RATE_LIMIT_QLOO_INSIGHTS_BURST", 20))),
+    "gemini": (float(os.getenv("RATE_LIMIT_GEMINI_RPS", 2)), float(os.getenv("RATE_LIMIT_GEMINI_BURST", 10))),
+}
+# Longest a caller without a request deadline waits for a token.
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", 2))
+
+_request_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when no upstream token can be had before the caller's deadline."""
+
+
+class RequestDeadlineExceeded(Exception):
+    """Raised when the current request's deadline passes before work it waits for is done."""
+
+
+# --- REQUEST DEADLINES ---
+
+def set_request_deadline(seconds: float) -> float:
+    """Gives the current request `seconds` to finish; returns the absolute (monotonic) deadline."""
+    deadline = time.monotonic() + seconds
+    _request_deadline.set(deadline)
+    return deadline
+
+
+def clear_request_deadline():
+    _request_deadline.set(None)
+
+
+def time_remaining() -> float | None:
+    """Seconds left before the current request's deadline, or None if it has none."""
+    deadline = _request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def _wait_budget() -> float:
+    remaining = time_remaining()
+    if remaining is None:
+        return RATE_LIMIT_MAX_WAIT_SECONDS
+    return max(0.0, min(remaining, RATE_LIMIT_MAX_WAIT_SECONDS))
+
+
+# --- SHARED TOKEN BUCKETS ---
+
+class SharedTokenBuckets:
+    """
+    Token buckets whose state is a row per upstream in a SQLite file, updated under
+    BEGIN IMMEDIATE so concurrent workers never hand out the same token. If the store
+    cannot be used the limiter fails open: an unavailable limiter must not take the
+    service down with it.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_PATH, limits: dict = RATE_LIMITS):
+        self.path = path
+        self.limits = limits
+        self._lock = threading.Lock()
+        self._thread_state = threading.local()
+        self._counters = {name: {"acquired": 0, "waited": 0, "rejected": 0, "drained": 0} for name in limits}
+        self._counters["_store"] = {"errors": 0}
+
+    def _connection(self) -> sqlite3.Connection | None:
+        # sqlite3 connections are neither thread- nor fork-safe, so keep one per thread per process.
+        state = self._thread_state
+        if getattr(state, "pid", None) != os.getpid():
+            state.conn = None
+            state.pid = os.getpid()
+        if state.conn is None:
+            try:
+                conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS token_buckets ("
+                    "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+                )
+                state.conn = conn
+            except sqlite3.Error as e:
+                self._count("_store", "errors")
+                logger.error(f"Could not open shared rate limiter store at {self.path}: {e}")
+                return None
+        return state.conn
+
+    def _count(self, name: str, counter: str):
+        with self._lock:
+            self._counters[name][counter] += 1
+
+    def _take(self, name: str) -> float:
+        """Takes one token if available; returns 0.0 on success, else seconds until the next token."""
+        rate, capacity = self.limits[name]
+        conn = self._connection()
+        if conn is None:
+            return 0.0
+        # Wall-clock time, since the timestamp is compared across processes.
+        now = time.time()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated_at FROM token_buckets WHERE name = ?", (name,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+                wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+                if wait == 0.0:
+                    tokens -= 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO token_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                    (name, tokens, now),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            self._count("_store", "errors")
+            logger.error(f"Shared rate limiter update for '{name}' failed; allowing the call: {e}")
+            return 0.0
+        return wait
+
+    def _should_wait(self, name: str, budget: float, started: float) -> float | None:
+        """Next sleep before retrying, or None to give up (the token will not come in time)."""
+        wait = self._take(name)
+        if wait == 0.0:
+            return 0.0
+        if time.monotonic() - started + wait > budget:
+            return None
+        return wait
+
+    def acquire(self, name: str):
+        """
+        Blocks until `name` has a token, for at most the request's remaining deadline
+        (or RATE_LIMIT_MAX_WAIT_SECONDS). Raises RateLimitExceeded without waiting
+        when the next token would arrive too late.
+        """
+        if self.limits.get(name, (0, 0))[0] <= 0:
+            return
+        budget, started, waited = _wait_budget(), time.monotonic(), False
+        while True:
+            wait = self._should_wait(name, budget, started)
+            if wait == 0.0:
+                self._count(name, "waited" if waited else "acquired")
+                return
+            if wait is None:
+                self._reject(name)
+            waited = True
+            time.sleep(wait)
+
+    async def acquire_async(self, name: str):
+        """
+        asyncio variant of acquire. The SQLite update can wait up to a second on a busy
+        store lock, so it runs in a worker thread rather than on the event loop.
+        """
+        if self.limits.get(name, (0, 0))[0] <= 0:
+            return
+        budget, started, waited = _wait_budget(), time.monotonic(), False
+        while True:
+            wait = await asyncio.to_thread(self._should_wait, name, budget, started)
+            if wait == 0.0:
+                self._count(name, "waited" if waited else "acquired")
+                return
+            if wait is None:
+                self._reject(name)
+            waited = True
+            await asyncio.sleep(wait)
+
+    def _reject(self, name: str):
+        self._count(name, "rejected")
+        record_rate_limited(name)
+        raise RateLimitExceeded(f"{name} rate limit budget exhausted")
+
+    def drain(self, name: str):
+        """Empties a bucket after the upstream itself answered 429, so every worker backs off."""
+        if name not in self.limits or self.limits[name][0] <= 0:
+            return
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO token_buckets (name, tokens, updated_at) VALUES (?, 0, ?)", (name, time.time())
+            )
+            self._count(name, "drained")
+        except sqlite3.Error as e:
+            self._count("_store", "errors")
+            logger.error(f"Draining rate limiter bucket '{name}' failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {name: dict(c) for name, c in self._counters.items()}
+        store_errors = counters.pop("_store")["errors"]
+        return {
+            "path": self.path,
+            "limits": {name: {"rate_per_second": rate, "burst": burst} for name, (rate, burst) in self.limits.items()},
+            "counters": counters,
+            "store_errors": store_errors,
+        }
+
+
+# --- PER-PROCESS SHARED LIMITER ---
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> SharedTokenBuckets:
+    """Returns the process-wide SharedTokenBuckets, creating it on first use."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = SharedTokenBuckets()
+    return _rate_limiter
@@ -0,0 +1,153 @@
+# services/recommendation_pipeline.py
+
+# Fallback text and Gemini reply handling shared by the Flask app (app.py) and the ASGI app
+# (asgi.py), so both entry points produce the same recommendations for the same inputs.
+# The prompts themselves are built by services/prompt_builder.py.
+
+import re
+import json
+import logging
+
+from services.metrics import record_fallback
+
+logger = logging.getLogger(__name__)
+
+# Message returned to the frontend when the Gemini call itself fails.
+GEMINI_ERROR_TEXT = "Failed to generate AI recommendations. Please try again later. (Gemini error)."
+
+# End of the last complete sentence, including any closing quote or bracket.
+_SENTENCE_END_RE = re.compile(r"[.!?…][\"'”)\]]*(?=\s|$)")
+# One complete "key": "string value" pair in a JSON object, escapes included.
+_JSON_STRING_PAIR_RE = re.compile(r'"((?:[^"\\]|\\.)*)"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+class GeminiNoTextError(Exception):
+    """
+    Gemini answered without any visible text: the prompt was blocked, or max_output_tokens
+    ran out first (on 2.5 models, thinking tokens count toward it).
+    """
+
+
+def gemini_finish_reason(response) -> str | None:
+    """The first candidate's finish reason by name ("STOP", "MAX_TOKENS", ...), or None."""
+    candidates = getattr(response, "candidates", None)
+    if not candidates:
+        return None
+    reason = getattr(candidates[0], "finish_reason", None)
+    return getattr(reason, "name", None) or (str(reason) if reason is not None else None)
+
+
+def gemini_chunk_text(response) -> str:
+    """
+    The visible text of a Gemini response or stream chunk, "" if it has none. Unlike the
+    SDK's response.text it does not raise for a candidate without parts, which is how a
+    reply that stopped at max_output_tokens (or a blocked prompt) arrives.
+    """
+    candidates = getattr(response, "candidates", None)
+    if candidates is None:
+        return response.text
+    if not candidates:
+        return ""
+    content = getattr(candidates[0], "content", None)
+    return "".join(getattr(part, "text", "") or "" for part in getattr(content, "parts", None) or [])
+
+
+def gemini_response_text(response, json_reply: bool = False) -> str:
+    """
+    The narrative in a complete (non-streamed) Gemini response. A prose reply cut off by
+    max_output_tokens is trimmed back to its last complete sentence; a JSON reply
+    (json_reply, for a response_mime_type="application/json" prompt) is returned as cut,
+    for parse_batch_narratives to recover what it can. A reply with no text at all raises
+    GeminiNoTextError, so callers fall back as for any other Gemini error.
+    """
+    text = gemini_chunk_text(response)
+    finish_reason = gemini_finish_reason(response)
+    if finish_reason == "MAX_TOKENS":
+        record_fallback("gemini_max_tokens")
+        if not text.strip():
+            raise GeminiNoTextError("Gemini used up max_output_tokens before writing any text.")
+        if json_reply:
+            logger.warning(f"Gemini JSON reply stopped at max_output_tokens after {len(text)} characters.")
+            return text
+        logger.warning(f"Gemini reply stopped at max_output_tokens after {len(text)} characters; trimming it.")
+        sentence_ends = list(_SENTENCE_END_RE.finditer(text))
+        if sentence_ends:
+            text = text[: sentence_ends[-1].end()]
+    elif not text.strip():
+        raise GeminiNoTextError(f"Gemini returned no text (finish reason: {finish_reason}).")
+    return text
+
+def fallback_recommendations_text(user_input: str, domain: str, qloo_status_message_for_gemini: str) -> str:
+    # Fallback message if Gemini API key is not configured
+    return f"""
+        Based on your interest in "{user_input}" and the {domain} domain, here are some personalized recommendations.
+        
+        This is a fallback response. To get full AI-powered recommendations, please ensure your GEMINI_API_KEY is correctly set in the .env file.
+        (Qloo feedback: {qloo_status_message_for_gemini})
+        """
+
+def degraded_recommendations_text(user_input: str, domain: str, qloo_specific_recommendations: list) -> str:
+    """Answer for a request shed under load: the Qloo picks alone, without a Gemini narrative."""
+    recommended_names = [item.get('name') for item in qloo_specific_recommendations if item.get('name')]
+    if recommended_names:
+        return (
+            f"We're handling a lot of requests right now, so here are quick {domain} picks for \"{user_input}\" "
+            f"from Qloo's Taste AI: {', '.join(recommended_names)}. Try again in a moment for a full personalized write-up."
+        )
+    return (
+        f"We're handling a lot of requests right now and couldn't prepare {domain} recommendations "
+        f"for \"{user_input}\". Please try again in a moment."
+    )
+
+def parse_batch_narratives(response_text: str, domains: list) -> dict:
+    """
+    Extracts {domain: narrative} from Gemini's JSON reply. Domains missing from the reply
+    (or an unparseable reply) are simply absent from the result; from a reply cut off
+    mid-object, the domains whose narrative was written out in full are kept.
+    """
+    try:
+        parsed = json.loads(response_text)
+    except (TypeError, json.JSONDecodeError):
+        # Tolerate a reply wrapped in prose or a code fence by taking the outermost object.
+        parsed = None
+        start, end = (response_text or "").find("{"), (response_text or "").rfind("}")
+        if start != -1 and end > start:
+            try:
+                parsed = json.loads(response_text[start:end + 1])
+            except json.JSONDecodeError:
+                pass
+        if parsed is None:
+            # A reply cut off by max_output_tokens: keep the narratives that were finished.
+            parsed = _complete_string_pairs(response_text or "")
+            logger.warning(f"Gemini batch reply is not valid JSON; recovered complete narratives for: "
+                           f"{', '.join(d for d in domains if d in parsed) or 'none'}.")
+    if not isinstance(parsed, dict):
+        return {}
+    return {domain: parsed[domain] for domain in domains if isinstance(parsed.get(domain), str) and parsed[domain].strip()}
+
+def _complete_string_pairs(text: str) -> dict:
+    """The "key": "value" pairs of a truncated JSON object whose string values are complete."""
+    pairs = {}
+    for match in _JSON_STRING_PAIR_RE.finditer(text):
+        try:
+            pairs[json.loads(f'"{match.group(1)}"')] = json.loads(match.group(2))
+        except json.JSONDecodeError:
+            continue
+    return pairs
+
+def build_batch_response(domain_results: dict, narratives: dict, missing_narrative_text: str) -> dict:
+    """
+    Assembles the /api/recommendations/batch payload. domain_results maps each domain to
+    {"status", "qloo_status", "entities"}; domains without a narrative get missing_narrative_text.
+    """
+    return {
+        "recommendations": {domain: narratives.get(domain) or missing_narrative_text for domain in domain_results},
+        "domains": domain_results,
+    }
+
+def chat_fallback_text(page: str) -> str:
+    # Used when Gemini is not configured or has no capacity for this turn
+    return (
+        f"I can't chat in depth right now, but the {page if page != 'home' else 'domain'} pages are a great place to start: "
+        "tell them your mood or favorite artists and CultureSphere will build personalized recommendations."
+    )
@@ -0,0 +1,166 @@
+# services/singleflight.py
+
+import asyncio
+import threading
+import logging
+
+from services.metrics import record_coalesced
+from services.rate_limiter import time_remaining, RequestDeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters", "followers")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller (the leader)
+    runs the function, callers arriving while it is in flight wait for and share
+    its result or exception. Nothing is cached once the call completes.
+    Thread callers use do(); event-loop callers use do_async(). A caller waits for
+    someone else's call only until its own request deadline (if any), then gets
+    RequestDeadlineExceeded.
+
+    Calls are only shared within one process: with one single-threaded sync worker per
+    process nothing is ever in flight to share, so coalescing needs threaded (gthread)
+    or async workers, where many requests are served by the same process.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self._counters = {"executions": 0, "coalesced": 0, "errors": 0, "deadline_exceeded": 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._counters["coalesced"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._counters["executions"] += 1
+                leader = True
+
+        if not leader:
+            record_coalesced(self.name)
+            # A slow leader must not hold this request past its own deadline.
+            remaining = time_remaining()
+            if not call.event.wait(None if remaining is None else max(0.0, remaining)):
+                self._deadline_exceeded()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._counters["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            if call.waiters:
+                logger.info(f"Single-flight '{self.name}' shared one upstream call with {call.waiters} waiting request(s).")
+            call.event.set()
+        return call.result
+
+    async def do_async(self, key, coro_fn):
+        call = self._async_calls.get(key)
+        if call is not None:
+            call.followers += 1
+            with self._lock:
+                self._counters["coalesced"] += 1
+            record_coalesced(self.name)
+        else:
+            # The shared work runs as its own task, so it outlives whichever caller started it.
+            call = _AsyncCall(asyncio.get_running_loop().create_task(coro_fn()))
+            self._async_calls[key] = call
+            with self._lock:
+                self._counters["executions"] += 1
+            call.task.add_done_callback(lambda task: self._async_call_done(key, call))
+
+        call.waiters += 1
+        try:
+            # shield() so a caller being cancelled (its client disconnected) or running out of
+            # time, the first one included, does not cancel the call the others are waiting for.
+            remaining = time_remaining()
+            if remaining is None:
+                return await asyncio.shield(call.task)
+            try:
+                return await asyncio.wait_for(asyncio.shield(call.task), max(0.0, remaining))
+            except asyncio.TimeoutError:
+                if call.task.done():
+                    # The call itself timed out (or finished as the wait did); pass on its result.
+                    return call.task.result()
+                self._deadline_exceeded()
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every caller has gone away; nobody is left to use the result.
+                call.task.cancel()
+
+    def _deadline_exceeded(self):
+        with self._lock:
+            self._counters["deadline_exceeded"] += 1
+        raise RequestDeadlineExceeded(f"Request deadline passed while waiting for single-flight '{self.name}'.")
+
+    def _async_call_done(self, key, call: _AsyncCall):
+        if self._async_calls.get(key) is call:
+            del self._async_calls[key]
+        # exception() also marks the error as retrieved when no caller was left to see it.
+        if not call.task.cancelled() and call.task.exception() is not None:
+            with self._lock:
+                self._counters["errors"] += 1
+        if call.followers:
+            logger.info(f"Single-flight '{self.name}' shared one upstream call with {call.followers} waiting request(s).")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            in_flight = len(self._calls) + len(self._async_calls)
+        # Every coalesced caller is one upstream call that did not happen.
+        return {**counters, "upstream_calls_saved": counters["coalesced"], "in_flight": in_flight}
+
+
+# --- PER-PROCESS NAMED GROUPS ---
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+def get_singleflight(name: str) -> SingleFlight:
+    """Returns the process-wide SingleFlight group with this name, creating it on first use."""
+    group = _groups.get(name)
+    if group is None:
+        with _groups_lock:
+            group = _groups.setdefault(name, SingleFlight(name))
+    return group
+
+
+def singleflight_stats() -> dict:
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: group.stats() for name, group in groups.items()}
@@ -1,7 +1,7 @@
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Link } from 'react-router-dom';
 import { Send, Sparkles, ArrowLeft, Loader2 } from 'lucide-react';
-import { generateRecommendations } from '../utils/api';
+import { streamRecommendations } from '../utils/api';
 
 interface DomainPageProps {
   domain: {
@@ -19,24 +19,38 @@ const DomainPage: React.FC<DomainPageProps> = ({ domain }) => {
   const [loading, setLoading] = useState(false);
   const [result, setResult] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
+  const streamController = useRef<AbortController | null>(null);
+
+  // Stop reading the stream (and let the backend cancel generation) when leaving the page
+  useEffect(() => () => streamController.current?.abort(), []);
 
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!input.trim()) return;
 
+    streamController.current?.abort();
+    const controller = new AbortController();
+    streamController.current = controller;
+
     setLoading(true);
     setError(null);
     setResult(null);
 
     try {
-      const recommendations = await generateRecommendations(input, domain.title.toLowerCase());
+      const recommendations = await streamRecommendations(input, domain.title.toLowerCase(), {
+        onChunk: (text) => setResult((previous) => (previous ?? '') + text),
+        signal: controller.signal,
+      });
       setResult(recommendations);
       console.log("Recommendations set in state:", recommendations);
     } catch (err) {
+      if (controller.signal.aborted) return;
       setError('Failed to generate recommendations. Please try again.');
       console.error('Error:', err);
     } finally {
-      setLoading(false);
+      if (streamController.current === controller) {
+        setLoading(false);
+      }
     }
   };
 
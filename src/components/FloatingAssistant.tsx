@@ -1,7 +1,7 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { MessageCircle, X, Send, Sparkles, Loader2 } from 'lucide-react';
 import { useLocation } from 'react-router-dom';
-import { generateRecommendations } from '../utils/api';
+import { sendChatMessage } from '../utils/api';
 
 interface Message {
   id: string;
@@ -10,6 +10,8 @@ interface Message {
   timestamp: Date;
 }
 
+const CHAT_SESSION_KEY = 'culturesphere-chat-session';
+
 const FloatingAssistant: React.FC = () => {
   const location = useLocation();
   const [isOpen, setIsOpen] = useState(false);
@@ -28,6 +30,8 @@ const FloatingAssistant: React.FC = () => {
   const [showTooltip, setShowTooltip] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const inputRef = useRef<HTMLInputElement>(null);
+  // Server-side conversation session, kept for the lifetime of the browser tab
+  const sessionIdRef = useRef<string | null>(sessionStorage.getItem(CHAT_SESSION_KEY));
 
   // Context-aware rotating text based on current page
   const getContextualTexts = () => {
@@ -131,22 +135,16 @@ const FloatingAssistant: React.FC = () => {
 
     try {
       const currentPage = location.pathname.replace('/', '') || 'home';
-      const assistantPrompt = `You are a helpful AI guide for CultureSphere AI, a cultural intelligence platform. 
-      
-      Current page: ${currentPage}
-      CultureSphere AI helps users discover personalized recommendations across 6 domains: Music, Dining, Travel, Fashion, Learning, and Wellness. Users input their preferences and get AI-powered lifestyle insights based on their cultural DNA.
-      
-      User question: "${inputValue}"
-      
-      Provide a helpful, friendly response about CultureSphere AI, its features, or guidance on how to use the platform. Keep responses concise (2-3 sentences) and encouraging. If asked about specific domains, guide them toward exploring that section. Be warm and culturally aware.`;
-
-      const response = await generateRecommendations(assistantPrompt, 'assistant');
+      // The guide's instructions and earlier turns live server-side; only the new message is sent
+      const { sessionId, reply } = await sendChatMessage(userMessage.text, currentPage, sessionIdRef.current);
+      sessionIdRef.current = sessionId;
+      sessionStorage.setItem(CHAT_SESSION_KEY, sessionId);
       
       setIsTyping(false);
       
       const assistantMessage: Message = {
         id: (Date.now() + 1).toString(),
-        text: response,
+        text: reply,
         isUser: false,
         timestamp: new Date()
       };
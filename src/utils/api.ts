@@ -26,6 +26,152 @@ export const generateRecommendations = async (userInput: string, domain: string)
   }
 };
 
+export interface QlooEntity {
+  name: string | null;
+  id: string | null;
+  type: string | null;
+}
+
+export interface StreamHandlers {
+  onEntities?: (entities: QlooEntity[], status: string) => void;
+  onChunk?: (text: string) => void;
+  signal?: AbortSignal;
+}
+
+// Streaming variant of generateRecommendations: consumes the Server-Sent Events stream from
+// /recommendations/stream (Qloo entities first, then Gemini text chunks) and resolves with the full text.
+// Abort the signal to stop reading; the backend cancels the Gemini generation when the client goes away.
+export const streamRecommendations = async (
+  userInput: string,
+  domain: string,
+  { onEntities, onChunk, signal }: StreamHandlers = {}
+): Promise<string> => {
+  let response: Response;
+  try {
+    response = await fetch(`${API_BASE_URL}/recommendations/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+      body: JSON.stringify({ userInput, domain }),
+      signal,
+    });
+  } catch (error) {
+    if (error instanceof DOMException && error.name === 'AbortError') throw error;
+    throw new Error('Unable to connect to server. Please ensure the backend is running on port 3001.');
+  }
+
+  if (!response.ok || !response.body) {
+    const data = await response.json().catch(() => null);
+    throw new Error(`Server error: ${data?.error || response.statusText || 'Unknown server error'}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let fullText = '';
+
+  const handleEvent = (rawEvent: string) => {
+    let event = 'message';
+    const dataLines: string[] = [];
+    for (const line of rawEvent.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) dataLines.push(line.slice(5).trimStart());
+    }
+    if (dataLines.length === 0) return;
+    const payload = JSON.parse(dataLines.join('\n'));
+
+    if (event === 'entities') {
+      onEntities?.(payload.entities || [], payload.status || '');
+    } else if (event === 'chunk') {
+      fullText += payload.text;
+      onChunk?.(payload.text);
+    } else if (event === 'error') {
+      throw new Error(payload.error || 'Failed to generate recommendations. Please try again.');
+    }
+  };
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      handleEvent(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+    }
+  }
+  if (buffer.trim()) handleEvent(buffer);
+
+  return fullText;
+};
+
+export interface BatchDomainResult {
+  status: 'ok' | 'no_results' | 'timeout';
+  qloo_status: string;
+  entities: QlooEntity[];
+}
+
+export interface BatchRecommendations {
+  recommendations: Record<string, string>;
+  domains: Record<string, BatchDomainResult>;
+}
+
+// For "everything for this mood" views: one request covering several domains.
+// Domains whose Qloo lookup timed out still come back, with status 'timeout' and a general-knowledge narrative.
+export const generateBatchRecommendations = async (userInput: string, domains: string[]): Promise<BatchRecommendations> => {
+  try {
+    const response = await axios.post(`${API_BASE_URL}/recommendations/batch`, {
+      userInput,
+      domains
+    });
+    return response.data;
+  } catch (error) {
+    if (axios.isAxiosError(error)) {
+      if (error.code === 'ECONNREFUSED' || error.message.includes('Network Error')) {
+        throw new Error('Unable to connect to server. Please ensure the backend is running on port 3001.');
+      }
+      if (error.response) {
+        console.error('Server responded with an error:', error.response.data);
+        throw new Error(`Server error: ${error.response.data?.error || error.response.statusText || 'Unknown server error'}`);
+      }
+    }
+    console.error('API Error:', error);
+    throw new Error('Failed to generate recommendations. Please try again.');
+  }
+};
+
+export interface ChatReply {
+  sessionId: string;
+  reply: string;
+  turn: number;
+  degraded?: boolean;
+}
+
+// For the FloatingAssistant: one conversation turn. The backend keeps the session's Qloo context and a
+// compacted history, so only the new message is sent; pass back the sessionId from the previous reply.
+export const sendChatMessage = async (message: string, page: string, sessionId?: string | null): Promise<ChatReply> => {
+  try {
+    const response = await axios.post(`${API_BASE_URL}/chat`, {
+      message,
+      page,
+      sessionId: sessionId || undefined
+    });
+    return response.data;
+  } catch (error) {
+    if (axios.isAxiosError(error)) {
+      if (error.code === 'ECONNREFUSED' || error.message.includes('Network Error')) {
+        throw new Error('Unable to connect to server. Please ensure the backend is running on port 3001.');
+      }
+      if (error.response) {
+        console.error('Server responded with an error:', error.response.data);
+        throw new Error(`Server error: ${error.response.data?.error || error.response.statusText || 'Unknown server error'}`);
+      }
+    }
+    console.error('API Error:', error);
+    throw new Error('Failed to get a reply. Please try again.');
+  }
+};
+
 // For the Home page (general recommendations)
 export const generateGeneralRecommendation = async (userInput: string): Promise<string> => {
   return generateRecommendations(userInput, 'general'); // Pass 'general' as the domain
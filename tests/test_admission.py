@@ -0,0 +1,62 @@
+import os
+import runpy
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+import app as app_module
+from services.admission import (
+    ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, REQUEST_DEADLINE_SECONDS, AdmissionController, request_timeout,
+)
+
+
+@pytest.mark.parametrize("header_value, expected", [
+    (None, REQUEST_DEADLINE_SECONDS),
+    ("5", 5.0),
+    ("-3", 0.0),
+    ("not a number", REQUEST_DEADLINE_SECONDS),
+    ("nan", REQUEST_DEADLINE_SECONDS),
+    ("inf", REQUEST_DEADLINE_SECONDS),
+    ("-inf", REQUEST_DEADLINE_SECONDS),
+])
+def test_request_timeout(header_value, expected):
+    assert request_timeout(header_value) == expected
+
+
+def test_gunicorn_threads_cover_running_and_queued_pipelines():
+    # The config sets defaults in os.environ for the server; keep them out of this process.
+    with mock.patch.dict(os.environ):
+        config = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), "gunicorn.conf.py"))
+    assert config["threads"] > ADMISSION_MAX_CONCURRENT + ADMISSION_MAX_QUEUE
+
+
+def test_request_beyond_the_slots_gets_the_degraded_answer(monkeypatch):
+    controller = AdmissionController(max_concurrent=1, max_queue=0)
+    monkeypatch.setattr(app_module, "get_admission_controller", lambda: controller)
+    release = threading.Event()
+
+    def slow_pipeline(user_input, domain):
+        release.wait(5)
+        return "A full narrative.", False
+
+    monkeypatch.setattr(app_module, "_run_recommendation_pipeline", slow_pipeline)
+    client = app_module.app.test_client()
+    first = {}
+    holder = threading.Thread(target=lambda: first.update(
+        response=client.post("/api/recommendations", json={"userInput": "late night jazz", "domain": "music"})
+    ))
+    holder.start()
+    try:
+        deadline = time.monotonic() + 5
+        while controller.stats()["active"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        shed = client.post("/api/recommendations", json={"userInput": "sunday morning folk", "domain": "music"})
+    finally:
+        release.set()
+        holder.join()
+    assert shed.get_json()["degraded"] is True
+    assert controller.stats()["counters"]["shed_queue_full"] == 1
+    assert first["response"].get_json() == {"recommendations": "A full narrative."}
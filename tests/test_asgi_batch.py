@@ -0,0 +1,33 @@
+import asyncio
+
+import asgi
+from services.rate_limiter import time_remaining
+
+
+def test_batch_lookups_run_under_the_batch_deadline(monkeypatch):
+    monkeypatch.setattr(asgi, "BATCH_DEADLINE_SECONDS", 0.2)
+    monkeypatch.setattr(asgi, "get_gemini_model", lambda: None)
+    lookup_deadlines = {}
+
+    async def qloo_context(user_input, domain):
+        lookup_deadlines[domain] = time_remaining()
+        if domain == "books":
+            await asyncio.sleep(0.5)
+        return "Successfully retrieved recommendations.", [{"name": "Pick", "entity_id": "e1"}]
+
+    monkeypatch.setattr(asgi, "_get_qloo_context", qloo_context)
+
+    async def main():
+        response = await asgi.app.test_client().post(
+            "/api/recommendations/batch",
+            json={"userInput": "late night jazz", "domains": ["music", "books"]},
+            headers={"X-Request-Timeout": "30"},
+        )
+        return response.status_code, await response.get_json()
+
+    status_code, body = asyncio.run(main())
+    assert status_code == 200
+    # Each lookup saw the batch deadline rather than the request's 30 s.
+    assert all(0 < remaining <= 0.2 for remaining in lookup_deadlines.values())
+    assert body["domains"]["music"]["status"] == "ok"
+    assert body["domains"]["books"]["status"] == "timeout"
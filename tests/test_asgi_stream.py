@@ -0,0 +1,138 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import asgi
+
+
+class _Limiter:
+    async def acquire_async(self, name: str):
+        pass
+
+
+class _UpstreamCall:
+    """Mimics the SDK's async stream: an async generator over a gRPC call that has cancel()."""
+
+    def __init__(self, texts: list, delay: float):
+        self.texts = texts
+        self.delay = delay
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    async def _wrapped_aiter(self):
+        for text in self.texts:
+            try:
+                await asyncio.sleep(self.delay)
+            except asyncio.CancelledError:
+                # grpc.aio cancels the call when the task reading it is cancelled.
+                self.cancel()
+                raise
+            yield SimpleNamespace(candidates=[SimpleNamespace(
+                content=SimpleNamespace(parts=[SimpleNamespace(text=text)]), finish_reason=SimpleNamespace(name="STOP"),
+            )])
+
+
+class _StreamResponse:
+    def __init__(self, call: _UpstreamCall):
+        self._iterator = call._wrapped_aiter()
+
+    async def __aiter__(self):
+        async for chunk in self._iterator:
+            yield chunk
+
+
+class _Model:
+    def __init__(self, texts: list, delay: float = 0.0):
+        self.call = _UpstreamCall(texts, delay)
+
+    async def generate_content_async(self, prompt, stream=False, generation_config=None, **kwargs):
+        assert stream
+        return _StreamResponse(self.call)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    async def qloo_context(user_input, domain):
+        return "Successfully retrieved recommendations.", [{"name": "Kind of Blue", "entity_id": "e1"}]
+
+    monkeypatch.setattr(asgi, "_get_qloo_context", qloo_context)
+    monkeypatch.setattr(asgi, "get_rate_limiter", lambda: _Limiter())
+    monkeypatch.setattr(asgi, "get_narrative_cache", lambda: SimpleNamespace(get=lambda *a: None, set=lambda *a: None))
+    model = _Model(["Try Kind of Blue. ", "Then A Love Supreme."])
+    monkeypatch.setattr(asgi, "get_gemini_model", lambda: model)
+    return model
+
+
+def _events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+@pytest.mark.parametrize("path, headers", [
+    ("/api/recommendations/stream", {}),
+    ("/api/recommendations", {"Accept": "text/event-stream"}),
+])
+def test_stream_sends_entities_then_chunks(model, path, headers):
+    async def main():
+        response = await asgi.app.test_client().post(
+            path, json={"userInput": "late night jazz", "domain": "music"}, headers=headers
+        )
+        return response, await response.get_data(as_text=True)
+
+    response, body = asyncio.run(main())
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert _events(body) == [
+        ("entities", {"entities": [{"name": "Kind of Blue", "entity_id": "e1"}],
+                      "status": "Successfully retrieved recommendations."}),
+        ("chunk", {"text": "Try Kind of Blue. "}),
+        ("chunk", {"text": "Then A Love Supreme."}),
+        ("done", {}),
+    ]
+
+
+def test_stream_missing_fields_is_400(model):
+    async def main():
+        return await asgi.app.test_client().post("/api/recommendations/stream", json={"domain": "music"})
+
+    assert asyncio.run(main()).status_code == 400
+
+
+def test_client_disconnect_cancels_gemini_stream(model):
+    model.call.texts = ["one. "] * 50
+    model.call.delay = 0.02
+
+    async def main():
+        async with asgi.app.test_client().request(
+            "/api/recommendations/stream", method="POST", headers={"Content-Type": "application/json"},
+        ) as connection:
+            await connection.send(json.dumps({"userInput": "late night jazz", "domain": "music"}).encode())
+            await connection.send_complete()
+            received = b""
+            while b"event: chunk" not in received:
+                received += await connection.receive()
+            await connection.disconnect()
+
+    asyncio.run(main())
+    assert model.call.cancelled
+
+
+def test_cancel_gemini_stream_between_chunks_cancels_the_call():
+    # A client that goes away while a chunk is being sent closes the body at its yield,
+    # with the SDK's generator suspended between reads.
+    call = _UpstreamCall(["one. ", "two. "], 0)
+    stream_response = _StreamResponse(call)
+
+    async def main():
+        await stream_response._iterator.__anext__()
+        await asgi._cancel_gemini_stream(stream_response)
+
+    asyncio.run(main())
+    assert call.cancelled
@@ -0,0 +1,55 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+import asgi
+from services.chat_sessions import ChatSessionStore, new_session_state
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChatSessionStore(path=str(tmp_path / "sessions.sqlite3"))
+
+
+def test_saved_session_round_trips(store):
+    state = new_session_state()
+    store.save(state)
+    assert store.get(state["session_id"])["session_id"] == state["session_id"]
+
+
+@pytest.mark.parametrize("session_id", [None, "", 123, 1.5, ["abc"], {"id": "abc"}, "../not-a-session-id"])
+def test_malformed_session_id_is_unknown(store, session_id):
+    assert store.get(session_id) is None
+
+
+def test_asgi_chat_waits_for_a_locked_store_off_the_event_loop(store, monkeypatch):
+    monkeypatch.setattr(asgi, "get_chat_session_store", lambda: store)
+    monkeypatch.setattr(asgi, "get_gemini_model", lambda: None)
+    store.save(new_session_state())  # creates the store
+    blocker = sqlite3.connect(store.path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        # Saving the session waits out the whole 1 s busy timeout; the reply is still sent.
+        response = await asgi.app.test_client().post("/api/chat", json={"message": "hello", "page": "home"})
+        ticking.cancel()
+        return response, ticks
+
+    try:
+        response, ticks = asyncio.run(main())
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+    assert response.status_code == 200
+    assert ticks > 20
+    assert store.stats()["counters"]["errors"] == 1
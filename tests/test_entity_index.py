@@ -0,0 +1,19 @@
+from services.entity_index import EntityIndex
+
+SEARCH_TYPE = "urn:entity:artist"
+
+
+def test_learned_overlay_is_bounded(tmp_path):
+    index = EntityIndex(directory=str(tmp_path), overlay_max_entries=2)
+    index.add("Miles Davis", SEARCH_TYPE, "e1")
+    index.add("John Coltrane", SEARCH_TYPE, "e2")
+    assert index.lookup("miles davis", SEARCH_TYPE).entity_id == "e1"
+    index.add("Nina Simone", SEARCH_TYPE, "e3")
+
+    # John Coltrane was the least recently used entry.
+    assert index.lookup("John Coltrane", SEARCH_TYPE) is None
+    assert index.lookup("Miles Davis", SEARCH_TYPE).entity_id == "e1"
+    assert index.lookup("Nina Simone", SEARCH_TYPE).entity_id == "e3"
+    assert index.stats()["learned_entities"] == 2
+    # Nothing is written next to the index files at request time.
+    assert list(tmp_path.iterdir()) == []
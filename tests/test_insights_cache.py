@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+import types
+
+import pytest
+
+from services import insights_cache
+from services.insights_cache import InsightsCache
+
+KEY = ("Q123", "urn:entity:movie", 5)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Only the cache module sees the fake clock, so asyncio and thread waits keep real time.
+    fake = _Clock()
+    monkeypatch.setattr(insights_cache, "time", types.SimpleNamespace(monotonic=fake.monotonic))
+    return fake
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_miss_fetches_and_fresh_hit_is_served_from_cache(clock):
+    cache = InsightsCache(fresh_ttl=10, stale_ttl=60)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return [{"name": "Heat"}]
+
+    assert cache.get_or_fetch(KEY, fetch) == [{"name": "Heat"}]
+    clock.now += 5
+    assert cache.get_or_fetch(KEY, fetch) == [{"name": "Heat"}]
+
+    assert calls == [1]
+    counters = cache.stats()["counters"]
+    assert (counters["misses"], counters["fresh_hits"]) == (1, 1)
+
+
+def test_stale_entry_is_served_and_refreshed_once_in_background(clock):
+    cache = InsightsCache(fresh_ttl=10, stale_ttl=60)
+    cache.get_or_fetch(KEY, lambda: ["old"])
+    clock.now += 30
+
+    release = threading.Event()
+    refreshes = []
+
+    def slow_fetch():
+        refreshes.append(1)
+        release.wait(2)
+        return ["new"]
+
+    # Every stale hit returns immediately with the old copy; only one refresh is scheduled.
+    assert [cache.get_or_fetch(KEY, slow_fetch) for _ in range(3)] == [["old"]] * 3
+    release.set()
+    assert _wait_for(lambda: cache.stats()["counters"]["refreshes"] == 1)
+
+    assert refreshes == [1]
+    assert cache.get_or_fetch(KEY, slow_fetch) == ["new"]
+    counters = cache.stats()["counters"]
+    assert (counters["stale_hits"], counters["fresh_hits"]) == (3, 1)
+
+
+def test_failed_refresh_keeps_stale_copy(clock):
+    cache = InsightsCache(fresh_ttl=10, stale_ttl=60)
+    cache.get_or_fetch(KEY, lambda: ["old"])
+    clock.now += 30
+
+    def failing_fetch():
+        raise RuntimeError("qloo down")
+
+    assert cache.get_or_fetch(KEY, failing_fetch) == ["old"]
+    assert _wait_for(lambda: cache.stats()["counters"]["refresh_errors"] == 1)
+    assert cache.peek(KEY) == ["old"]
+
+
+def test_entry_past_stale_window_is_fetched_synchronously(clock):
+    cache = InsightsCache(fresh_ttl=10, stale_ttl=60)
+    cache.get_or_fetch(KEY, lambda: ["old"])
+    clock.now += 71
+
+    assert cache.peek(KEY) is None
+    assert cache.get_or_fetch(KEY, lambda: ["new"]) == ["new"]
+    assert cache.stats()["counters"]["misses"] == 2
+
+
+def test_async_stale_entry_is_served_and_refreshed_once(clock):
+    cache = InsightsCache(fresh_ttl=10, stale_ttl=60)
+    refreshes = []
+
+    async def old():
+        return ["old"]
+
+    async def slow_fetch():
+        refreshes.append(1)
+        await asyncio.sleep(0.02)
+        return ["new"]
+
+    async def scenario():
+        await cache.aget_or_fetch(KEY, old)
+        clock.now += 30
+        stale = [await cache.aget_or_fetch(KEY, slow_fetch) for _ in range(3)]
+        await asyncio.gather(*cache._background_tasks)
+        return stale, await cache.aget_or_fetch(KEY, slow_fetch)
+
+    stale, refreshed = asyncio.run(scenario())
+
+    assert stale == [["old"]] * 3
+    assert refreshed == ["new"]
+    assert refreshes == [1]
+    assert cache.stats()["counters"]["refreshes"] == 1
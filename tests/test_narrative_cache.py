@@ -0,0 +1,94 @@
+import types
+
+import pytest
+
+from services import narrative_cache
+from services.narrative_cache import NarrativeCache, input_features, similarity
+
+ENTITIES = [{"name": "Kind of Blue"}, {"name": "Blue Train"}]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(narrative_cache, "time", types.SimpleNamespace(monotonic=fake.monotonic))
+    return fake
+
+
+def test_exact_hit_and_miss(clock):
+    cache = NarrativeCache(ttl=60)
+    cache.set("Music", "Jazz for studying!", "ok", ENTITIES, "narrative")
+
+    assert cache.get("music", "jazz for studying", "ok", ENTITIES) == "narrative"
+    assert cache.get("music", "jazz for studying", "ok", [{"name": "Giant Steps"}]) is None
+    assert cache.get("books", "jazz for studying", "ok", ENTITIES) is None
+
+    counters = cache.stats()["domains"]
+    assert counters["music"]["exact_hits"] == 1
+    assert counters["music"]["misses"] == 1
+    assert counters["books"]["misses"] == 1
+
+
+def test_near_duplicate_hits_only_at_or_above_threshold(clock):
+    a = input_features("relaxing jazz for studying")
+    b = input_features("relaxing jazz to study")
+    c = input_features("upbeat jazz for running")
+    assert similarity(a, b) == 1.0
+    assert similarity(a, c) == pytest.approx(0.2)
+
+    cache = NarrativeCache(ttl=60, similarity_threshold=0.5)
+    cache.set("music", "relaxing jazz for studying", "ok", ENTITIES, "narrative")
+
+    assert cache.get("music", "relaxing jazz to study", "ok", ENTITIES) == "narrative"
+    assert cache.get("music", "upbeat jazz for running", "ok", ENTITIES) is None
+    counters = cache.stats()["domains"]["music"]
+    assert (counters["similar_hits"], counters["misses"]) == (1, 1)
+
+
+def test_zero_threshold_disables_near_duplicates(clock):
+    cache = NarrativeCache(ttl=60, similarity_threshold=0)
+    cache.set("music", "relaxing jazz for studying", "ok", ENTITIES, "narrative")
+
+    assert cache.get("music", "relaxing jazz to study", "ok", ENTITIES) is None
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = NarrativeCache(ttl=60, similarity_threshold=0.5)
+    cache.set("music", "relaxing jazz for studying", "ok", ENTITIES, "narrative")
+
+    clock.now += 59
+    assert cache.get("music", "relaxing jazz for studying", "ok", ENTITIES) == "narrative"
+    clock.now += 1
+    assert cache.get("music", "relaxing jazz for studying", "ok", ENTITIES) is None
+    assert cache.get("music", "relaxing jazz to study", "ok", ENTITIES) is None
+    assert cache.get_degraded("music", "relaxing jazz for studying") is None
+
+    stats = cache.stats()
+    assert stats["entries"] == 0
+    assert stats["bytes"] == 0
+    assert stats["counters"]["expirations"] == 1
+
+
+def test_degraded_lookup_ignores_entities(clock):
+    cache = NarrativeCache(ttl=60)
+    cache.set("music", "Jazz", "ok", ENTITIES, "narrative")
+
+    assert cache.get_degraded("MUSIC", "jazz!") == "narrative"
+    assert cache.get_degraded("music", "blues") is None
+    assert cache.stats()["counters"]["degraded_hits"] == 1
+
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = NarrativeCache(ttl=60, max_bytes=0)
+    cache.set("music", "jazz", "ok", ENTITIES, "narrative")
+
+    assert cache.get("music", "jazz", "ok", ENTITIES) is None
+    assert cache.stats()["entries"] == 0
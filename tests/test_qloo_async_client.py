@@ -0,0 +1,109 @@
+import time
+import asyncio
+
+import httpx
+import pytest
+
+from services import qloo_async_client
+from services.qloo_client import CircuitBreaker, QlooDeadlineExceededError, QlooRateLimitedError
+from services.rate_limiter import RateLimitExceeded, set_request_deadline
+
+
+class _Limiter:
+    def __init__(self, exhausted: bool):
+        self.exhausted = exhausted
+
+    async def acquire_async(self, name: str):
+        if self.exhausted:
+            raise RateLimitExceeded(f"no {name} token")
+
+
+class _HangingClient:
+    async def get(self, *args, **kwargs):
+        await asyncio.sleep(3600)
+
+
+class _SlowClient:
+    def __init__(self):
+        self.timeouts = []
+
+    async def get(self, *args, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        await asyncio.sleep(timeout.read)
+        raise httpx.ReadTimeout("read timed out")
+
+
+def _half_open_client(monkeypatch, exhausted: bool = False):
+    monkeypatch.setattr(qloo_async_client, "get_rate_limiter", lambda: _Limiter(exhausted))
+    client = qloo_async_client.AsyncQlooClient()
+    client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    client.breaker.record_failure()
+    time.sleep(0.06)
+    return client
+
+
+def test_half_open_trial_rate_limited_frees_trial_slot(monkeypatch):
+    client = _half_open_client(monkeypatch, exhausted=True)
+    with pytest.raises(QlooRateLimitedError):
+        asyncio.run(client.get("/search", "key"))
+    assert client.breaker.allow_request()
+
+
+def test_half_open_trial_cancelled_frees_trial_slot(monkeypatch):
+    client = _half_open_client(monkeypatch)
+
+    async def disconnect_mid_call():
+        client._client = _HangingClient()
+        client._client_loop = asyncio.get_running_loop()
+        client._client_pid = qloo_async_client.os.getpid()
+        task = asyncio.create_task(client.get("/search", "key"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(disconnect_mid_call())
+    assert client.breaker.allow_request()
+
+
+def _use_client(client, http_client):
+    client._client = http_client
+    client._client_loop = asyncio.get_running_loop()
+    client._client_pid = qloo_async_client.os.getpid()
+
+
+def test_deadline_shortens_timeouts_and_stops_retries(monkeypatch):
+    monkeypatch.setattr(qloo_async_client, "get_rate_limiter", lambda: _Limiter(False))
+    client = qloo_async_client.AsyncQlooClient()
+    client.breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    client.max_retries = 3
+    client.backoff_base = 0
+    slow = _SlowClient()
+
+    async def main():
+        # Each task gets its own copy of the context, as a batch lookup does.
+        set_request_deadline(0.05)
+        _use_client(client, slow)
+        await client.get("/search", "key")
+
+    started = time.monotonic()
+    with pytest.raises(QlooDeadlineExceededError):
+        asyncio.run(main())
+    assert time.monotonic() - started < 1
+    assert len(slow.timeouts) == 1
+    assert slow.timeouts[0].read <= 0.05
+    # Running out of our own deadline says nothing about Qloo's health.
+    assert client.breaker.stats()["consecutive_failures"] == 0
+
+
+def test_passed_deadline_skips_the_call(monkeypatch):
+    client = _half_open_client(monkeypatch)
+
+    async def main():
+        set_request_deadline(0)
+        _use_client(client, _HangingClient())
+        await client.get("/search", "key")
+
+    with pytest.raises(QlooDeadlineExceededError):
+        asyncio.run(main())
+    assert client.breaker.allow_request()
@@ -0,0 +1,143 @@
+import time
+
+import pytest
+import requests
+
+from services import qloo_client
+from services.qloo_client import CircuitBreaker, QlooClient
+from services.rate_limiter import set_request_deadline, clear_request_deadline
+
+
+class _Response:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.reason = "OK" if status_code == 200 else "Error"
+        self.url = "http://qloo.test/search"
+        self.headers = {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error", response=self)
+
+
+class _Session:
+    """Stands in for requests.Session: each get() raises or returns the next scripted outcome."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+
+    def get(self, *args, **kwargs):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(qloo_client, "acquire_qloo_token", lambda path: None)
+
+
+def _half_open_client(*outcomes) -> QlooClient:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    client = QlooClient(base_url="http://qloo.test", max_retries=0, breaker=breaker)
+    client._session = _Session(*outcomes)
+    client._session_pid = qloo_client.os.getpid()
+    return client
+
+
+def test_half_open_trial_success_closes_breaker():
+    client = _half_open_client(_Response(200))
+    client.get("/search", "key")
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ChunkedEncodingError("broken body"),
+    requests.exceptions.ContentDecodingError("bad gzip"),
+    requests.exceptions.TooManyRedirects("loop"),
+])
+def test_half_open_trial_unexpected_request_error_reopens_breaker(error):
+    client = _half_open_client(error)
+    with pytest.raises(type(error)):
+        client.get("/search", "key")
+    assert client.breaker.stats()["state"] == CircuitBreaker.OPEN
+    # Once the reset timeout passes again, a new trial is let through.
+    time.sleep(0.06)
+    assert client.breaker.allow_request()
+
+
+def test_half_open_trial_non_request_error_frees_trial_slot():
+    client = _half_open_client(RuntimeError("bug in a hook"))
+    with pytest.raises(RuntimeError):
+        client.get("/search", "key")
+    assert client.breaker.allow_request()
+
+
+def test_half_open_trial_rate_limited_frees_trial_slot(monkeypatch):
+    def rate_limited(path):
+        raise qloo_client.QlooRateLimitedError("no token")
+
+    monkeypatch.setattr(qloo_client, "acquire_qloo_token", rate_limited)
+    client = _half_open_client()
+    with pytest.raises(qloo_client.QlooRateLimitedError):
+        client.get("/search", "key")
+    assert client.breaker.allow_request()
+
+
+def test_half_open_retry_rate_limited_after_429_frees_trial_slot(monkeypatch):
+    tokens = iter([None])
+
+    def one_token(path):
+        if next(tokens, "empty") == "empty":
+            raise qloo_client.QlooRateLimitedError("bucket drained by the 429")
+
+    monkeypatch.setattr(qloo_client, "acquire_qloo_token", one_token)
+    monkeypatch.setattr(qloo_client, "record_qloo_throttled", lambda path: None)
+    client = _half_open_client(_Response(429))
+    client.max_retries = 1
+    client.backoff_max = 0
+    with pytest.raises(qloo_client.QlooRateLimitedError):
+        client.get("/search", "key")
+    assert client.breaker.allow_request()
+
+
+class _SlowSession:
+    def __init__(self):
+        self.timeouts = []
+
+    def get(self, *args, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        time.sleep(timeout[1])
+        raise requests.exceptions.ReadTimeout("read timed out")
+
+
+def test_deadline_shortens_timeouts_and_stops_retries():
+    client = QlooClient(base_url="http://qloo.test", read_timeout=10, max_retries=3, backoff_base=0)
+    client._session = _SlowSession()
+    client._session_pid = qloo_client.os.getpid()
+    set_request_deadline(0.05)
+    try:
+        started = time.monotonic()
+        with pytest.raises(qloo_client.QlooDeadlineExceededError):
+            client.get("/search", "key")
+    finally:
+        clear_request_deadline()
+    assert time.monotonic() - started < 1
+    assert len(client._session.timeouts) == 1
+    assert client._session.timeouts[0][1] <= 0.05
+    # Running out of our own deadline says nothing about Qloo's health.
+    assert client.breaker.stats()["consecutive_failures"] == 0
+
+
+def test_passed_deadline_skips_the_call():
+    client = _half_open_client()
+    set_request_deadline(0)
+    try:
+        with pytest.raises(qloo_client.QlooDeadlineExceededError):
+            client.get("/search", "key")
+    finally:
+        clear_request_deadline()
+    assert client.breaker.allow_request()
@@ -0,0 +1,33 @@
+import asyncio
+import sqlite3
+
+from services.rate_limiter import SharedTokenBuckets
+
+
+def test_acquire_async_waits_for_a_locked_store_off_the_event_loop(tmp_path):
+    limiter = SharedTokenBuckets(path=str(tmp_path / "limits.sqlite3"), limits={"qloo": (10.0, 10)})
+    limiter.drain("qloo")  # creates the store
+    blocker = sqlite3.connect(limiter.path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        # The store stays locked for the whole 1 s busy timeout; the limiter fails open.
+        await limiter.acquire_async("qloo")
+        ticking.cancel()
+        return ticks
+
+    try:
+        assert asyncio.run(main()) > 20
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+    assert limiter.stats()["store_errors"] == 1
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services.prompt_builder import expects_json, build_batch_prompt
+from services.recommendation_pipeline import (
+    GeminiNoTextError, gemini_chunk_text, gemini_response_text, parse_batch_narratives,
+)
+
+
+def _response(texts: list, finish_reason: str = "STOP", candidates: bool = True):
+    if not candidates:
+        return SimpleNamespace(candidates=[])
+    parts = [SimpleNamespace(text=text) for text in texts]
+    return SimpleNamespace(candidates=[SimpleNamespace(
+        content=SimpleNamespace(parts=parts), finish_reason=SimpleNamespace(name=finish_reason)
+    )])
+
+
+def test_complete_reply_is_returned_whole():
+    assert gemini_response_text(_response(["Try Miles Davis. ", "Then Coltrane."])) == "Try Miles Davis. Then Coltrane."
+
+
+def test_reply_cut_by_max_tokens_is_trimmed_to_last_sentence():
+    response = _response(['Try "Kind of Blue." Then A Love Supr'], "MAX_TOKENS")
+    assert gemini_response_text(response) == 'Try "Kind of Blue."'
+
+
+def test_max_tokens_spent_before_any_text_raises():
+    # Gemini 2.5 can spend the whole cap on thinking; the SDK's response.text raises here.
+    with pytest.raises(GeminiNoTextError):
+        gemini_response_text(_response([], "MAX_TOKENS"))
+
+
+def test_blocked_prompt_raises():
+    with pytest.raises(GeminiNoTextError):
+        gemini_response_text(_response([], candidates=False))
+
+
+def test_empty_stream_chunk_is_empty_text():
+    assert gemini_chunk_text(_response([], "MAX_TOKENS")) == ""
+
+
+def test_truncated_batch_reply_keeps_complete_narratives():
+    cut = '{"music": "Try \\"Kind of Blue.\\" Then Coltrane.", "books": "Read Baldwin.", "travel": "Head to Lamu. Th'
+    text = gemini_response_text(_response([cut], "MAX_TOKENS"), json_reply=True)
+    # Not trimmed back to a sentence end, which would leave no JSON to parse.
+    assert text == cut
+    assert parse_batch_narratives(text, ["music", "books", "travel"]) == {
+        "music": 'Try "Kind of Blue." Then Coltrane.',
+        "books": "Read Baldwin.",
+    }
+
+
+def test_batch_reply_in_a_code_fence_is_parsed():
+    reply = '```json\n{"music": "Try Kind of Blue.", "books": "Read Baldwin."}\n```'
+    assert parse_batch_narratives(reply, ["music", "books"]) == {"music": "Try Kind of Blue.", "books": "Read Baldwin."}
+
+
+def test_batch_prompt_expects_json():
+    prompt = build_batch_prompt("late night jazz", {"music": ("ok", []), "books": ("ok", [])})
+    assert expects_json(prompt)
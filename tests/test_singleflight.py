@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.rate_limiter import RequestDeadlineExceeded, clear_request_deadline, set_request_deadline
+from services.singleflight import SingleFlight
+
+
+def test_followers_get_result_when_leader_is_cancelled():
+    group = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "narrative"
+
+    async def scenario():
+        leader = asyncio.create_task(group.do_async("key", work))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(group.do_async("key", work)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(scenario()) == ["narrative"] * 3
+    assert calls == [1]
+    assert group.stats()["in_flight"] == 0
+
+
+def test_shared_call_is_cancelled_once_every_caller_is_gone():
+    group = SingleFlight("test")
+    finished = []
+
+    async def work():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+
+    async def scenario():
+        callers = [asyncio.create_task(group.do_async("key", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.08)
+
+    asyncio.run(scenario())
+    assert finished == []
+    assert group.stats()["in_flight"] == 0
+
+
+def test_errors_are_shared_and_counted():
+    group = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def scenario():
+        return await asyncio.gather(*(group.do_async("key", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert group.stats()["errors"] == 1
+    assert group.stats()["coalesced"] == 2
+
+
+def test_follower_gives_up_at_its_own_deadline():
+    group = SingleFlight("test")
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: group.do("key", lambda: release.wait(5) and "narrative"))
+    leader.start()
+    try:
+        while group.stats()["in_flight"] == 0:
+            time.sleep(0.001)
+        set_request_deadline(0.05)
+        started = time.monotonic()
+        with pytest.raises(RequestDeadlineExceeded):
+            group.do("key", lambda: "not called")
+        assert time.monotonic() - started < 1
+    finally:
+        clear_request_deadline()
+        release.set()
+        leader.join()
+    assert group.stats()["deadline_exceeded"] == 1
+
+
+def test_async_follower_gives_up_at_its_own_deadline_without_cancelling_the_call():
+    group = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.2)
+        return "narrative"
+
+    async def follower():
+        set_request_deadline(0.05)  # in this task's own context only
+        return await group.do_async("key", work)
+
+    async def scenario():
+        leader = asyncio.create_task(group.do_async("key", work))
+        await asyncio.sleep(0)
+        with pytest.raises(RequestDeadlineExceeded):
+            await asyncio.create_task(follower())
+        return await leader
+
+    assert asyncio.run(scenario()) == "narrative"
+    assert group.stats()["deadline_exceeded"] == 1